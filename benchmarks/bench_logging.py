@@ -0,0 +1,75 @@
+"""
+Handler throughput with logging off, with a synchronous StreamHandler (the old setup)
+and with the queue-based pipeline from utils/logger.py. Output goes to os.devnull.
+
+Usage: python benchmarks/bench_logging.py [handler_calls]
+"""
+import asyncio
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.logger import LazyQueueHandler, SamplingFilter  # noqa: E402
+
+
+async def fake_handler(logger, i):
+    # Roughly the shape of a redirect: a few awaits and a few log lines with structured fields
+    extra = {"code": "A" * 32, "user_id": i, "stage": "member_check", "sample": "member_check"}
+    await asyncio.sleep(0)
+    logger.warning("Failed to check member status for %s in %s: %s", i, -100123, "Bad Request", extra=extra)
+    await asyncio.sleep(0)
+    logger.info("Created invite link for %s", i)
+    await asyncio.sleep(0)
+    logger.debug("Served redirect %s", i)
+
+
+async def run(logger, calls):
+    started = time.perf_counter()
+    await asyncio.gather(*(fake_handler(logger, i) for i in range(calls)))
+    return calls / (time.perf_counter() - started)
+
+
+def make_logger(mode, stream):
+    logger = logging.getLogger(f"bench.{mode}")
+    logger.propagate = False
+    formatter = logging.Formatter("%(asctime)s | %(levelname)-8s | %(name)s | %(message)s")
+
+    if mode == "off":
+        logger.setLevel(logging.CRITICAL)
+        return logger, None
+
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(formatter)
+    if mode == "sync":
+        logger.addHandler(handler)
+        return logger, None
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    if mode == "queue+sampling":
+        queue_handler.addFilter(SamplingFilter(20))
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return logger, listener
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    with open(os.devnull, "w") as devnull:
+        for mode in ("off", "sync", "queue", "queue+sampling"):
+            logger, listener = make_logger(mode, devnull)
+            throughput = asyncio.run(run(logger, calls))
+            if listener:
+                listener.stop()
+            print(f"{mode:>15}: {throughput:10.0f} handler calls/s")
+
+
+if __name__ == '__main__':
+    main()
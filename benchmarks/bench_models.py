@@ -0,0 +1,119 @@
+"""
+Compares the in-process cache entries as plain BSON dicts (what the caches held before)
+against the slotted, frozen models: memory retained per entry and the cost of building
+and reading them on the /start hot path.
+
+Usage: python benchmarks/bench_models.py [--entries 20000] [--iterations 200000]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from models import Redirect, TmdbDetails  # noqa: E402
+
+
+def redirect_doc(i: int, rng: random.Random) -> dict:
+    """A redirect_links document as REDIRECT_FIELDS projects it (a fifth of them with mirrors)."""
+    now = datetime(2025, 1, 1) + timedelta(minutes=i)
+    doc = {
+        "_id": ObjectId(), "code": f"{i:032x}", "tenant": None, "series_name": f"Series number {i}",
+        "tmdb_id": 1000 + i, "media_type": rng.choice(("tv", "movie")), "private_channel_id": -1001000000000 - i,
+        "invite_link": f"https://t.me/+{i:016x}", "used_count": rng.randint(0, 50000), "last_used": now,
+        "created_at": now, "updated_at": now, "channel_status": "ok",
+        "invites_by_channel": {str(-1001000000000 - i): rng.randint(0, 50000)},
+    }
+    if i % 5 == 0:
+        doc["mirrors"] = [{"chat_id": -1002000000000 - i, "weight": 2, "status": "ok"}]
+    return doc
+
+
+def details_doc(i: int) -> dict:
+    """tmdb_metadata.details as TMDBClient.get_details returns them."""
+    return {
+        "title": f"Series number {i}", "year": "2019", "rating": 7.9, "genres": "Crime, Drama",
+        "overview": f"Overview of series {i}. " * 12, "poster_url": f"https://image.tmdb.org/t/p/w780/{i}.jpg",
+        "media_type": "tv", "tmdb_id": 1000 + i, "runtime": None,
+    }
+
+
+def retained(build, count: int) -> float:
+    """Bytes per entry still allocated after building count entries with build(i)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    entries = [build(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del entries
+    return size / count
+
+
+def serve_dict(entry: dict, details: dict):
+    """The fields serve_redirect and render read, the old way."""
+    channels = [(entry['private_channel_id'], 1)] if entry.get('channel_status') != "broken" else []
+    for mirror in entry.get('mirrors') or ():
+        if mirror.get('status') != "broken":
+            channels.append((mirror['chat_id'], max(1, mirror.get('weight', 1))))
+    return (channels, entry.get('invite_link'), (entry.get('media_type', 'tv'), entry.get('tmdb_id')),
+            details.get('title', 'Unknown'), details.get('year', 'N/A'), details.get('poster_url'))
+
+
+def serve_model(entry: Redirect, details: TmdbDetails):
+    return (entry.healthy_channels(), entry.invite_link, entry.details_key,
+            details.title, details.year, details.poster_url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    def rng(i):
+        return random.Random(args.seed * 1000003 + i)
+
+    memory = {
+        "redirect dict": retained(lambda i: redirect_doc(i, rng(i)), args.entries),
+        "Redirect": retained(lambda i: Redirect.from_bson(redirect_doc(i, rng(i))), args.entries),
+        "details dict": retained(details_doc, args.entries),
+        "TmdbDetails": retained(lambda i: TmdbDetails.from_bson(details_doc(i)), args.entries),
+    }
+    print(f"Memory retained per cache entry ({args.entries} entries):")
+    for name, size in memory.items():
+        print(f"  {name:>14}: {size:8.0f} B")
+    print(f"  redirect saving: {1 - memory['Redirect'] / memory['redirect dict']:.0%}, "
+          f"details saving: {1 - memory['TmdbDetails'] / memory['details dict']:.0%}")
+
+    docs = [redirect_doc(i, rng(i)) for i in range(1000)]
+    detail_docs = [details_doc(i) for i in range(1000)]
+    models = [Redirect.from_bson(doc) for doc in docs]
+    detail_models = [TmdbDetails.from_bson(doc) for doc in detail_docs]
+    n = args.iterations
+
+    def loop(func, *columns):
+        rows = list(zip(*columns))
+        return lambda: [func(*row) for row in rows]
+
+    timings = {
+        "Redirect.from_bson": (loop(Redirect.from_bson, docs), len(docs)),
+        "TmdbDetails.from_bson": (loop(TmdbDetails.from_bson, detail_docs), len(detail_docs)),
+        "hot path reads (dict)": (loop(serve_dict, docs, detail_docs), len(docs)),
+        "hot path reads (models)": (loop(serve_model, models, detail_models), len(docs)),
+    }
+    print(f"\nThroughput ({n} calls each):")
+    for name, (func, per_call) in timings.items():
+        total = min(timeit.repeat(func, number=max(1, n // per_call), repeat=5))
+        print(f"  {name:>24}: {total / (max(1, n // per_call) * per_call) * 1e9:7.0f} ns/entry")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the start_handler render step.
+
+Compares rendering the caption/keyboards from scratch for every visitor (the old
+behaviour) against looking them up in the per-code render cache.
+
+Usage: python benchmarks/bench_render.py [iterations]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+from models import TmdbDetails  # noqa: E402
+from utils.render import (  # noqa: E402
+    RenderCache, render_base_caption, EXPIRATION_NOTICE, LOADING_MARKUP, LOADING_MESSAGES_POOL
+)
+
+DETAILS = TmdbDetails(
+    title="The Rookie & Friends",
+    year="2018",
+    rating=8.1,
+    genres="Crime, Drama, Comedy",
+    overview="Starting over isn't easy, especially for small-town guy John Nolan <who>... " * 8,
+    poster_url="https://image.tmdb.org/t/p/w780/poster.jpg",
+)
+INVITE_LINK = "https://t.me/+abcdefghijklmnop"
+CODE = "A" * 32
+
+
+def render_uncached():
+    # Mirrors the previous per-visitor work: escape + f-strings, one markup per send/edit
+    base_caption = render_base_caption(DETAILS)
+    initial_caption = base_caption + "Enjoy watching! 🍿"
+    loading_keyboard = [[InlineKeyboardButton("⏳ Loading...", callback_data="loading_wait")]]
+    markups = [InlineKeyboardMarkup(loading_keyboard)]
+    frames = []
+    for msg in random.sample(LOADING_MESSAGES_POOL, 3):
+        frames.append(base_caption + f"{msg}")
+        markups.append(InlineKeyboardMarkup(loading_keyboard))
+    join_keyboard = [[InlineKeyboardButton("🚀 Join Channel", url=INVITE_LINK)]]
+    markups.append(InlineKeyboardMarkup(join_keyboard))
+    return initial_caption + EXPIRATION_NOTICE, frames, markups
+
+
+def make_render_cached(cache):
+    def render_cached():
+        rendered = cache.get(CODE, DETAILS, INVITE_LINK)
+        frames = [rendered.frames[msg] for msg in random.sample(LOADING_MESSAGES_POOL, 3)]
+        return rendered.expiring_caption, frames, rendered.member_markup, LOADING_MARKUP
+    return render_cached
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cache = RenderCache()
+    results = {
+        "uncached": min(timeit.repeat(render_uncached, number=iterations, repeat=5)),
+        "cached": min(timeit.repeat(make_render_cached(cache), number=iterations, repeat=5)),
+    }
+    for name, total in results.items():
+        print(f"{name:>9}: {total / iterations * 1e6:8.2f} µs/render")
+    print(f"  speedup: {results['uncached'] / results['cached']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+End-to-end scenario benchmarks, fully offline: the real Application and handlers run
+against a fake Bot API transport, a stub TMDb server and mongomock (or a local mongod
+via BENCH_MONGO_URI).
+
+Scenarios:
+  viral_spike   many users open the same deep link within a short window
+  admin_paging  the admin pages through ~10k redirects and opens link details
+  bulk_setup    the admin sets up many channels one after another
+  backlog_replay  after downtime, a backlog of old deep link clicks arrives together with fresh ones
+
+Results are written as JSON so runs can be compared with benchmarks/compare.py.
+
+Usage: python benchmarks/bench_scenarios.py [--scenario NAME ...] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from harness import (
+    ROOT, Dispatcher, FakeBotRequest, StubTMDbServer, UpdateFactory, percentiles, use_database
+)
+
+from config import Config  # noqa: E402
+from database import db  # noqa: E402
+from handlers.start import issued_invites  # noqa: E402
+from main import build_application  # noqa: E402
+from tmdb import tmdb  # noqa: E402
+from utils.callbacks import Action, callbacks  # noqa: E402
+from utils.helpers import generate_redirect_code  # noqa: E402
+from utils.metrics import metrics  # noqa: E402
+from utils.render import render_cache  # noqa: E402
+from utils.tenants import DEFAULT_TENANT, Tenant  # noqa: E402
+
+ADMIN_ID = 42
+
+
+def handler_errors() -> int:
+    return int(sum(value for (name, _), value in metrics.counters.items() if name == "handler_errors_total"))
+
+
+async def start_bot(args):
+    """Builds the real Application on a fake transport and a stub TMDb."""
+    bot_api = FakeBotRequest(latency=args.bot_latency, rate_limit_ratio=args.rate_limit_ratio,
+                             member_ratio=args.member_ratio, seed=args.seed)
+    tmdb_server = StubTMDbServer(latency=args.tmdb_latency, error_ratio=args.tmdb_error_ratio, seed=args.seed)
+    await tmdb_server.start()
+    await tmdb.aclose()
+    tmdb.base_url = tmdb_server.base_url
+
+    application = build_application(Tenant(DEFAULT_TENANT, "1000:bench-token", [ADMIN_ID]), request=bot_api)
+    await application.initialize()
+    await application.start()
+    render_cache.clear()
+    issued_invites.clear()
+    bot_api.reset()
+    return application, bot_api, tmdb_server
+
+
+async def stop_bot(application, tmdb_server):
+    await application.stop()
+    await application.shutdown()
+    await tmdb.aclose()
+    await tmdb_server.stop()
+
+
+async def viral_spike(args) -> dict:
+    """`users` distinct users send /start <code> for one redirect, arrivals spread over `spread` seconds."""
+    application, bot_api, tmdb_server = await start_bot(args)
+    dispatcher = Dispatcher(application)
+    updates = UpdateFactory(application.bot)
+
+    code = generate_redirect_code()
+    await db.create_redirect({
+        "code": code, "series_name": "The Rookie", "tmdb_id": 79744, "media_type": "tv",
+        "private_channel_id": -1001000000001, "invite_link": "https://t.me/+primary",
+    })
+
+    rng = random.Random(args.seed)
+    errors_before = handler_errors()
+
+    async def visit(user_id):
+        await asyncio.sleep(rng.uniform(0, args.spread))
+        return await dispatcher.dispatch(updates.command(user_id, "start", code))
+
+    started = time.monotonic()
+    latencies = await asyncio.gather(*(visit(100000 + i) for i in range(args.users)))
+    wall = time.monotonic() - started
+
+    result = {
+        "users": args.users,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(args.users / wall, 1),
+        "latency": percentiles(latencies),
+        "served": bot_api.calls["sendPhoto"] + bot_api.calls["sendMessage"],
+        "cards_sent": bot_api.calls["sendPhoto"],
+        "invites_created": bot_api.calls["createChatInviteLink"],
+        "handler_errors": handler_errors() - errors_before,
+        "bot_api": bot_api.summary(),
+        "tmdb": tmdb_server.summary(),
+    }
+    await stop_bot(application, tmdb_server)
+    return result
+
+
+async def admin_paging(args) -> dict:
+    """Seeds `redirects` documents, then pages through the admin listing and opens link details."""
+    application, bot_api, tmdb_server = await start_bot(args)
+    dispatcher = Dispatcher(application)
+    updates = UpdateFactory(application.bot)
+    errors_before = handler_errors()
+
+    seed_started = time.monotonic()
+    codes = []
+    batch = []
+    now = datetime.utcnow()
+    for i in range(args.redirects):
+        code = generate_redirect_code()
+        codes.append(code)
+        batch.append({
+            "code": code, "series_name": f"Series {i:05d}", "tmdb_id": i + 1, "media_type": "tv",
+            "private_channel_id": -1002000000000 - i, "invite_link": f"https://t.me/+seed{i:05d}",
+            "used_count": i % 97, "created_at": now,
+        })
+        if len(batch) == 1000:
+            await db.redirects.insert_many(batch)
+            batch = []
+    if batch:
+        await db.redirects.insert_many(batch)
+    seed_s = time.monotonic() - seed_started
+
+    last_page = max(1, (args.redirects + 9) // 10)
+    sequential = [callbacks.data(Action.MANAGE_PAGE, page) for page in range(1, 21)]
+    jumps = [callbacks.data(Action.MANAGE_PAGE, max(1, last_page * k // 10)) for k in range(1, 11)]
+    rng = random.Random(args.seed)
+    details = [callbacks.data(Action.MANAGE_LINK, code) for code in rng.sample(codes, min(20, len(codes)))]
+
+    dashboard = [await dispatcher.dispatch(updates.command(ADMIN_ID, "admin")) for _ in range(5)]
+    sequential_latency = [await dispatcher.dispatch(updates.callback(ADMIN_ID, data)) for data in sequential]
+    jump_latency = [await dispatcher.dispatch(updates.callback(ADMIN_ID, data)) for data in jumps]
+    detail_latency = [await dispatcher.dispatch(updates.callback(ADMIN_ID, data)) for data in details]
+
+    result = {
+        "redirects": args.redirects,
+        "seed_s": round(seed_s, 3),
+        "dashboard": percentiles(dashboard),
+        "page_sequential": percentiles(sequential_latency),
+        "page_jump": percentiles(jump_latency),
+        "link_details": percentiles(detail_latency),
+        "handler_errors": handler_errors() - errors_before,
+        "bot_api": bot_api.summary(),
+    }
+    await stop_bot(application, tmdb_server)
+    return result
+
+
+async def bulk_setup(args) -> dict:
+    """The admin adds the bot to `channels` channels and completes the setup conversation for each."""
+    application, bot_api, tmdb_server = await start_bot(args)
+    dispatcher = Dispatcher(application)
+    updates = UpdateFactory(application.bot)
+    errors_before = handler_errors()
+
+    steps = {"promoted": [], "accept": [], "search": [], "select": []}
+    totals = []
+    started = time.monotonic()
+    for i in range(args.channels):
+        channel_id = -1003000000000 - i
+        setup_started = time.monotonic()
+        steps["promoted"].append(await dispatcher.dispatch(updates.bot_promoted(ADMIN_ID, channel_id)))
+        steps["accept"].append(await dispatcher.dispatch(updates.callback(ADMIN_ID, f"setup_accept|{channel_id}")))
+        steps["search"].append(await dispatcher.dispatch(updates.text(ADMIN_ID, f"Bench Series {i}")))
+        steps["select"].append(await dispatcher.dispatch(updates.callback(ADMIN_ID, "select_idx|0")))
+        totals.append(time.monotonic() - setup_started)
+    wall = time.monotonic() - started
+
+    result = {
+        "channels": args.channels,
+        "created": await db.count_redirects(),
+        "wall_s": round(wall, 3),
+        "setup": percentiles(totals),
+        "steps": {name: percentiles(samples) for name, samples in steps.items()},
+        "handler_errors": handler_errors() - errors_before,
+        "bot_api": bot_api.summary(),
+        "tmdb": tmdb_server.summary(),
+    }
+    await stop_bot(application, tmdb_server)
+    return result
+
+
+async def backlog_replay(args) -> dict:
+    """
+    `backlog` /start clicks between STALE_UPDATE_AGE and an hour old, then `users` fresh ones,
+    all put on the update queue at once like getUpdates does after downtime.
+    """
+    application, bot_api, tmdb_server = await start_bot(args)
+    updates = UpdateFactory(application.bot)
+
+    code = generate_redirect_code()
+    await db.create_redirect({
+        "code": code, "series_name": "The Rookie", "tmdb_id": 79744, "media_type": "tv",
+        "private_channel_id": -1001000000001, "invite_link": "https://t.me/+primary",
+    })
+
+    # Handling time per update, from being queued until its (non-blocking) /start task finished
+    queued, finished = {}, {}
+    create_task = application.create_task
+
+    def timed_create_task(coroutine, update=None, **kwargs):
+        task = create_task(coroutine, update=update, **kwargs)
+        if update is not None:
+            task.add_done_callback(lambda _: finished.setdefault(update.update_id, time.monotonic()))
+        return task
+
+    application.create_task = timed_create_task
+    rng = random.Random(args.seed)
+    errors_before = handler_errors()
+    stale = [updates.command(200000 + i, "start", code, age=rng.uniform(Config.STALE_UPDATE_AGE + 1, 3600))
+             for i in range(args.backlog)]
+    fresh = [updates.command(300000 + i, "start", code) for i in range(args.users)]
+
+    started = time.monotonic()
+    for update in stale + fresh:
+        queued[update.update_id] = time.monotonic()
+        await application.update_queue.put(update)
+    await application.update_queue.join()
+    while len(finished) < len(queued):
+        await asyncio.sleep(0.05)
+    wall = time.monotonic() - started
+
+    def latency(batch):
+        return percentiles([finished[update.update_id] - queued[update.update_id] for update in batch])
+
+    result = {
+        "backlog": args.backlog,
+        "users": args.users,
+        "wall_s": round(wall, 3),
+        "fresh_latency": latency(fresh),
+        "stale_latency": latency(stale),
+        "cards_sent": bot_api.calls["sendPhoto"],
+        "invites_created": bot_api.calls["createChatInviteLink"],
+        "stale_replies": int(metrics.counter_value("stale_redirects_total")),
+        "handler_errors": handler_errors() - errors_before,
+        "bot_api": bot_api.summary(),
+    }
+    await stop_bot(application, tmdb_server)
+    return result
+
+
+SCENARIOS = {"viral_spike": viral_spike, "admin_paging": admin_paging, "bulk_setup": bulk_setup,
+             "backlog_replay": backlog_replay}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "scenario")},
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        results["meta"]["backend"] = await use_database()
+        print(f"Running {name}...", file=sys.stderr)
+        results["scenarios"][name] = await SCENARIOS[name](args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these (repeatable)")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=300, help="viral_spike / backlog_replay: (fresh) visitors")
+    parser.add_argument("--spread", type=float, default=2.0, help="viral_spike: arrival window in seconds")
+    parser.add_argument("--redirects", type=int, default=10000, help="admin_paging: seeded redirects")
+    parser.add_argument("--channels", type=int, default=50, help="bulk_setup: channels to set up")
+    parser.add_argument("--backlog", type=int, default=1000, help="backlog_replay: stale clicks in the backlog")
+    parser.add_argument("--bot-latency", type=float, default=0.02, help="Fake Bot API latency in seconds")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Share of Bot API calls answered with 429")
+    parser.add_argument("--member-ratio", type=float, default=0.1, help="Share of visitors who are already members")
+    parser.add_argument("--tmdb-latency", type=float, default=0.05, help="Stub TMDb latency in seconds")
+    parser.add_argument("--tmdb-error-ratio", type=float, default=0.0, help="Share of TMDb requests answered with 503")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Builds the offline title index from a generated fixture dump (same shape as TMDb's
+daily ID exports), checks a few lookups and measures build time and query latency.
+
+Usage: python benchmarks/bench_title_index.py [--titles 200000] [--queries 5000]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.title_index import TitleIndex, build_index  # noqa: E402
+
+# Known titles the checks below rely on, mixed into the generated ones
+FIXTURE_TV = [
+    (1, "The Rookie", 310.5),
+    (2, "The Rookie: Feds", 45.2),
+    (3, "Rookie Blue", 30.1),
+    (4, "The Office", 250.0),
+    (5, "The Office", 40.0),  # the UK original, less popular
+    (6, "Pokémon", 120.0),
+]
+FIXTURE_MOVIES = [
+    (7, "The Rookie", 20.0),
+    (8, "Amélie", 35.0),
+]
+SYLLABLES = ("ka", "ri", "mo", "tan", "el", "sho", "vin", "da", "lu", "ber", "no", "quin", "sa", "tor", "mi", "ga",
+             "ren", "pa", "dol", "is", "ve", "chu", "ling", "or")
+
+
+def write_dump(path: str, items: list, field: str):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for tmdb_id, title, popularity in items:
+            f.write(json.dumps({"adult": False, "id": tmdb_id, field: title, "popularity": popularity}) + "\n")
+        f.write(json.dumps({"adult": True, "id": 999999999, field: "Rookie Adult", "popularity": 999}) + "\n")
+
+
+def generate(count: int, rng: random.Random, first_id: int) -> list:
+    """Made-up titles of 1-4 words from a few thousand pseudo-words, plus a common 'The' prefix."""
+    words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(5000)]
+    titles = []
+    for i in range(count):
+        title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4))).title()
+        if rng.random() < 0.15:
+            title = "The " + title
+        titles.append((first_id + i, title, round(rng.expovariate(0.5), 3)))
+    return titles
+
+
+def check(index: TitleIndex):
+    found = index.search("the rookie")
+    assert [item["id"] for item in found[:2]] == [1, 7], found  # exact titles first, most popular first
+    assert 2 in {item["id"] for item in found}, found
+    assert index.search("rookie")[0]["id"] in (1, 3), "word-start keys"
+    assert [item["id"] for item in index.search("the office")[:2]] == [4, 5]
+    assert index.search("pokemon")[0]["title"] == "Pokémon", "accent-insensitive"
+    assert index.search("amelie")[0]["media_type"] == "movie"
+    assert all(item["title"] != "Rookie Adult" for item in index.search("rookie", limit=50)), "adult titles skipped"
+    assert index.search("zzzz nothing") == []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--titles", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tv_dump = os.path.join(tmp, "tv_series_ids_01_01_2025.json.gz")
+        movie_dump = os.path.join(tmp, "movie_ids_01_01_2025.json.gz")
+        generated = generate(args.titles, rng, first_id=100)
+        write_dump(tv_dump, FIXTURE_TV + generated[: args.titles // 2], "original_name")
+        write_dump(movie_dump, FIXTURE_MOVIES + generated[args.titles // 2:], "original_title")
+
+        output = os.path.join(tmp, "titles.idx")
+        started = time.monotonic()
+        stats = build_index([tv_dump, movie_dump], output)
+        build_s = time.monotonic() - started
+
+        index = TitleIndex(output)
+        check(index)
+
+        queries = [title for _, title, _ in rng.sample(generated, min(args.queries, len(generated)))]
+        queries += [" ".join(title.split()[:1])[:3] for title in queries[:len(queries) // 5]]  # short prefixes
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query)
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        index.close()
+
+    def pct(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1e6, 1)
+
+    print(f"index: {stats}, built in {build_s:.2f}s")
+    print(f"{len(latencies)} queries: p50 {pct(0.5)} us, p95 {pct(0.95)} us, p99 {pct(0.99)} us, max {pct(1)} us")
+    print("checks passed")
+
+
+if __name__ == "__main__":
+    main()
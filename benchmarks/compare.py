@@ -0,0 +1,81 @@
+"""
+Compares two bench_scenarios.py result files and flags regressions.
+
+Every numeric leaf is compared. Latencies, durations, call counts and errors are
+"lower is better"; throughput and completed work are "higher is better".
+
+Usage: python benchmarks/compare.py baseline.json current.json [--threshold 10] [--fail]
+"""
+import argparse
+import json
+import sys
+
+HIGHER_IS_BETTER = ("throughput", "served", "cards_sent", "created")
+# Inputs and bookkeeping, not results
+IGNORED = ("users", "redirects", "channels", "seed_s")
+
+
+def flatten(data: dict, prefix: str = "") -> dict:
+    values = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            values.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def is_regression(path: str, baseline: float, current: float, threshold: float) -> bool:
+    name = path.rsplit(".", 1)[-1]
+    if not baseline:
+        # From zero: any new error or rate-limited call counts, other metrics have no scale
+        return current > 0 and ("error" in name or "rate_limited" in name)
+    change = (current - baseline) / baseline * 100
+    if any(word in path for word in HIGHER_IS_BETTER):
+        return change < -threshold
+    return change > threshold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Percent change treated as a regression")
+    parser.add_argument("--fail", action="store_true", help="Exit with status 1 if anything regressed")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"baseline {baseline['meta']['revision']} ({baseline['meta'].get('backend')}) -> "
+          f"current {current['meta']['revision']} ({current['meta'].get('backend')})")
+    if baseline["meta"]["parameters"] != current["meta"]["parameters"]:
+        print("warning: runs used different parameters, numbers are not directly comparable")
+
+    old, new = flatten(baseline["scenarios"]), flatten(current["scenarios"])
+    regressions = 0
+    print(f"{'metric':<55} {'baseline':>12} {'current':>12} {'change':>9}")
+    for path in sorted(old.keys() | new.keys()):
+        if path.split(".")[1] in IGNORED:
+            continue
+        before, after = old.get(path), new.get(path)
+        if before is None or after is None:
+            print(f"{path:<55} {before if before is not None else '-':>12} {after if after is not None else '-':>12}")
+            continue
+        change = f"{(after - before) / before * 100:+.1f}%" if before else ""
+        flag = ""
+        if is_regression(path, before, after, args.threshold):
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{path:<55} {before:>12g} {after:>12g} {change:>9}{flag}")
+
+    print(f"\n{regressions} regression(s) above {args.threshold:g}%")
+    if args.fail and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
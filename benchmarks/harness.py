@@ -0,0 +1,366 @@
+"""
+Offline fixtures for the scenario benchmarks: a fake Telegram Bot API transport, a stub
+TMDb HTTP server, a MongoDB backend (mongomock or a local mongod) and Update builders.
+
+Nothing here talks to Telegram or TMDb. Import this module before any bot module: it sets
+the environment the bot's Config is read from. The mongomock backend (mongomock_motor) is a
+development dependency: pip install -r requirements-dev.txt
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import warnings
+import zlib
+from collections import Counter, defaultdict, deque
+from urllib.parse import parse_qsl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Set before config.py is imported (load_dotenv never overrides variables that are already set)
+BENCH_MONGO_URI = os.getenv("BENCH_MONGO_URI")  # e.g. mongodb://localhost:27017/xtv_redirect_bench
+os.environ["REDIRECT_DB_URI"] = BENCH_MONGO_URI or "mongodb://localhost:27017/xtv_redirect_bench"
+os.environ.setdefault("TMDB_API_KEY", "bench")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ANIMATION_FRAME_DELAY", "0")
+os.environ.setdefault("HEALTH_PORT", "0")
+
+from telegram import Update  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+from telegram.warnings import PTBUserWarning  # noqa: E402
+
+# The setup ConversationHandler's per_message hint is known and irrelevant here
+warnings.filterwarnings("ignore", category=PTBUserWarning)
+
+BOT_USER = {"id": 1000, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99/max of a list of seconds, in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+class FakeBotRequest(BaseRequest):
+    """
+    In-process Bot API: answers every method with a plausible result after `latency`
+    seconds (plus jitter) and answers a `rate_limit_ratio` share of calls with HTTP 429.
+    All calls are recorded per method.
+    """
+
+    def __init__(self, latency: float = 0.02, jitter: float = 0.01, rate_limit_ratio: float = 0.0,
+                 member_ratio: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.member_ratio = member_ratio
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.durations = defaultdict(list)
+        self._ids = itertools.count(1)
+
+    @property
+    def read_timeout(self):
+        return 5.0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def reset(self):
+        self.calls.clear()
+        self.rate_limited.clear()
+        self.durations.clear()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        started = time.monotonic()
+        self.calls[api_method] += 1
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        self.durations[api_method].append(time.monotonic() - started)
+
+        if self.rate_limit_ratio and api_method != "getMe" and self.random.random() < self.rate_limit_ratio:
+            self.rate_limited[api_method] += 1
+            body = {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1}}
+            return 429, json.dumps(body).encode()
+
+        return 200, json.dumps({"ok": True, "result": self.result(api_method, params)}).encode()
+
+    def message(self, params: dict) -> dict:
+        chat_id = params.get("chat_id", 1)
+        message = {
+            "message_id": params.get("message_id") or next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "caption" in params or "photo" in params:
+            message["caption"] = params.get("caption", "")
+            message["photo"] = [{"file_id": "p", "file_unique_id": "p", "width": 780, "height": 1170}]
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+    def invite_link(self, params: dict, revoked: bool = False) -> dict:
+        return {
+            "invite_link": params.get("invite_link") or f"https://t.me/+bench{next(self._ids):08d}",
+            "creator": BOT_USER,
+            "creates_join_request": False,
+            "is_primary": False,
+            "is_revoked": revoked,
+            "name": params.get("name"),
+            "member_limit": params.get("member_limit"),
+        }
+
+    def result(self, api_method: str, params: dict):
+        if api_method == "getMe":
+            return dict(BOT_USER, can_join_groups=True, can_read_all_group_messages=False, supports_inline_queries=False)
+        if api_method in ("sendMessage", "sendPhoto", "editMessageText", "editMessageCaption"):
+            return self.message(params)
+        if api_method == "getChatMember":
+            status = "member" if self.random.random() < self.member_ratio else "left"
+            return {"status": status, "user": {"id": params.get("user_id", 1), "is_bot": False, "first_name": "U"}}
+        if api_method == "createChatInviteLink":
+            return self.invite_link(params)
+        if api_method == "revokeChatInviteLink":
+            return self.invite_link(params, revoked=True)
+        if api_method == "getChat":
+            chat_id = params.get("chat_id")
+            return {"id": chat_id, "type": "channel", "title": f"Channel {chat_id}",
+                    "accent_color_id": 0, "max_reaction_count": 11}
+        return True
+
+    def summary(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "calls_total": sum(self.calls.values()),
+            "rate_limited": sum(self.rate_limited.values()),
+        }
+
+
+class StubTMDbServer:
+    """
+    Minimal HTTP server speaking the subset of the TMDb v3 API the bot uses
+    (search/multi, tv/{id}, movie/{id}) with configurable latency and 5xx ratio. Queued
+    `faults` (status, headers) answer the next requests, in order, before the normal routes;
+    queued `latencies` likewise override `latency` for the next requests.
+    """
+
+    def __init__(self, latency: float = 0.05, error_ratio: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.error_ratio = error_ratio
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.faults = deque()
+        self.latencies = deque()
+        self._server = None
+        self.port = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/3"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    @staticmethod
+    def tmdb_id(query: str) -> int:
+        # Stable per title, so the same search always selects the same series
+        return zlib.crc32(query.encode()) % 10_000_000 + 1
+
+    def route(self, path: str, query: dict):
+        parts = path.strip("/").split("/")
+        if parts[1:3] == ["search", "multi"]:
+            name = query.get("query", "")
+            return 200, {"results": [
+                {"id": self.tmdb_id(f"{name}#{i}") if i else self.tmdb_id(name), "media_type": "tv",
+                 "name": f"{name}" if i == 0 else f"{name} ({i})", "first_air_date": f"20{10 + i}-01-01",
+                 "overview": f"Overview of {name}."}
+                for i in range(5)
+            ]}
+        if len(parts) == 3 and parts[1] in ("tv", "movie") and parts[2].isdigit():
+            tmdb_id = int(parts[2])
+            return 200, {
+                "id": tmdb_id, "name": f"Series {tmdb_id}", "title": f"Movie {tmdb_id}",
+                "first_air_date": "2018-10-16", "release_date": "2018-10-16", "vote_average": 8.123,
+                "genres": [{"id": 1, "name": "Crime"}, {"id": 2, "name": "Drama"}, {"id": 3, "name": "Comedy"}],
+                "overview": "Starting over isn't easy, especially for small-town guy John Nolan. " * 4,
+                "poster_path": f"/poster{tmdb_id}.jpg", "episode_run_time": [43], "runtime": 120,
+            }
+        return 404, {"status_code": 34, "status_message": "The resource you requested could not be found."}
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                target = request_line.decode("latin-1").split()[1]
+                path, _, query_string = target.partition("?")
+                query = dict(parse_qsl(query_string))
+                self.requests[path.split("/")[2] if path.count("/") >= 2 else path] += 1
+
+                await asyncio.sleep(self.latencies.popleft() if self.latencies else self.latency)
+                extra_headers = {}
+                if self.faults:
+                    status, extra_headers = self.faults.popleft()
+                    body = {"status_code": status}
+                elif self.error_ratio and self.random.random() < self.error_ratio:
+                    status, body = 503, {"status_code": 503}
+                else:
+                    status, body = self.route(path, query)
+                payload = json.dumps(body).encode()
+                extra = "".join(f"{name}: {value}\r\n" for name, value in extra_headers.items())
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n{extra}"
+                    f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if headers.get("connection") == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def summary(self) -> dict:
+        return {"requests": dict(self.requests), "requests_total": sum(self.requests.values())}
+
+
+async def use_database():
+    """
+    Points the global `database.db` at a clean benchmark database: the mongod named by
+    BENCH_MONGO_URI if set, otherwise an in-memory mongomock backend. Returns the backend name.
+    """
+    from database import db
+
+    if BENCH_MONGO_URI:
+        await db.client.drop_database(db.db.name)
+        await db.ensure_indexes()
+        backend = "mongod"
+    else:
+        # No indexes: mongomock scans either way and checks unique indexes in O(n) per insert
+        from mongomock_motor import AsyncMongoMockClient
+
+        db.client = AsyncMongoMockClient()
+        db.db = db.client.get_database("xtv_redirect_bench")
+        db.redirects = db.db.redirect_links
+        db.redirects_read = db.redirects
+        db.invite_links = db.db.invite_links
+        db.tmdb_metadata = db.db.tmdb_metadata
+        db.broadcast_jobs = db.db.broadcast_jobs
+        db.archive = db.db.redirect_archive
+        backend = "mongomock"
+
+    db.metadata_cache.clear()
+    db.redirect_cache.clear()
+    db.archived_usage.clear()
+    db.recent_writes.clear()
+    return backend
+
+
+class UpdateFactory:
+    """Builds telegram Update objects for a bot, numbering them like getUpdates would."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _update(self, **payload) -> Update:
+        return Update.de_json(dict(update_id=next(self._ids), **payload), self.bot)
+
+    def command(self, user_id: int, command: str, args: str = "", age: float = 0) -> Update:
+        text = f"/{command} {args}".strip()
+        return self.text(user_id, text, entities=[{"type": "bot_command", "offset": 0, "length": len(command) + 1}], age=age)
+
+    def text(self, user_id: int, text: str, entities: list = None, age: float = 0) -> Update:
+        """`age`: seconds since the user sent it (updates replayed after downtime)."""
+        message = {
+            "message_id": next(self._ids), "date": int(time.time() - age),
+            "chat": {"id": user_id, "type": "private"}, "from": self.user(user_id), "text": text,
+        }
+        if entities:
+            message["entities"] = entities
+        return self._update(message=message)
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return self._update(callback_query={
+            "id": str(next(self._ids)), "from": self.user(user_id), "chat_instance": "bench", "data": data,
+            "message": {"message_id": next(self._ids), "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "from": BOT_USER, "text": "..."},
+        })
+
+    def bot_promoted(self, user_id: int, channel_id: int) -> Update:
+        rights = dict.fromkeys((
+            "can_be_edited", "is_anonymous", "can_manage_chat", "can_delete_messages", "can_manage_video_chats",
+            "can_restrict_members", "can_promote_members", "can_change_info", "can_invite_users",
+            "can_post_stories", "can_edit_stories", "can_delete_stories", "can_post_messages", "can_edit_messages",
+        ), True)
+        return self._update(my_chat_member={
+            "chat": {"id": channel_id, "type": "channel", "title": f"Channel {channel_id}"},
+            "from": self.user(user_id), "date": int(time.time()),
+            "old_chat_member": {"status": "left", "user": BOT_USER},
+            "new_chat_member": dict(rights, status="administrator", user=BOT_USER),
+        })
+
+
+class Dispatcher:
+    """
+    Feeds updates to an Application and waits for them to be fully handled, including
+    handlers registered with block=False (which PTB runs as background tasks).
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self._tasks = {}
+        create_task = application.create_task
+
+        def tracking_create_task(coroutine, update=None, **kwargs):
+            task = create_task(coroutine, update=update, **kwargs)
+            if update is not None:
+                self._tasks.setdefault(id(update), []).append(task)
+            return task
+
+        application.create_task = tracking_create_task
+
+    async def dispatch(self, update: Update) -> float:
+        """Processes one update; returns its end-to-end handling time in seconds."""
+        started = time.monotonic()
+        await self.application.process_update(update)
+        tasks = self._tasks.pop(id(update), [])
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return time.monotonic() - started
@@ -11,15 +11,125 @@ class Config:
     CEO_ID = int(os.getenv("CEO_ID", 0))
     TMDB_API_KEY = os.getenv("TMDB_API_KEY")
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" (colored) or "json"
+    LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", 20))  # Keep 1 in N high-volume records
+
+    # Multi-bot mode: JSON list of extra bots, see utils/tenants.py
+    TENANTS = os.getenv("TENANTS")
+
+    # MongoDB connection pool / routing
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+    MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 0))  # 0 = no limit
+    MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0))  # 0 = no limit
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+    MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"
+    MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")  # for read-heavy paths
+    MONGO_HEALTH_INTERVAL = float(os.getenv("MONGO_HEALTH_INTERVAL", 30))
+
+    # In-process cache of TMDb metadata documents
+    METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", 5000))
+    METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", 3600))
+    REDIRECT_CACHE_SIZE = int(os.getenv("REDIRECT_CACHE_SIZE", 10000))
+    REDIRECT_CACHE_TTL = float(os.getenv("REDIRECT_CACHE_TTL", 300))
+
+    # Offline TMDb title index for the setup search (build it with `python -m services.title_index`)
+    TITLE_INDEX_PATH = os.getenv("TITLE_INDEX_PATH", "")
+
+    # Inline mode ('@bot <series>'); enable it for the bot with BotFather's /setinline
+    INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", 300))  # seconds Telegram may cache an answer
+    INLINE_MAX_RESULTS = min(50, int(os.getenv("INLINE_MAX_RESULTS", 20)))  # Telegram allows 50 per answer
+
+    # Cross-instance cache coherence: "auto" follows a change stream (replica sets) and falls
+    # back to polling on a standalone mongod; "poll" always polls; "off" relies on cache TTLs
+    CACHE_SYNC_MODE = os.getenv("CACHE_SYNC_MODE", "auto").lower()
+    CACHE_SYNC_POLL_INTERVAL = float(os.getenv("CACHE_SYNC_POLL_INTERVAL", 5))
+
+    # Startup cache warm-up and snapshot (CACHE_SNAPSHOT_PATH empty = no snapshot)
+    WARMUP_REDIRECTS = int(os.getenv("WARMUP_REDIRECTS", 2000))  # 0 disables the warm-up
+    WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 20))  # seconds startup may wait for it
+    CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "")
+    CACHE_SNAPSHOT_MAX_AGE = float(os.getenv("CACHE_SNAPSHOT_MAX_AGE", 3600))
+
+    # Archival of unused redirects (services/archiver.py); ARCHIVE_AFTER_DAYS=0 disables it
+    ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+    ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 3600))
+    ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", 500))
+    ARCHIVE_PAUSE = float(os.getenv("ARCHIVE_PAUSE", 1))  # seconds between batches
+
+    # Graceful shutdown: seconds in-flight redirects get to finish after SIGTERM
+    SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 20))
+
+    # Health / readiness / metrics HTTP endpoints (HEALTH_PORT=0 disables the server)
+    HEALTH_HOST = os.getenv("HEALTH_HOST", "0.0.0.0")
+    HEALTH_PORT = int(os.getenv("HEALTH_PORT", 8080))
+    LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", 100))
+    LOOP_LAG_UNHEALTHY_MS = float(os.getenv("LOOP_LAG_UNHEALTHY_MS", 1000))
+    READY_MAX_POLL_AGE = float(os.getenv("READY_MAX_POLL_AGE", 60))  # seconds since last getUpdates
+
+    # Event loop blocking detector (debug only: asyncio debug mode has a runtime cost)
+    LOOP_DEBUG = os.getenv("LOOP_DEBUG", "0").lower() in ("1", "true", "yes")
+    LOOP_DEBUG_THRESHOLD_MS = float(os.getenv("LOOP_DEBUG_THRESHOLD_MS", 100))
+    LOOP_DEBUG_REPORT_INTERVAL = float(os.getenv("LOOP_DEBUG_REPORT_INTERVAL", 300))
+    LOOP_DEBUG_TOP_N = int(os.getenv("LOOP_DEBUG_TOP_N", 10))
+    PROFILE_DURATION = float(os.getenv("PROFILE_DURATION", 10))  # admin dashboard sampling profiler
+
+    # TMDb client resilience
+    TMDB_TIMEOUT = float(os.getenv("TMDB_TIMEOUT", 5.0))
+    TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", 2))
+    TMDB_MAX_RETRY_AFTER = float(os.getenv("TMDB_MAX_RETRY_AFTER", 10.0))
+    TMDB_BREAKER_THRESHOLD = int(os.getenv("TMDB_BREAKER_THRESHOLD", 5))
+    TMDB_BREAKER_RESET = float(os.getenv("TMDB_BREAKER_RESET", 30.0))
+    TMDB_HEDGE_DELAY = float(os.getenv("TMDB_HEDGE_DELAY", 0))  # Seconds, 0 disables hedging
+
+    # /start flood protection (token buckets: RATE tokens per second, up to BURST)
+    START_USER_RATE = float(os.getenv("START_USER_RATE", 0.2))
+    START_USER_BURST = int(os.getenv("START_USER_BURST", 3))
+    START_CODE_RATE = float(os.getenv("START_CODE_RATE", 20))
+    START_CODE_BURST = int(os.getenv("START_CODE_BURST", 100))
+    ANIMATION_FRAME_DELAY = float(os.getenv("ANIMATION_FRAME_DELAY", 1.5))  # seconds per loading frame
+    # Backlog after downtime: older deep link clicks get a plain reply without the animation,
+    # and past the drop age none at all (0 = never drop)
+    STALE_UPDATE_AGE = float(os.getenv("STALE_UPDATE_AGE", 60))
+    STALE_UPDATE_DROP_AGE = float(os.getenv("STALE_UPDATE_DROP_AGE", 21600))
+
+    # Invite link lifecycle
+    INVITE_RECORD_RETENTION_DAYS = int(os.getenv("INVITE_RECORD_RETENTION_DAYS", 30))
+    INVITE_SWEEP_INTERVAL = float(os.getenv("INVITE_SWEEP_INTERVAL", 300))
+    INVITE_SWEEP_BATCH = int(os.getenv("INVITE_SWEEP_BATCH", 100))
+    INVITE_REVOKE_RATE = float(os.getenv("INVITE_REVOKE_RATE", 5))  # revoke calls per second
+
+    # Scheduled broadcasts to all managed channels
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 15))  # messages per second, all jobs together
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 5))
+    BROADCAST_CHAT_INTERVAL = float(os.getenv("BROADCAST_CHAT_INTERVAL", 3))  # min seconds between messages to one chat
+    BROADCAST_MAX_ATTEMPTS = int(os.getenv("BROADCAST_MAX_ATTEMPTS", 3))
+    BROADCAST_POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", 15))
+    # Seconds a running job stays reserved for its process without a heartbeat (renewed every poll)
+    BROADCAST_LEASE = float(os.getenv("BROADCAST_LEASE", 120))
+
+    # Channel health auditor (bot still admin with "Invite Users" in every channel)
+    CHANNEL_AUDIT_INTERVAL = float(os.getenv("CHANNEL_AUDIT_INTERVAL", 3600))
+    CHANNEL_AUDIT_CONCURRENCY = int(os.getenv("CHANNEL_AUDIT_CONCURRENCY", 5))
+    CHANNEL_AUDIT_RATE = float(os.getenv("CHANNEL_AUDIT_RATE", 10))  # getChatMember calls per second
+    # Consecutive invite creation errors after which a channel (primary or mirror) is marked broken
+    MIRROR_EJECT_FAILURES = int(os.getenv("MIRROR_EJECT_FAILURES", 3))
+
+    # Admin sessions (channel setup, change channel / add mirror flows) idle this long are
+    # abandoned: the reaper frees their state and revokes unused setup invite links
+    SESSION_TIMEOUT = float(os.getenv("SESSION_TIMEOUT", 1800))
+    SESSION_REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", 300))
 
     @staticmethod
     def validate():
         missing = []
-        if not Config.BOT_TOKEN:
+        if not Config.BOT_TOKEN and not Config.TENANTS:
             missing.append("BOT_TOKEN")
         if not Config.REDIRECT_DB_URI:
             missing.append("REDIRECT_DB_URI")
-        if not Config.CEO_ID:
+        if Config.BOT_TOKEN and not Config.CEO_ID:
             missing.append("CEO_ID")
         if not Config.TMDB_API_KEY:
             missing.append("TMDB_API_KEY")
@@ -1,14 +1,150 @@
+import asyncio
+import importlib.util
+import threading
+import time
+from collections import deque
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConfigurationError
+from pymongo import ASCENDING, DeleteOne, ReadPreference, monitoring
+from pymongo.errors import BulkWriteError, ConfigurationError, DuplicateKeyError, PyMongoError
 from config import Config
-from datetime import datetime
+from models import REDIRECT_FIELDS, Redirect, TmdbDetails
+from datetime import datetime, timedelta
+from utils.background import PeriodicTask
+from utils.cache import TTLCache
 from utils.logger import setup_logger
+from utils.metrics import metrics
 
 logger = setup_logger(__name__)
 
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Wire compressors and the optional package each one needs
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Records connection checkout wait times. Events fire on Motor's worker threads.
+    """
+
+    def __init__(self, samples: int = 1000):
+        self._lock = threading.Lock()
+        self.waits = deque(maxlen=samples)  # seconds
+        self.checkouts = 0
+        self.failures = 0
+        self.in_use = 0
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            if event.duration is not None:
+                self.waits.append(event.duration)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        """Checkout wait statistics over the most recent samples, in milliseconds."""
+        with self._lock:
+            waits = sorted(self.waits)
+            stats = {"checkouts": self.checkouts, "failures": self.failures, "in_use": self.in_use}
+        if waits:
+            stats["wait_avg_ms"] = round(sum(waits) / len(waits) * 1000, 2)
+            stats["wait_p95_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2)
+            stats["wait_max_ms"] = round(waits[-1] * 1000, 2)
+        return stats
+
+
+def _client_options() -> dict:
+    """Builds AsyncIOMotorClient keyword options from Config."""
+    options = {
+        "maxPoolSize": Config.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": Config.MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": Config.MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "waitQueueTimeoutMS": Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+    if Config.MONGO_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = Config.MONGO_MAX_IDLE_TIME_MS
+    if Config.MONGO_SOCKET_TIMEOUT_MS:
+        options["socketTimeoutMS"] = Config.MONGO_SOCKET_TIMEOUT_MS
+
+    compressors = []
+    for name in filter(None, (c.strip() for c in Config.MONGO_COMPRESSORS.split(","))):
+        module = COMPRESSOR_MODULES.get(name)
+        if module and importlib.util.find_spec(module):
+            compressors.append(name)
+        else:
+            logger.warning(f"MongoDB compressor '{name}' is unavailable (missing package '{module}'), skipping it.")
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+
+    return options
+
+# Sentinel for lookups that should not be restricted to one tenant
+ANY_TENANT = object()
+
+# Seconds after a write during which a code is read from the primary, not a (lagging) secondary
+READ_YOUR_WRITES_WINDOW = 30
+
+# Hot-path projections: redirect documents never need to drag legacy embedded metadata along
+REDIRECT_PROJECTION = REDIRECT_FIELDS
+LISTING_PROJECTION = {"code": 1, "series_name": 1}
+# A redirect's channels and their last known health (channel auditor)
+CHANNELS_PROJECTION = {"code": 1, "series_name": 1, "private_channel_id": 1, "channel_status": 1, "channel_error": 1, "mirrors": 1}
+# What the inline search index keeps per redirect (tmdb_details only on unmigrated documents)
+SEARCH_PROJECTION = {
+    "code": 1, "tenant": 1, "series_name": 1, "tmdb_id": 1, "media_type": 1,
+    "used_count": 1, "private_channel_id": 1, "channel_status": 1, "mirrors": 1, "tmdb_details": 1,
+}
+
 class Database:
     def __init__(self):
-        self.client = AsyncIOMotorClient(Config.REDIRECT_DB_URI)
+        self.pool_monitor = PoolMonitor()
+        # Checkout waits are over the most recent samples (0 before the first checkout)
+        for stat in ("in_use", "failures", "wait_avg_ms", "wait_p95_ms", "wait_max_ms"):
+            metrics.gauge(f"mongo_pool_{stat}", lambda stat=stat: self.pool_monitor.snapshot().get(stat, 0))
+        self.client = AsyncIOMotorClient(
+            Config.REDIRECT_DB_URI,
+            event_listeners=[self.pool_monitor],
+            **_client_options()
+        )
         try:
             self.db = self.client.get_default_database()
         except ConfigurationError:
@@ -16,53 +152,737 @@ class Database:
             self.db = self.client.get_database("xtv_redirect")
 
         self.redirects = self.db.redirect_links
-        logger.info("Connected to MongoDB")
+        self.invite_links = self.db.invite_links
+        self.tmdb_metadata = self.db.tmdb_metadata
+        self.broadcast_jobs = self.db.broadcast_jobs
+        # Redirects unused for ARCHIVE_AFTER_DAYS (services.archiver), promoted back on their next use
+        self.archive = self.db.redirect_archive
+        # tenant -> used_count summed over its archived redirects (they are rarely written)
+        self.archived_usage = TTLCache(max_size=256, ttl=Config.ARCHIVE_INTERVAL)
+        # (media_type, tmdb_id) -> TmdbDetails, shared by every tenant
+        self.metadata_cache = TTLCache(max_size=Config.METADATA_CACHE_SIZE, ttl=Config.METADATA_CACHE_TTL)
+        # code -> Redirect for the /start hot path. Local writes invalidate it through
+        # the listener below; the TTL bounds staleness from writes made by other processes.
+        self.redirect_cache = TTLCache(max_size=Config.REDIRECT_CACHE_SIZE, ttl=Config.REDIRECT_CACHE_TTL)
+        self._listeners = [self.redirect_cache.pop]
+        # Codes written recently (here or, via cache sync, elsewhere): get_redirect reads them from the primary
+        self.recent_writes = TTLCache(max_size=Config.REDIRECT_CACHE_SIZE, ttl=READ_YOUR_WRITES_WINDOW)
+
+        # Read-heavy paths (cached redirect lookups, search, stats) may be served by secondaries;
+        # admin listings and reads that must see the latest write use the primary
+        read_preference = READ_PREFERENCES.get(Config.MONGO_READ_PREFERENCE)
+        if read_preference is None:
+            logger.warning(f"Unknown MONGO_READ_PREFERENCE '{Config.MONGO_READ_PREFERENCE}', using primary.")
+            read_preference = ReadPreference.PRIMARY
+        if read_preference == ReadPreference.PRIMARY:
+            self.redirects_read = self.redirects
+        else:
+            self.redirects_read = self.redirects.with_options(read_preference=read_preference)
+
+        # Health state, refreshed by the monitor task
+        self.healthy = False
+        self.last_ping_ok = None  # monotonic timestamp
+        self.ping_latency_ms = None
+        self.server_status = {}
+        self.monitor = PeriodicTask("mongo-monitor", Config.MONGO_HEALTH_INTERVAL, self.check_health)
+        logger.info("MongoDB client configured")
+
+    async def ping(self) -> bool:
+        """Pings the server and updates the health state."""
+        started = time.monotonic()
+        try:
+            await self.client.admin.command("ping")
+        except PyMongoError as e:
+            if self.healthy:
+                logger.error(f"MongoDB ping failed: {e}")
+            self.healthy = False
+            return False
+
+        self.ping_latency_ms = round((time.monotonic() - started) * 1000, 2)
+        self.last_ping_ok = time.monotonic()
+        if not self.healthy:
+            logger.info(f"Connected to MongoDB (ping {self.ping_latency_ms} ms)")
+        self.healthy = True
+        return True
+
+    async def check_health(self):
+        """Periodic ping plus a serverStatus connection summary (when permitted)."""
+        if not await self.ping():
+            return
+        try:
+            status = await self.client.admin.command("serverStatus", repl=0, metrics=0, locks=0)
+            self.server_status = {"connections": status.get("connections", {}), "uptime": status.get("uptime")}
+        except PyMongoError:
+            # Not permitted on some hosted tiers; ping alone decides health
+            self.server_status = {}
+        logger.debug("MongoDB pool: %s", self.pool_monitor.snapshot())
+
+    def is_ready(self) -> bool:
+        """True if the last ping succeeded recently enough to serve traffic."""
+        if not self.healthy or self.last_ping_ok is None:
+            return False
+        return time.monotonic() - self.last_ping_ok < Config.MONGO_HEALTH_INTERVAL * 3
+
+    def health_snapshot(self) -> dict:
+        return {
+            "ready": self.is_ready(),
+            "ping_ms": self.ping_latency_ms,
+            "pool": self.pool_monitor.snapshot(),
+            "server": self.server_status,
+        }
+
+    async def ensure_indexes(self):
+        """Creates the indexes the bot relies on. Safe to call on every startup."""
+        await self.redirects.create_index("code", unique=True)
+        await self.tmdb_metadata.create_index([("media_type", ASCENDING), ("tmdb_id", ASCENDING)], unique=True)
+        await self.invite_links.create_index("invite_link", unique=True)
+        await self.invite_links.create_index([("tenant", ASCENDING), ("revoked_at", ASCENDING), ("expires_at", ASCENDING)])
+        await self.redirects.create_index([("tenant", ASCENDING), ("created_at", ASCENDING)])
+        # TTL index: Mongo drops link records once their retention period is over
+        await self.invite_links.create_index("purge_at", expireAfterSeconds=0)
+        await self.broadcast_jobs.create_index([("tenant", ASCENDING), ("status", ASCENDING), ("run_at", ASCENDING)])
+        await self.redirects.create_index([("tenant", ASCENDING), ("channel_status", ASCENDING)])
+        # Polling fallback of the cache sync (standalone mongod without change streams)
+        await self.redirects.create_index("updated_at")
+        # Archival candidates, and the archive itself
+        await self.redirects.create_index([("last_used", ASCENDING), ("created_at", ASCENDING)])
+        await self.archive.create_index("code", unique=True)
+        await self.archive.create_index([("tenant", ASCENDING), ("tmdb_id", ASCENDING)])
+
+    @staticmethod
+    def scope(tenant, query: dict = None) -> dict:
+        """
+        Restricts a query to one tenant. The default tenant's key is None,
+        which also matches documents written before multi-bot mode.
+        """
+        scoped = dict(query or {})
+        scoped["tenant"] = tenant
+        return scoped
+
+    def add_listener(self, callback):
+        """
+        Registers callback(code) to be called whenever a redirect is created, modified or
+        deleted, so in-process caches can drop stale entries.
+        """
+        self._listeners.append(callback)
+
+    def invalidate(self, code: str):
+        """Tells every listener that `code` changed elsewhere (another instance, the shell...)."""
+        self._notify(code)
+
+    def _notify(self, code: str):
+        self.recent_writes.set(code, True)
+        for callback in self._listeners:
+            try:
+                callback(code)
+            except Exception as e:
+                logger.error("Redirect listener failed for %s: %s", code, e)
 
     async def create_redirect(self, data: dict):
         """
         Creates a new redirect entry.
         data should contain: code, series_name, tmdb_id, private_channel_id, invite_link
         """
-        data['created_at'] = datetime.utcnow()
+        data['created_at'] = data['updated_at'] = datetime.utcnow()
         data['used_count'] = 0
         data['last_used'] = None
 
+        # TMDb details live in the shared metadata collection, not on the redirect
+        details = data.pop('tmdb_details', None)
+        if details:
+            await self.save_tmdb_metadata(data.get('media_type', 'tv'), data.get('tmdb_id'), details)
+
         try:
             result = await self.redirects.insert_one(data)
             logger.info(f"Created redirect for {data.get('series_name')} with code {data.get('code')}")
+            self._notify(data.get('code'))
             return result.inserted_id
         except Exception as e:
             logger.error(f"Error creating redirect: {e}")
             return None
 
-    async def get_redirect(self, code: str):
-        """Retrieves a redirect entry by code."""
-        return await self.redirects.find_one({"code": code})
+    async def get_redirect(self, code: str, tenant=ANY_TENANT, cached: bool = True):
+        """
+        Retrieves a redirect (models.Redirect) by code, optionally only if it belongs to `tenant`.
+        Pass cached=False where usage counters must be current (they are not invalidated
+        on every visit): it reads from the primary.
+        """
+        entry = self.redirect_cache.get(code) if cached else None
+        if entry is None:
+            # A secondary may not have replicated a write made moments ago yet
+            fresh = not cached or code in self.recent_writes
+            collection = self.redirects if fresh else self.redirects_read
+            doc = await collection.find_one({"code": code}, REDIRECT_PROJECTION)
+            if doc is None and collection is not self.redirects:
+                # Unknown on a secondary may just be replication lag (a redirect created moments ago)
+                doc = await self.redirects.find_one({"code": code}, REDIRECT_PROJECTION)
+            entry = Redirect.from_bson(doc) if doc else await self.promote({"code": code})
+            if entry:
+                self.redirect_cache.set(code, entry)
+        if entry and tenant is not ANY_TENANT and entry.tenant != tenant:
+            return None
+        return entry
+
+    async def find_redirect(self, tenant, query: dict):
+        """Finds one of the tenant's redirects matching `query` (a Redirect), archived ones included."""
+        doc = await self.redirects.find_one(self.scope(tenant, query), REDIRECT_PROJECTION)
+        if doc is None:
+            return await self.promote(self.scope(tenant, query))
+        return Redirect.from_bson(doc)
 
     async def update_redirect(self, code: str, update_data: dict):
         """Updates specific fields of a redirect entry."""
-        await self.redirects.update_one(
-            {"code": code},
-            {"$set": update_data}
+        if "private_channel_id" in update_data:
+            # A new channel starts healthy; the auditor re-checks it on its next run
+            update_data = dict(update_data, channel_status="ok", channel_error=None)
+        update = {"$set": dict(update_data, updated_at=datetime.utcnow())}
+        result = await self.redirects.update_one({"code": code}, update)
+        if not result.matched_count:
+            await self.archive.update_one({"code": code}, update)
+        self._notify(code)
+
+    async def delete_redirect(self, code: str):
+        """Deletes a redirect entry."""
+        await self.redirects.delete_one({"code": code})
+        await self.archive.delete_one({"code": code})
+        self._notify(code)
+
+    async def update_stats(self, code: str, invite_channel: int = None):
+        """Updates used_count and last_used for a redirect, and the per-channel invite count if one was issued."""
+        update = {
+            "$inc": {"used_count": 1},
+            "$set": {"last_used": datetime.utcnow()}
+        }
+        if invite_channel is not None:
+            update["$inc"][f"invites_by_channel.{invite_channel}"] = 1
+        result = await self.redirects.update_one({"code": code}, update)
+        if not result.matched_count:
+            # Archived while the visitor was served from the cache
+            await self.archive.update_one({"code": code}, update)
+
+    async def hottest_redirects(self, limit: int):
+        """Streams the most used redirects (then most recently used) across all tenants."""
+        cursor = self.redirects_read.find({}, REDIRECT_PROJECTION).sort(
+            [("used_count", -1), ("last_used", -1)]
+        ).limit(limit).batch_size(500)
+        async for doc in cursor:
+            yield Redirect.from_bson(doc)
+
+    def watch_redirects(self, resume_after=None):
+        """
+        Change stream of redirect documents, without the writes made by every visit
+        (update_stats only touches used_count/last_used/invites_by_channel). Needs a replica set.
+        """
+        pipeline = [{"$match": {"$or": [
+            {"operationType": {"$in": ["insert", "replace", "delete"]}},
+            {"operationType": "update", "$expr": {"$or": [
+                {"$gt": [{"$size": {"$ifNull": ["$updateDescription.removedFields", []]}}, 0]},
+                {"$gt": [{"$size": {"$setDifference": [
+                    # Top-level field of each updated path ('invites_by_channel.-100...' -> 'invites_by_channel')
+                    {"$map": {
+                        "input": {"$objectToArray": "$updateDescription.updatedFields"},
+                        "in": {"$arrayElemAt": [{"$split": ["$$this.k", "."]}, 0]},
+                    }},
+                    ["used_count", "last_used", "invites_by_channel"]
+                ]}}, 0]},
+            ]}},
+        ]}}]
+        return self.redirects.watch(pipeline, full_document="updateLookup", resume_after=resume_after)
+
+    def changed_redirects(self, since: datetime):
+        """Streams redirects modified after `since`, oldest change first (polling fallback of watch_redirects)."""
+        return self.redirects.find({"updated_at": {"$gt": since}}, REDIRECT_PROJECTION).sort("updated_at", 1)
+
+    async def existing_codes(self, codes: list) -> set:
+        """Returns which of `codes` still exist."""
+        cursor = self.redirects.find({"code": {"$in": codes}}, {"code": 1, "_id": 0})
+        return {doc['code'] async for doc in cursor}
+
+    def iter_search_entries(self, tenant=ANY_TENANT):
+        """Streams redirects with the fields the inline search index needs."""
+        query = {} if tenant is ANY_TENANT else self.scope(tenant)
+        return self.redirects_read.find(query, SEARCH_PROJECTION).batch_size(500)
+
+    async def get_search_entry(self, code: str):
+        """Reads one redirect for the search index from the primary, so a write just made is visible."""
+        return await self.redirects.find_one({"code": code}, SEARCH_PROJECTION)
+
+    async def get_all_redirects(self):
+        """Retrieves all redirect entries."""
+        cursor = self.redirects_read.find({}, REDIRECT_PROJECTION).sort("created_at", -1)
+        return [Redirect.from_bson(doc) async for doc in cursor]
+
+    # --- Archive (redirects nobody used for a while) ---
+
+    @staticmethod
+    def _archivable(cutoff: datetime) -> dict:
+        """Redirects last used before `cutoff`, or never used and created before it."""
+        return {"$or": [
+            {"last_used": {"$lt": cutoff}},
+            {"last_used": None, "created_at": {"$lt": cutoff}},
+        ]}
+
+    async def archive_batch(self, cutoff: datetime, limit: int) -> list:
+        """
+        Moves up to `limit` redirects unused since `cutoff` to the archive. Returns their codes.
+        A live document is only deleted if it is still the version that was copied (same
+        updated_at) and still unused, so a visit or an admin/auditor write made while it is
+        being moved keeps it live, and its archive copy is dropped again.
+        """
+        docs = await self.redirects.find(self._archivable(cutoff)).limit(limit).to_list(length=limit)
+        if not docs:
+            return []
+        archived_at = datetime.utcnow()
+        codes = [doc['code'] for doc in docs]
+        for doc in docs:
+            doc['archived_at'] = archived_at
+        try:
+            await self.archive.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            # Copies left over from an interrupted run may be older than this read: refresh them
+            for error in errors:
+                doc = docs[error['index']]
+                await self.archive.replace_one({"_id": doc['_id']}, doc)
+
+        unchanged = self._archivable(cutoff)
+        await self.redirects.bulk_write([
+            DeleteOne(dict(unchanged, _id=doc['_id'], updated_at=doc.get('updated_at'))) for doc in docs
+        ], ordered=False)
+        kept = await self.existing_codes(codes)
+        if kept:
+            await self.archive.delete_many({"code": {"$in": list(kept)}})
+        archived = [code for code in codes if code not in kept]
+        self.archived_usage.clear()
+        for code in archived:
+            self._notify(code)
+        return archived
+
+    async def promote(self, query: dict):
+        """
+        Moves the archived redirect matching `query` back to the hot collection.
+        Returns it as a Redirect, or None if the archive has no match.
+        """
+        doc = await self.archive.find_one(query)
+        if doc is None:
+            return None
+        doc.pop('archived_at', None)
+        doc['updated_at'] = datetime.utcnow()
+        try:
+            await self.redirects.insert_one(doc)
+            logger.info(f"Promoted archived redirect {doc['code']}")
+        except DuplicateKeyError:
+            pass  # promoted concurrently (another visitor or instance)
+        await self.archive.delete_one({"_id": doc['_id']})
+        self.archived_usage.clear()
+        self._notify(doc['code'])
+        return Redirect.from_bson(doc)
+
+    async def count_archived(self, tenant=ANY_TENANT) -> int:
+        query = {} if tenant is ANY_TENANT else self.scope(tenant)
+        return await self.archive.count_documents(query)
+
+    # --- TMDb metadata (one document per title, shared by redirects and tenants) ---
+
+    async def save_tmdb_metadata(self, media_type: str, tmdb_id, details: dict) -> TmdbDetails:
+        """Stores TMDb details (as returned by TMDBClient.get_details) for a title, replacing older ones."""
+        await self.tmdb_metadata.update_one(
+            {"media_type": media_type, "tmdb_id": tmdb_id},
+            {"$set": {"details": details, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        model = TmdbDetails.from_bson(details)
+        self.metadata_cache.set((media_type, tmdb_id), model)
+        return model
+
+    async def get_tmdb_metadata(self, media_type: str, tmdb_id) -> TmdbDetails | None:
+        """Returns cached TMDb details for a title, or None if they were never stored."""
+        key = (media_type, tmdb_id)
+        details = self.metadata_cache.get(key)
+        if details is None:
+            doc = await self.tmdb_metadata.find_one({"media_type": media_type, "tmdb_id": tmdb_id}, {"details": 1})
+            if doc:
+                details = TmdbDetails.from_bson(doc['details'])
+                self.metadata_cache.set(key, details)
+        return details
+
+    async def load_tmdb_metadata(self, keys: list) -> dict:
+        """Bulk-loads TMDb details for (media_type, tmdb_id) pairs into the cache. Returns the ones found."""
+        by_type = {}
+        for media_type, tmdb_id in keys:
+            by_type.setdefault(media_type, []).append(tmdb_id)
+        loaded = {}
+        for media_type, ids in by_type.items():
+            cursor = self.tmdb_metadata.find({"media_type": media_type, "tmdb_id": {"$in": ids}}, {"tmdb_id": 1, "details": 1})
+            async for doc in cursor:
+                key = (media_type, doc['tmdb_id'])
+                loaded[key] = TmdbDetails.from_bson(doc['details'])
+                self.metadata_cache.set(key, loaded[key])
+        return loaded
+
+    async def pop_legacy_details(self, code: str):
+        """
+        Moves details still embedded in an unmigrated redirect into tmdb_metadata.
+        Returns the details, or None if the redirect carries none.
+        """
+        doc = await self.redirects.find_one(
+            {"code": code, "tmdb_details": {"$exists": True}},
+            {"media_type": 1, "tmdb_id": 1, "tmdb_details": 1}
         )
+        if not doc:
+            return None
+        await self._migrate_documents([doc])
+        return TmdbDetails.from_bson(doc['tmdb_details'])
+
+    async def migrate_tmdb_details(self, batch_size: int = 200, pause: float = 0.5, limit: int = None) -> int:
+        """
+        Moves embedded tmdb_details out of redirect documents in batches, pausing between
+        batches so the live bot keeps its share of the database. Safe to run repeatedly
+        and concurrently with the bot. Returns the number of migrated documents.
+        """
+        migrated = 0
+        while limit is None or migrated < limit:
+            size = batch_size if limit is None else min(batch_size, limit - migrated)
+            docs = await self.redirects.find(
+                {"tmdb_details": {"$exists": True}},
+                {"code": 1, "media_type": 1, "tmdb_id": 1, "tmdb_details": 1}
+            ).limit(size).to_list(length=size)
+            if not docs:
+                break
+            await self._migrate_documents(docs)
+            migrated += len(docs)
+            logger.info(f"Migrated TMDb details of {migrated} redirects")
+            await asyncio.sleep(pause)
+        return migrated
+
+    async def _migrate_documents(self, docs: list):
+        for doc in docs:
+            if doc.get('tmdb_details'):
+                # Existing metadata wins: it is at least as fresh as the embedded copy
+                await self.tmdb_metadata.update_one(
+                    {"media_type": doc.get('media_type', 'tv'), "tmdb_id": doc.get('tmdb_id')},
+                    {"$setOnInsert": {"details": doc['tmdb_details'], "updated_at": datetime.utcnow()}},
+                    upsert=True
+                )
+        await self.redirects.update_many(
+            {"_id": {"$in": [doc['_id'] for doc in docs]}},
+            {"$unset": {"tmdb_details": ""}}
+        )
+
+    async def count_redirects(self, tenant=ANY_TENANT):
+        query = {} if tenant is ANY_TENANT else self.scope(tenant)
+        return await self.redirects.count_documents(query)
+
+    async def list_redirects(self, tenant, skip: int, limit: int, archived: bool = False):
+        """Returns one page of the tenant's redirects (or archived ones), newest first."""
+        collection = self.archive if archived else self.redirects
+        cursor = (
+            collection.find(self.scope(tenant), LISTING_PROJECTION)
+            .sort("created_at", -1).skip(skip).limit(limit)
+        )
+        return await cursor.to_list(length=limit)
+
+    async def total_usage(self, tenant=ANY_TENANT) -> int:
+        """Sum of used_count over the tenant's redirects, archived ones included."""
+        pipeline = [{"$group": {"_id": None, "total_usage": {"$sum": "$used_count"}}}]
+        if tenant is not ANY_TENANT:
+            pipeline.insert(0, {"$match": self.scope(tenant)})
+        result = await self.redirects_read.aggregate(pipeline).to_list(length=1)
+        hot = result[0]['total_usage'] if result else 0
 
-    async def update_stats(self, code: str):
-        """Updates used_count and last_used for a redirect."""
+        archived = self.archived_usage.get(tenant)
+        if archived is None:
+            result = await self.archive.aggregate(pipeline).to_list(length=1)
+            archived = result[0]['total_usage'] if result else 0
+            self.archived_usage.set(tenant, archived)
+        return hot + archived
+
+    # --- Channel health ---
+
+    async def iter_redirect_channels(self, tenant):
+        """
+        Streams the tenant's redirects, archived ones included (code, series, channels and
+        their last known health).
+        """
+        for collection in (self.redirects_read, self.archive):
+            cursor = collection.find(self.scope(tenant), CHANNELS_PROJECTION).batch_size(500)
+            async for doc in cursor:
+                yield Redirect.from_bson(doc)
+
+    async def redirects_using_channel(self, tenant, chat_id: int) -> list:
+        """The tenant's redirects (archived ones included) using chat_id as primary channel or mirror."""
+        query = self.scope(tenant, {"$or": [{"private_channel_id": chat_id}, {"mirrors.chat_id": chat_id}]})
+        entries = []
+        for collection in (self.redirects, self.archive):
+            entries.extend([Redirect.from_bson(doc) async for doc in collection.find(query, CHANNELS_PROJECTION)])
+        return entries
+
+    async def set_channel_health(self, codes: list, error: str = None):
+        """Marks redirects' channel as healthy (error=None) or broken with the reason."""
+        update = {"$set": {
+            "channel_status": "broken" if error else "ok",
+            "channel_error": error,
+            "channel_checked_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }}
+        for collection in (self.redirects, self.archive):
+            await collection.update_many({"code": {"$in": codes}}, update)
+        for code in codes:
+            self._notify(code)
+
+    async def count_broken_channels(self, tenant) -> int:
+        """Redirects with a broken primary channel or mirror, archived ones included."""
+        query = self.scope(tenant, {"$or": [{"channel_status": "broken"}, {"mirrors.status": "broken"}]})
+        return await self.redirects_read.count_documents(query) + await self.archive.count_documents(query)
+
+    # --- Mirror channels (extra channels a redirect's visitor invites are spread over) ---
+
+    async def add_mirror(self, code: str, chat_id: int, weight: int = 1) -> bool:
+        """Adds a mirror channel to a redirect. False if it already uses that channel."""
+        result = await self.redirects.update_one(
+            {"code": code, "private_channel_id": {"$ne": chat_id}, "mirrors.chat_id": {"$ne": chat_id}},
+            {
+                "$push": {"mirrors": {"chat_id": chat_id, "weight": weight, "status": "ok", "error": None,
+                                      "added_at": datetime.utcnow()}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+        self._notify(code)
+        return bool(result.modified_count)
+
+    async def remove_mirror(self, code: str, chat_id: int):
         await self.redirects.update_one(
             {"code": code},
             {
-                "$inc": {"used_count": 1},
-                "$set": {"last_used": datetime.utcnow()}
+                "$pull": {"mirrors": {"chat_id": chat_id}},
+                "$unset": {f"invites_by_channel.{chat_id}": ""},
+                "$set": {"updated_at": datetime.utcnow()}
             }
         )
+        self._notify(code)
 
-    async def get_all_redirects(self):
-        """Retrieves all redirect entries."""
-        cursor = self.redirects.find().sort("created_at", -1)
+    async def set_mirror_health(self, codes: list, chat_id: int, error: str = None):
+        """Marks one mirror channel of the redirects healthy (error=None) or broken with the reason."""
+        update = {"$set": {
+            "mirrors.$.status": "broken" if error else "ok",
+            "mirrors.$.error": error,
+            "mirrors.$.checked_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }}
+        for collection in (self.redirects, self.archive):
+            await collection.update_many({"code": {"$in": codes}, "mirrors.chat_id": chat_id}, update)
+        for code in codes:
+            self._notify(code)
+
+    # --- Invite link lifecycle ---
+
+    async def record_invite_link(self, invite_link: str, chat_id: int, code: str, kind: str,
+                                 user_id: int = None, expires_at: datetime = None, tenant=None):
+        """
+        Records an invite link issued by the bot.
+        kind is 'visitor' for single-use /start links or 'primary' for a redirect's permanent link.
+        """
+        now = datetime.utcnow()
+        try:
+            await self.invite_links.update_one(
+                {"invite_link": invite_link},
+                {"$setOnInsert": {
+                    "tenant": tenant,
+                    "chat_id": chat_id,
+                    "code": code,
+                    "kind": kind,
+                    "user_id": user_id,
+                    "status": "issued",
+                    "created_at": now,
+                    "expires_at": expires_at,
+                    "joined_at": None,
+                    "revoked_at": None,
+                    "purge_at": now + timedelta(days=Config.INVITE_RECORD_RETENTION_DAYS)
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error("Error recording invite link for %s: %s", code, e)
+
+    async def retire_invite_link(self, invite_link: str, chat_id: int, code: str, tenant=None):
+        """Marks a replaced permanent link so the sweeper revokes it."""
+        await self.record_invite_link(invite_link, chat_id, code, "primary", tenant=tenant)
+        await self.invite_links.update_one(
+            {"invite_link": invite_link, "revoked_at": None},
+            {"$set": {"status": "retired"}}
+        )
+
+    async def mark_invite_joined(self, invite_link: str, user_id: int):
+        """
+        Marks a link as used when a join through it is observed. Returns True if it was ours.
+        A retired link keeps its status (only the join is recorded) so the sweeper still revokes it.
+        """
+        joined = {"joined_at": datetime.utcnow(), "joined_user_id": user_id}
+        result = await self.invite_links.update_one(
+            {"invite_link": invite_link, "status": {"$ne": "retired"}},
+            {"$set": dict(joined, status="joined")}
+        )
+        if not result.matched_count:
+            result = await self.invite_links.update_one({"invite_link": invite_link}, {"$set": joined})
+        return result.matched_count > 0
+
+    async def get_invites_to_revoke(self, tenant, limit: int):
+        """Returns the tenant's unrevoked links that have expired or were retired."""
+        cursor = self.invite_links.find(
+            {
+                "tenant": tenant,
+                "revoked_at": None,
+                "$or": [
+                    {"expires_at": {"$lt": datetime.utcnow()}},
+                    {"status": "retired"}
+                ]
+            },
+            {"invite_link": 1, "chat_id": 1, "status": 1}
+        ).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def get_open_invites(self, tenant, chat_id: int):
+        """The tenant's links in one channel that could still let someone in (unrevoked, unexpired, unused)."""
+        cursor = self.invite_links.find(
+            {
+                "tenant": tenant,
+                "chat_id": chat_id,
+                "revoked_at": None,
+                "status": {"$ne": "joined"},
+                "$or": [{"expires_at": None}, {"expires_at": {"$gt": datetime.utcnow()}}]
+            },
+            {"invite_link": 1, "chat_id": 1}
+        )
         return await cursor.to_list(length=None)
 
-    async def count_redirects(self):
-        return await self.redirects.count_documents({})
+    async def mark_invites_revoked(self, invite_links: list, error: str = None):
+        if not invite_links:
+            return
+        update = {"revoked_at": datetime.utcnow()}
+        if error:
+            update["revoke_error"] = error
+        await self.invite_links.update_many({"invite_link": {"$in": invite_links}}, {"$set": update})
+
+    async def invite_link_stats(self, tenant=ANY_TENANT):
+        """Returns conversion counters for single-use visitor links."""
+        match = {"kind": "visitor"} if tenant is ANY_TENANT else self.scope(tenant, {"kind": "visitor"})
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": None,
+                "issued": {"$sum": 1},
+                "joined": {"$sum": {"$cond": [{"$eq": ["$status", "joined"]}, 1, 0]}},
+                "revoked": {"$sum": {"$cond": [{"$ne": ["$revoked_at", None]}, 1, 0]}}
+            }}
+        ]
+        result = await self.invite_links.aggregate(pipeline).to_list(length=1)
+        if not result:
+            return {"issued": 0, "joined": 0, "revoked": 0}
+        return {key: result[0][key] for key in ("issued", "joined", "revoked")}
+
+    # --- Broadcasts ---
+
+    async def channel_ids(self, tenant) -> list:
+        """Distinct channels (primaries and mirrors) behind the tenant's redirects, archived ones included."""
+        ids = set()
+        for collection in (self.redirects_read, self.archive):
+            for field in ("private_channel_id", "mirrors.chat_id"):
+                ids.update(await collection.distinct(field, self.scope(tenant)))
+        return [chat_id for chat_id in ids if chat_id]
+
+    async def create_broadcast(self, tenant, text: str, run_at: datetime, created_by: int):
+        """Queues an announcement for all of the tenant's channels. Returns the job id."""
+        result = await self.broadcast_jobs.insert_one({
+            "tenant": tenant,
+            "text": text,
+            "run_at": run_at,
+            "status": "scheduled",
+            "created_by": created_by,
+            "created_at": datetime.utcnow(),
+            "finished_at": None,
+            "targets": None,  # Snapshot of channel ids, taken when the job starts
+            "total": None,
+            "results": {},    # str(chat_id) -> "sent" or an error description
+            "sent": 0,
+            "failed": 0
+        })
+        return result.inserted_id
+
+    async def claim_broadcast(self, tenant, owner: str):
+        """
+        Marks the next due job as running, leased to `owner` for BROADCAST_LEASE, and returns it.
+        Running jobs whose lease has expired (their process stopped or died) are resumed first;
+        jobs another process is still renewing are left alone.
+        """
+        now = datetime.utcnow()
+        query = self.scope(tenant, {"$or": [
+            # $not also matches jobs claimed before leases existed (no lease_until)
+            {"status": "running", "lease_until": {"$not": {"$gt": now}}},
+            {"status": "scheduled", "run_at": {"$lte": now}}
+        ]})
+        return await self.broadcast_jobs.find_one_and_update(
+            query,
+            # started_at is set on the first claim only ($min on a missing field)
+            {"$set": {"status": "running", "claimed_by": owner, "lease_until": now + timedelta(seconds=Config.BROADCAST_LEASE)},
+             "$min": {"started_at": now}},
+            sort=[("run_at", ASCENDING)],
+            return_document=True
+        )
+
+    async def renew_broadcast_leases(self, job_ids: list, owner: str):
+        """Heartbeat: extends the lease of the running jobs `owner` still holds."""
+        await self.broadcast_jobs.update_many(
+            {"_id": {"$in": job_ids}, "claimed_by": owner, "status": "running"},
+            {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=Config.BROADCAST_LEASE)}}
+        )
+
+    async def release_broadcasts(self, job_ids: list, owner: str):
+        """Ends `owner`'s lease on interrupted jobs so the next process resumes them right away."""
+        await self.broadcast_jobs.update_many(
+            {"_id": {"$in": job_ids}, "claimed_by": owner, "status": "running"},
+            {"$set": {"lease_until": datetime.utcnow()}}
+        )
+
+    async def set_broadcast_targets(self, job_id, targets: list):
+        await self.broadcast_jobs.update_one({"_id": job_id}, {"$set": {"targets": targets, "total": len(targets)}})
+
+    async def record_broadcast_results(self, job_id, results: dict, owner: str):
+        """
+        Stores a batch of per-channel outcomes. Returns the job's current status, or None
+        once another process has taken the job over: the batch is dropped (the new holder
+        counts its own deliveries) and the caller must stop sending.
+        """
+        update = {"$set": {f"results.{chat_id}": outcome for chat_id, outcome in results.items()}}
+        sent = sum(1 for outcome in results.values() if outcome == "sent")
+        update["$inc"] = {"sent": sent, "failed": len(results) - sent}
+        job = await self.broadcast_jobs.find_one_and_update(
+            {"_id": job_id, "claimed_by": owner}, update, projection={"status": 1}, return_document=True
+        )
+        return job["status"] if job else None
+
+    async def finish_broadcast(self, job_id, owner: str, status: str = "done"):
+        await self.broadcast_jobs.update_one(
+            {"_id": job_id, "status": "running", "claimed_by": owner},
+            {"$set": {"status": status, "finished_at": datetime.utcnow()}}
+        )
+
+    async def cancel_broadcast(self, tenant, job_id) -> bool:
+        result = await self.broadcast_jobs.update_one(
+            self.scope(tenant, {"_id": job_id, "status": {"$in": ["scheduled", "running"]}}),
+            {"$set": {"status": "cancelled", "finished_at": datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+
+    async def get_broadcast(self, tenant, job_id):
+        return await self.broadcast_jobs.find_one(self.scope(tenant, {"_id": job_id}))
+
+    async def list_broadcasts(self, tenant, limit: int = 10):
+        cursor = self.broadcast_jobs.find(
+            self.scope(tenant), {"results": 0, "targets": 0}
+        ).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
 
 # Global instance
 db = Database()
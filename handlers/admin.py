@@ -1,41 +1,74 @@
+import html
+from datetime import datetime
+from bson import ObjectId
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, filters
 from config import Config
 from database import db
+from models import Redirect
+from handlers.start import user_limiter, code_limiter
+from services.channel_auditor import UNKNOWN, channel_auditor
+from services.invite_sweeper import invite_sweeper
+from services.mirrors import mirror_balancer
+from services.profiler import blocking_detector, profile_event_loop
+from services.session_reaper import touch_session
+from utils.callbacks import Action, callbacks
+from utils.helpers import parse_schedule
 from utils.logger import setup_logger
+from utils.metrics import track_handler
+from utils.tenants import get_tenant
 
 logger = setup_logger(__name__)
 
 # States for regenerate conversation
 REGENERATE_CODE = 0
 
+# Only one sampling profile at a time, they would skew each other
+profile_running = False
+
+@track_handler
 async def admin_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Shows the admin dashboard.
     """
     user_id = update.effective_user.id
-    if user_id != Config.CEO_ID:
+    tenant = get_tenant(context)
+    if not tenant.is_admin(user_id):
         # Silently ignore or say nothing if not admin.
         return
 
-    # Fetch stats overview
-    total_links = await db.redirects.count_documents({})
+    # Fetch stats overview (scoped to this bot's tenant)
+    total_links = await db.count_redirects(tenant.key)
+    archived = await db.count_archived(tenant.key)
 
     # Calculate total usage
-    pipeline = [{"$group": {"_id": None, "total_usage": {"$sum": "$used_count"}}}]
-    result = await db.redirects.aggregate(pipeline).to_list(length=1)
-    total_usage = result[0]['total_usage'] if result else 0
+    total_usage = await db.total_usage(tenant.key)
+
+    invites = await db.invite_link_stats(tenant.key)
+    conversion = invites['joined'] / invites['issued'] * 100 if invites['issued'] else 0
+    broken = await db.count_broken_channels(tenant.key)
+
+    title = "XTV Redirect Bot" if tenant.key is None else f"XTV Redirect Bot ({tenant.name})"
 
     text = (
-        f"<b>🤖 XTV Redirect Bot - Admin Dashboard</b>\n\n"
-        f"🔗 <b>Total Redirect Links:</b> {total_links}\n"
-        f"📊 <b>Total Redirects Served:</b> {total_usage}\n\n"
-        "Select an action:"
+        f"<b>🤖 {title} - Admin Dashboard</b>\n\n"
+        f"🔗 <b>Total Redirect Links:</b> {total_links + archived}"
+        + (f" ({archived} archived)" if archived else "") + "\n"
+        f"📊 <b>Total Redirects Served:</b> {total_usage}\n"
+        f"🎟 <b>Invite Links:</b> {invites['issued']} issued, {invites['joined']} joined ({conversion:.1f}%), "
+        f"{invites['revoked']} revoked\n"
+        + (f"⚠️ <b>Broken Channels:</b> {broken}\n" if broken else "") +
+        "\nSelect an action:"
     )
 
     keyboard = [
-        [InlineKeyboardButton("🛠 Manage Redirect Links", callback_data="admin_manage_page_1")],
-        [InlineKeyboardButton("🔄 Refresh Stats", callback_data="admin_stats")]
+        [InlineKeyboardButton("🛠 Manage Redirect Links", callback_data=callbacks.data(Action.MANAGE_PAGE, 1))],
+        [InlineKeyboardButton("📣 Broadcasts", callback_data=callbacks.data(Action.BROADCASTS))],
+        [InlineKeyboardButton("🩺 Audit Channels Now", callback_data=callbacks.data(Action.AUDIT))],
+        [InlineKeyboardButton("🚦 Throttled Users", callback_data=callbacks.data(Action.THROTTLED))],
+        [InlineKeyboardButton(f"🧪 Profile Event Loop ({Config.PROFILE_DURATION:.0f}s)", callback_data=callbacks.data(Action.PROFILE))],
+        [InlineKeyboardButton("🔄 Refresh Stats", callback_data=callbacks.data(Action.DASHBOARD))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -45,107 +78,288 @@ async def admin_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
 
-async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+# Dashboard callbacks (see utils.callbacks); the router checks that the user is an admin of this bot
+callbacks.register(Action.DASHBOARD, admin_dashboard)
+
+@callbacks.on_stale
+async def expired_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
-    Handles admin callback queries (Dashboard navigation).
+    Buttons from before a restart or an older layout (including the legacy 'admin_*' ones)
+    bring admins back to a fresh dashboard instead of failing.
     """
-    query = update.callback_query
-    data = query.data
-    user_id = update.effective_user.id
-
-    if user_id != Config.CEO_ID:
-        await query.answer("Unauthorized", show_alert=True)
+    if not get_tenant(context).is_admin(update.effective_user.id):
+        await update.callback_query.answer("⌛ This button has expired.", show_alert=True)
         return
+    await admin_dashboard(update, context)
 
-    if data == "admin_stats":
-        await admin_dashboard(update, context)
+@callbacks.route(Action.NOOP, admin_only=False)
+async def noop_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
 
-    elif data.startswith("admin_manage_page_"):
-        page_num = int(data.split("_")[-1])
-        await render_manage_links_page(query, page_num)
+@callbacks.route(Action.MANAGE_PAGE)
+async def manage_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, page_num: int):
+    await render_manage_links_page(update.callback_query, page_num, get_tenant(context).key)
 
-    elif data.startswith("admin_manage_link_"):
-        code = data.replace("admin_manage_link_", "")
-        await render_link_details(query, code)
+@callbacks.route(Action.ARCHIVED_PAGE)
+async def archived_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, page_num: int):
+    await render_manage_links_page(update.callback_query, page_num, get_tenant(context).key, archived=True)
 
-    elif data == "ignore":
-        await query.answer()
+@callbacks.route(Action.MANAGE_LINK)
+async def manage_link_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str):
+    await render_link_details(update.callback_query, code, get_tenant(context).key)
 
-    elif data.startswith("admin_regen_"):
-        code = data.replace("admin_regen_", "")
-        await regenerate_invite_link_direct(update, context, code)
+@callbacks.route(Action.THROTTLED)
+async def throttled_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await render_throttled_users(update.callback_query, get_tenant(context))
 
-    elif data.startswith("admin_delete_"):
-        code = data.replace("admin_delete_", "")
-        await delete_redirect_channel(update, context, code)
+@callbacks.route(Action.PROFILE)
+async def profile_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await start_profile(update.callback_query, context)
 
-    elif data.startswith("admin_change_"):
-        code = data.replace("admin_change_", "")
-        await initiate_change_channel(update, context, code)
+@callbacks.route(Action.AUDIT)
+async def audit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Runs in the background: a full audit can take a while and this handler blocks the queue
+    await update.callback_query.answer("Channel audit started, you'll get a report if anything changed.", show_alert=True)
+    context.application.create_task(channel_auditor.audit_tenant(get_tenant(context), context.bot), name="admin-audit")
 
-    elif data == "admin_cancel_change":
-        await cancel_change_channel(update, context)
+@callbacks.route(Action.BROADCASTS)
+async def broadcasts_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await render_broadcasts(update.callback_query, get_tenant(context).key)
 
-async def render_manage_links_page(query, page_num: int):
+@callbacks.route(Action.CANCEL_BROADCAST)
+async def cancel_broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, job_id: ObjectId):
+    await cancel_broadcast(update.callback_query, job_id, get_tenant(context).key)
+
+async def render_manage_links_page(query, page_num: int, tenant, archived: bool = False):
     """
-    Renders a paginated list of redirect links.
+    Renders a paginated list of the tenant's redirect links, or of the archived ones
+    (see services.archiver). Opening an archived redirect moves it back to the active list.
     """
     limit = 10
     skip = (page_num - 1) * limit
+    page_action = Action.ARCHIVED_PAGE if archived else Action.MANAGE_PAGE
 
-    total_links = await db.redirects.count_documents({})
+    total_links = await db.count_archived(tenant) if archived else await db.count_redirects(tenant)
     total_pages = max(1, (total_links + limit - 1) // limit)
 
     if page_num > total_pages:
         page_num = total_pages
         skip = (page_num - 1) * limit
 
-    links = await db.redirects.find().sort("created_at", -1).skip(skip).limit(limit).to_list(length=limit)
+    links = await db.list_redirects(tenant, skip, limit, archived=archived)
 
-    text = f"<b>🛠 Manage Redirect Links (Page {page_num}/{total_pages})</b>\n\nSelect a redirect to manage it:"
+    if archived:
+        text = (
+            f"<b>📦 Archived Redirect Links (Page {page_num}/{total_pages})</b>\n\n"
+            f"Unused for {Config.ARCHIVE_AFTER_DAYS:g} days. They still work, get broadcasts and are audited; "
+            "opening one moves it back to the active list:"
+        )
+    else:
+        text = f"<b>🛠 Manage Redirect Links (Page {page_num}/{total_pages})</b>\n\nSelect a redirect to manage it:"
     keyboard = []
 
     for link in links:
         series = link.get('series_name', 'Unknown')
         code = link.get('code', 'N/A')
-        keyboard.append([InlineKeyboardButton(f"{series}", callback_data=f"admin_manage_link_{code}")])
+        keyboard.append([InlineKeyboardButton(f"{series}", callback_data=callbacks.data(Action.MANAGE_LINK, code))])
 
     # Pagination row
     nav_row = []
     if page_num > 1:
-        nav_row.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"admin_manage_page_{page_num - 1}"))
+        nav_row.append(InlineKeyboardButton("⬅️ Prev", callback_data=callbacks.data(page_action, page_num - 1)))
     else:
-        nav_row.append(InlineKeyboardButton(" ", callback_data="ignore"))
+        nav_row.append(InlineKeyboardButton(" ", callback_data=callbacks.data(Action.NOOP)))
 
-    nav_row.append(InlineKeyboardButton(f"Page {page_num}/{total_pages}", callback_data="ignore"))
+    nav_row.append(InlineKeyboardButton(f"Page {page_num}/{total_pages}", callback_data=callbacks.data(Action.NOOP)))
 
     if page_num < total_pages:
-        nav_row.append(InlineKeyboardButton("Next ➡️", callback_data=f"admin_manage_page_{page_num + 1}"))
+        nav_row.append(InlineKeyboardButton("Next ➡️", callback_data=callbacks.data(page_action, page_num + 1)))
     else:
-        nav_row.append(InlineKeyboardButton(" ", callback_data="ignore"))
+        nav_row.append(InlineKeyboardButton(" ", callback_data=callbacks.data(Action.NOOP)))
 
     keyboard.append(nav_row)
-    keyboard.append([InlineKeyboardButton("🔙 Back to Dashboard", callback_data="admin_stats")])
+    if archived:
+        keyboard.append([InlineKeyboardButton("🔙 Back to List", callback_data=callbacks.data(Action.MANAGE_PAGE, 1))])
+    else:
+        archived_count = await db.count_archived(tenant)
+        if archived_count:
+            keyboard.append([InlineKeyboardButton(f"📦 Archived ({archived_count})", callback_data=callbacks.data(Action.ARCHIVED_PAGE, 1))])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Dashboard", callback_data=callbacks.data(Action.DASHBOARD))])
 
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
-async def render_link_details(query, code: str):
+async def render_throttled_users(query, tenant):
+    """
+    Shows the tenant's users and redirect codes that hit the /start rate limits in the last hour.
+    """
+    now = datetime.utcnow()
+
+    def format_rows(rows):
+        return "\n".join(
+            f"• <code>{key}</code> — {count}x, {int((now - last).total_seconds())}s ago"
+            for key, count, last in rows
+        ) or "<i>None</i>"
+
+    text = (
+        f"<b>🚦 Throttled /start Requests (last hour)</b>\n\n"
+        f"👤 <b>Users:</b>\n{format_rows(user_limiter.top_throttled(15, scope=tenant.name))}\n\n"
+        f"🔗 <b>Redirect Codes:</b>\n{format_rows(code_limiter.top_throttled(5, scope=tenant.name))}"
+    )
+
+    keyboard = [
+        [InlineKeyboardButton("🔄 Refresh", callback_data=callbacks.data(Action.THROTTLED))],
+        [InlineKeyboardButton("🔙 Back to Dashboard", callback_data=callbacks.data(Action.DASHBOARD))]
+    ]
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    except BadRequest:
+        pass  # Message not modified
+
+@track_handler
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /broadcast <when> <message> - schedules an HTML announcement to all of the tenant's channels.
+    <when> is 'now', '+30m' / '+2h' / '+1d' or a UTC time like 2025-06-01T18:00.
+    """
+    user_id = update.effective_user.id
+    tenant = get_tenant(context)
+    if not tenant.is_admin(user_id):
+        return
+
+    # Split the raw text so the message keeps its line breaks
+    parts = update.message.text.split(maxsplit=2)
+    run_at = parse_schedule(parts[1]) if len(parts) == 3 else None
+    if run_at is None:
+        await update.message.reply_text(
+            "📣 <b>Usage:</b> <code>/broadcast &lt;when&gt; &lt;message&gt;</code>\n\n"
+            "<b>when:</b> <code>now</code>, <code>+30m</code>, <code>+2h</code>, <code>+1d</code> "
+            "or a UTC time like <code>2025-06-01T18:00</code>\n"
+            "<b>message:</b> HTML formatted text",
+            parse_mode='HTML'
+        )
+        return
+    text = parts[2]
+
+    # The preview doubles as validation of the HTML before anything is queued
+    try:
+        await update.message.reply_text(text, parse_mode='HTML')
+    except BadRequest as e:
+        await update.message.reply_text(f"❌ The message could not be sent: {html.escape(e.message)}", parse_mode='HTML')
+        return
+
+    channels = await db.channel_ids(tenant.key)
+    job_id = await db.create_broadcast(tenant.key, text, run_at, user_id)
+    await update.message.reply_text(
+        f"📣 <b>Broadcast scheduled</b> (preview above)\n\n"
+        f"🕒 <b>Runs at:</b> {run_at.strftime('%Y-%m-%d %H:%M')} UTC\n"
+        f"📺 <b>Channels:</b> {len(channels)}\n"
+        f"🆔 <code>{job_id}</code>",
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🛑 Cancel", callback_data=callbacks.data(Action.CANCEL_BROADCAST, job_id))]])
+    )
+
+async def render_broadcasts(query, tenant):
+    """
+    Lists the tenant's most recent broadcasts with their progress.
+    """
+    jobs = await db.list_broadcasts(tenant, limit=10)
+    icons = {"scheduled": "🕒", "running": "⏳", "done": "✅", "cancelled": "🛑"}
+
+    lines = []
+    keyboard = []
+    for job in jobs:
+        preview = html.escape(job['text'][:40].replace("\n", " "))
+        progress = f"{job['sent']}/{job['total']} sent, {job['failed']} failed" if job.get('total') is not None else "not started"
+        lines.append(
+            f"{icons.get(job['status'], '•')} <b>{job['run_at'].strftime('%Y-%m-%d %H:%M')}</b> {preview}\n"
+            f"    <i>{job['status']}, {progress}</i>"
+        )
+        if job['status'] in ("scheduled", "running"):
+            keyboard.append([InlineKeyboardButton(f"🛑 Cancel {job['run_at'].strftime('%m-%d %H:%M')}",
+                                                  callback_data=callbacks.data(Action.CANCEL_BROADCAST, job['_id']))])
+
+    text = (
+        "<b>📣 Broadcasts</b>\n\n" + ("\n".join(lines) or "<i>None yet.</i>") +
+        "\n\nSchedule one with <code>/broadcast &lt;when&gt; &lt;message&gt;</code>"
+    )
+    keyboard.append([InlineKeyboardButton("🔄 Refresh", callback_data=callbacks.data(Action.BROADCASTS))])
+    keyboard.append([InlineKeyboardButton("🔙 Back to Dashboard", callback_data=callbacks.data(Action.DASHBOARD))])
+
+    await query.answer()
+    try:
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    except BadRequest:
+        pass  # Message not modified
+
+async def cancel_broadcast(query, job_id: ObjectId, tenant):
+    cancelled = await db.cancel_broadcast(tenant, job_id)
+    await query.answer("Broadcast cancelled." if cancelled else "Broadcast already finished.", show_alert=True)
+    await render_broadcasts(query, tenant)
+
+async def start_profile(query, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Starts the sampling profiler in the background (this handler blocks the update queue,
+    so it must not wait the full duration) and shows the report once it finishes.
+    """
+    global profile_running
+    if profile_running:
+        await query.answer("A profile is already running.", show_alert=True)
+        return
+
+    profile_running = True
+    await query.answer()
+    await query.edit_message_text(f"⏳ Sampling the event loop for {Config.PROFILE_DURATION:.0f}s...")
+    context.application.create_task(finish_profile(query), name="admin-profile")
+
+async def finish_profile(query):
+    global profile_running
+    try:
+        report = await profile_event_loop(Config.PROFILE_DURATION)
+    finally:
+        profile_running = False
+
+    stalls = "\n".join(
+        f"{count}x {total * 1000:.0f} ms {handler}/{update_type} at {location}"
+        for (handler, update_type, location), (count, total, _) in blocking_detector.top(5)
+    ) or ("none recorded" if Config.LOOP_DEBUG else "detector disabled (LOOP_DEBUG=0)")
+
+    # Telegram caps messages at 4096 characters
+    text = (
+        f"<b>🧪 Event Loop Profile</b>\n\n<pre>{html.escape(report[:2500])}</pre>\n\n"
+        f"<b>Blocking stalls:</b>\n<pre>{html.escape(stalls[:1000])}</pre>"
+    )
+    keyboard = [
+        [InlineKeyboardButton("🔁 Run Again", callback_data=callbacks.data(Action.PROFILE))],
+        [InlineKeyboardButton("🔙 Back to Dashboard", callback_data=callbacks.data(Action.DASHBOARD))]
+    ]
+    try:
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+    except BadRequest as e:
+        logger.warning(f"Could not show profile report: {e}")
+
+async def render_link_details(query, code: str, tenant):
     """
     Renders the details and management options for a specific redirect.
     """
-    entry = await db.get_redirect(code)
+    entry = await db.get_redirect(code, tenant, cached=False)  # Usage counters must be current
     if not entry:
         await query.answer("Link not found in database.", show_alert=True)
         return
 
-    series_name = entry.get('series_name', 'Unknown')
-    tmdb_id = entry.get('tmdb_id', 'N/A')
-    invite_link = entry.get('invite_link', 'None')
-    used_count = entry.get('used_count', 0)
-    created_at = entry.get('created_at')
-    last_used = entry.get('last_used')
+    series_name = entry.series_name
+    tmdb_id = entry.tmdb_id or 'N/A'
+    invite_link = entry.invite_link or 'None'
+    used_count = entry.used_count
+    created_at = entry.created_at
+    last_used = entry.last_used
 
     created_str = created_at.strftime('%Y-%m-%d %H:%M') if created_at else 'N/A'
+    if entry.broken:
+        health_str = f"⚠️ Broken: {html.escape(entry.channel_error or 'unknown')}"
+    else:
+        health_str = "✅ OK"
     last_used_str = last_used.strftime('%Y-%m-%d %H:%M') if last_used else 'Never'
 
     text = (
@@ -153,35 +367,68 @@ async def render_link_details(query, code: str):
         f"📺 <b>Series Name:</b> {series_name}\n"
         f"🎬 <b>TMDb ID:</b> {tmdb_id}\n"
         f"🔑 <b>Redirect Code:</b> <code>{code}</code>\n"
-        f"🔗 <b>Current Invite Link:</b> {invite_link}\n\n"
+        f"🔗 <b>Current Invite Link:</b> {invite_link}\n"
+        f"🩺 <b>Channel Health:</b> {health_str}\n\n"
         f"📅 <b>Created At:</b> {created_str}\n"
         f"⏱ <b>Last Used:</b> {last_used_str}\n"
         f"📊 <b>Total Uses:</b> {used_count}"
     )
+    if entry.mirrors:
+        text += "\n\n<b>📡 Channels (visitor invites):</b>\n" + format_channel_stats(entry)
 
     keyboard = [
-        [InlineKeyboardButton("♻️ Regenerate Invite Link", callback_data=f"admin_regen_{code}")],
-        [InlineKeyboardButton("🔄 Change Channel", callback_data=f"admin_change_{code}")],
-        [InlineKeyboardButton("🗑 Delete Redirect Channel", callback_data=f"admin_delete_{code}")],
-        [InlineKeyboardButton("🔙 Back to List", callback_data="admin_manage_page_1")]
+        [InlineKeyboardButton("♻️ Regenerate Invite Link", callback_data=callbacks.data(Action.REGENERATE, code))],
+        [InlineKeyboardButton("🔄 Change Channel", callback_data=callbacks.data(Action.CHANGE_CHANNEL, code))],
+        [InlineKeyboardButton("➕ Add Mirror Channel", callback_data=callbacks.data(Action.ADD_MIRROR, code))],
+    ]
+    keyboard += [
+        [InlineKeyboardButton(f"➖ Remove Mirror {mirror.chat_id}",
+                              callback_data=callbacks.data(Action.REMOVE_MIRROR, code, mirror.chat_id))]
+        for mirror in entry.mirrors
+    ]
+    keyboard += [
+        [InlineKeyboardButton("🗑 Delete Redirect Channel", callback_data=callbacks.data(Action.DELETE, code))],
+        [InlineKeyboardButton("🔙 Back to List", callback_data=callbacks.data(Action.MANAGE_PAGE, 1))]
     ]
 
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
+def format_channel_stats(entry: Redirect) -> str:
+    """One line per channel: health, invites issued overall, and this process's failures."""
+    invites = entry.invites_by_channel
+    lines = []
+    for chat_id, mirror in entry.channels():
+        if mirror is None:
+            role, weight = "Primary", 1
+            broken, error = entry.broken, entry.channel_error
+        else:
+            role, weight = "Mirror", mirror.weight
+            broken, error = mirror.broken, mirror.error
+        stats = mirror_balancer.channel_stats(chat_id)
+        health = f"⚠️ {html.escape(error or 'broken')}" if broken else ("⏳ rate limited" if stats['cooling'] else "✅")
+        lines.append(
+            f"• {role} <code>{chat_id}</code> (weight {weight}) {health}\n"
+            f"   {invites.get(str(chat_id), 0)} invites; since restart {stats['issued']} issued, "
+            f"{stats['failed']} failed, {stats['rate_limited']} rate limited, {stats['in_flight']} in flight"
+        )
+    return "\n".join(lines)
 
+
+@callbacks.route(Action.REGENERATE)
 async def regenerate_invite_link_direct(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str):
     """
     Directly regenerates the invite link for a given code.
     """
     query = update.callback_query
 
-    entry = await db.get_redirect(code)
+    tenant = get_tenant(context)
+    entry = await db.get_redirect(code, tenant.key)
     if not entry:
         await query.answer("Invalid Code. Link not found in database.", show_alert=True)
         return
 
-    channel_id = entry.get('private_channel_id')
-    series_name = entry.get('series_name', 'Unknown')
+    channel_id = entry.private_channel_id
+    series_name = entry.series_name
 
     if not channel_id:
         await query.answer("Error: No channel ID found for this link.", show_alert=True)
@@ -195,33 +442,37 @@ async def regenerate_invite_link_direct(update: Update, context: ContextTypes.DE
         new_invite_link = invite_link_obj.invite_link
 
         # Update DB
-        await db.redirects.update_one(
-            {"code": code},
-            {"$set": {"invite_link": new_invite_link}}
-        )
+        await db.update_redirect(code, {"invite_link": new_invite_link})
+        await db.record_invite_link(new_invite_link, channel_id, code, "primary", tenant=tenant.key)
+
+        # The previous permanent link is revoked by the invite sweeper
+        if entry.invite_link:
+            await db.retire_invite_link(entry.invite_link, channel_id, code, tenant.key)
 
         await query.answer("Invite Link Regenerated Successfully!", show_alert=True)
         # Re-render the detailed view to show updated link
-        await render_link_details(query, code)
+        await render_link_details(query, code, tenant.key)
 
     except Exception as e:
         logger.error(f"Failed to regenerate link for {channel_id}: {e}")
         await query.answer(f"Error: Could not create invite link. Am I still admin?", show_alert=True)
 
 
+@callbacks.route(Action.DELETE)
 async def delete_redirect_channel(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str):
     """
     Deletes the redirect from the database and optionally leaves the channel.
     """
     query = update.callback_query
 
-    entry = await db.get_redirect(code)
+    tenant = get_tenant(context)
+    entry = await db.get_redirect(code, tenant.key)
     if not entry:
         await query.answer("Link not found in database.", show_alert=True)
         return
 
-    channel_id = entry.get('private_channel_id')
-    series_name = entry.get('series_name', 'Unknown')
+    channel_id = entry.private_channel_id
+    series_name = entry.series_name
 
     # Try to leave channel
     left_channel = False
@@ -233,7 +484,7 @@ async def delete_redirect_channel(update: Update, context: ContextTypes.DEFAULT_
             logger.warning(f"Could not leave channel {channel_id} while deleting redirect: {e}")
 
     # Delete from DB
-    await db.redirects.delete_one({"code": code})
+    await db.delete_redirect(code)
 
     text = f"🗑 <b>Redirect Deleted</b>\n\nSeries: {series_name}\nCode: <code>{code}</code>\n"
     if left_channel:
@@ -241,26 +492,30 @@ async def delete_redirect_channel(update: Update, context: ContextTypes.DEFAULT_
     else:
         text += "⚠️ Note: Could not leave the channel automatically. You may need to remove the bot manually."
 
-    keyboard = [[InlineKeyboardButton("🔙 Back to List", callback_data="admin_manage_page_1")]]
+    keyboard = [[InlineKeyboardButton("🔙 Back to List", callback_data=callbacks.data(Action.MANAGE_PAGE, 1))]]
 
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 
+@callbacks.route(Action.CHANGE_CHANNEL)
 async def initiate_change_channel(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str):
     """
     Initiates the flow to change the channel for a specific redirect code.
     """
     query = update.callback_query
 
-    entry = await db.get_redirect(code)
+    tenant = get_tenant(context)
+    entry = await db.get_redirect(code, tenant.key)
     if not entry:
         await query.answer("Link not found in database.", show_alert=True)
         return
 
-    series_name = entry.get('series_name', 'Unknown')
+    series_name = entry.series_name
 
     # Set the waiting state in context
+    context.user_data.pop('waiting_mirror_code', None)
     context.user_data['waiting_change_channel_code'] = code
+    touch_session(context.user_data)
 
     text = (
         f"🔄 <b>Change Channel for:</b> {series_name}\n"
@@ -272,23 +527,114 @@ async def initiate_change_channel(update: Update, context: ContextTypes.DEFAULT_
         f"<i>Waiting for channel addition...</i>"
     )
 
-    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data="admin_cancel_change")]]
+    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data=callbacks.data(Action.CANCEL_CHANGE))]]
 
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 
+@callbacks.route(Action.CANCEL_CHANGE)
 async def cancel_change_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Cancels the change channel flow.
     """
     query = update.callback_query
+    tenant = get_tenant(context)
 
-    if 'waiting_change_channel_code' in context.user_data:
-        code = context.user_data.pop('waiting_change_channel_code')
+    code = context.user_data.pop('waiting_change_channel_code', None) or context.user_data.pop('waiting_mirror_code', None)
+    if code:
         await query.answer("Change channel flow cancelled.")
-        await render_link_details(query, code)
+        await render_link_details(query, code, tenant.key)
     else:
         await query.answer("No active change channel flow.")
-        await render_manage_links_page(query, 1)
+        await render_manage_links_page(query, 1, tenant.key)
+
+
+@callbacks.route(Action.ADD_MIRROR)
+async def initiate_add_mirror(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str):
+    """
+    Starts the flow to add a mirror channel: visitor invites are then spread over the
+    redirect's channels (see services.mirrors). Works like the change channel flow.
+    """
+    query = update.callback_query
+
+    tenant = get_tenant(context)
+    entry = await db.get_redirect(code, tenant.key)
+    if not entry:
+        await query.answer("Link not found in database.", show_alert=True)
+        return
+
+    context.user_data.pop('waiting_change_channel_code', None)
+    context.user_data['waiting_mirror_code'] = code
+    touch_session(context.user_data)
+
+    text = (
+        f"➕ <b>Add Mirror Channel for:</b> {entry.series_name}\n"
+        f"Code: <code>{code}</code>\n\n"
+        f"<b>Instructions:</b>\n"
+        f"1. Create or go to the mirror channel.\n"
+        f"2. Add me as an Administrator with the 'Invite Users' permission.\n"
+        f"3. I will detect it and prompt you here to confirm.\n\n"
+        f"<i>Waiting for channel addition...</i>"
+    )
+
+    keyboard = [[InlineKeyboardButton("❌ Cancel", callback_data=callbacks.data(Action.CANCEL_CHANGE))]]
+
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
+
 
+@callbacks.route(Action.ACCEPT_MIRROR)
+async def accept_mirror(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str, channel_id: int):
+    query = update.callback_query
+    tenant = get_tenant(context)
+    context.user_data.pop('waiting_mirror_code', None)
+
+    entry = await db.get_redirect(code, tenant.key)
+    if not entry:
+        await query.answer("Link not found in database.", show_alert=True)
+        return
+
+    problem = await channel_auditor.check_channel(context.bot, channel_id)
+    if problem is UNKNOWN:
+        problem = "could not reach Telegram, try again"
+    if problem:
+        await query.answer(f"Cannot use this channel: {problem}", show_alert=True)
+        return
 
+    if await db.add_mirror(code, channel_id):
+        await query.answer("Mirror channel added!", show_alert=True)
+    else:
+        await query.answer("This redirect already uses that channel.", show_alert=True)
+    await render_link_details(query, code, tenant.key)
+
+
+@callbacks.route(Action.REJECT_MIRROR)
+async def reject_mirror(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str, channel_id: int):
+    query = update.callback_query
+    await query.answer()
+    # Stays if the channel already belongs to another redirect
+    await invite_sweeper.leave_channel(context.bot, get_tenant(context).key, channel_id)
+    await query.edit_message_text(
+        f"❌ Rejected channel ID {channel_id} as a mirror.\n\n"
+        "<i>Still waiting for you to add me to the correct channel...</i>",
+        parse_mode='HTML',
+        reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel", callback_data=callbacks.data(Action.CANCEL_CHANGE))]])
+    )
+
+
+@callbacks.route(Action.REMOVE_MIRROR)
+async def remove_mirror(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str, channel_id: int):
+    query = update.callback_query
+    tenant = get_tenant(context)
+    entry = await db.get_redirect(code, tenant.key)
+    if not entry:
+        await query.answer("Link not found in database.", show_alert=True)
+        return
+
+    await db.remove_mirror(code, channel_id)
+    await query.answer("Mirror channel removed.")
+    # Revoking the visitor links still open there can take a while under the rate limit.
+    # The bot stays if another redirect uses the channel (the sweeper then handles the links)
+    context.application.create_task(
+        invite_sweeper.leave_channel(context.bot, tenant.key, channel_id), name="leave-mirror"
+    )
+    await render_link_details(query, code, tenant.key)
@@ -8,21 +8,27 @@ from telegram.ext import (
     CommandHandler,
     filters
 )
-from config import Config
 from database import db
+from services.channel_auditor import channel_auditor
+from services.session_reaper import discard_session, session_expired, touch_session
+from services.title_index import title_index
 from tmdb import tmdb
+from utils.callbacks import Action, callbacks, codec
 from utils.logger import setup_logger
+from utils.metrics import metrics, track_handler
 from utils.helpers import generate_redirect_code
+from utils.tenants import get_tenant
 
 logger = setup_logger(__name__)
 
 # Conversation States
 SERIES_NAME, SERIES_SELECTION = range(2)
 
+@track_handler
 async def setup_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Entry point: Triggered when the bot is added as an admin to a channel.
-    Messages the CEO_ID (Admin) for approval instead of the user who added the bot.
+    Messages the tenant's primary admin for approval instead of the user who added the bot.
     """
     result = update.my_chat_member
     new_member = result.new_chat_member
@@ -32,24 +38,49 @@ async def setup_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if new_member.status != ChatMember.ADMINISTRATOR:
         return
 
-    if old_member.status == ChatMember.ADMINISTRATOR:
-        # Already admin, probably just permission update
-        return
-
     chat = result.chat
+    tenant = get_tenant(context)
 
     # Check if channel is already registered (to prevent duplicate prompts on permission updates)
-    existing = await db.redirects.find_one({"private_channel_id": chat.id})
+    existing = await db.find_redirect(tenant.key, {"$or": [{"private_channel_id": chat.id}, {"mirrors.chat_id": chat.id}]})
     if existing:
+        # Re-added, re-promoted or given its permissions back: clear a broken mark right away
+        await channel_auditor.recheck_channel(context.bot, tenant.key, chat.id)
+        return
+
+    if old_member.status == ChatMember.ADMINISTRATOR:
+        # Already admin, probably just permission update
         return
 
     inviter = result.from_user
     logger.info(f"Bot added to channel: {chat.title} ({chat.id}) by user {inviter.id}")
 
-    admin_id = Config.CEO_ID
+    admin_id = tenant.primary_admin
+
+    if context.user_data and session_expired(context.user_data):
+        # A change channel / add mirror flow left idle is over: this is a new setup request
+        await discard_session(context.user_data, tenant.key)
+
+    # Check if admin is currently in "Add Mirror Channel" flow
+    if 'waiting_mirror_code' in context.user_data:
+        code = context.user_data['waiting_mirror_code']
+
+        text = (
+            f"➕ <b>Mirror Channel Detected</b>\n\n"
+            f"I have been added to the channel: <b>{chat.title}</b> (<code>{chat.id}</code>)\n\n"
+            f"Do you want to add it as a mirror of the redirect code: <code>{code}</code>?"
+        )
+
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Accept", callback_data=callbacks.data(Action.ACCEPT_MIRROR, code, chat.id)),
+                InlineKeyboardButton("❌ Reject", callback_data=callbacks.data(Action.REJECT_MIRROR, code, chat.id))
+            ],
+            [InlineKeyboardButton("❌ Cancel", callback_data=callbacks.data(Action.CANCEL_CHANGE))]
+        ]
 
     # Check if admin is currently in "Change Channel" flow
-    if 'waiting_change_channel_code' in context.user_data:
+    elif 'waiting_change_channel_code' in context.user_data:
         code = context.user_data['waiting_change_channel_code']
 
         text = (
@@ -63,7 +94,7 @@ async def setup_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 InlineKeyboardButton("✅ Accept", callback_data=f"change_accept|{chat.id}"),
                 InlineKeyboardButton("❌ Reject", callback_data=f"change_reject|{chat.id}")
             ],
-            [InlineKeyboardButton("❌ Cancel Entire Change", callback_data="admin_cancel_change")]
+            [InlineKeyboardButton("❌ Cancel Entire Change", callback_data=callbacks.data(Action.CANCEL_CHANGE))]
         ]
 
     else:
@@ -92,6 +123,7 @@ async def setup_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         logger.error(f"Failed to message admin {admin_id}: {e}")
 
+@track_handler
 async def change_channel_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles Accept/Reject for the "Change Channel" flow when bot is added to a new channel.
@@ -99,6 +131,7 @@ async def change_channel_decision(update: Update, context: ContextTypes.DEFAULT_
     query = update.callback_query
     await query.answer()
     data = query.data
+    tenant = get_tenant(context)
 
     if not data.startswith("change_"):
         return
@@ -111,7 +144,7 @@ async def change_channel_decision(update: Update, context: ContextTypes.DEFAULT_
             f"❌ Rejected channel ID {channel_id} for change channel flow.\n\n"
             "<i>Still waiting for you to add me to the correct channel...</i>",
             parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel Entire Change", callback_data="admin_cancel_change")]])
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Cancel Entire Change", callback_data=callbacks.data(Action.CANCEL_CHANGE))]])
         )
         try:
             await context.bot.leave_chat(channel_id)
@@ -150,9 +183,9 @@ async def change_channel_decision(update: Update, context: ContextTypes.DEFAULT_
             return
 
         # Fetch old redirect entry
-        entry = await db.get_redirect(code)
+        entry = await db.get_redirect(code, tenant.key)
         if entry:
-            old_channel_id = entry.get('private_channel_id')
+            old_channel_id = entry.private_channel_id
             if old_channel_id and old_channel_id != channel_id:
                 # Try to send a forwarding message to the old channel
                 try:
@@ -166,19 +199,24 @@ async def change_channel_decision(update: Update, context: ContextTypes.DEFAULT_
                 except Exception as e:
                     logger.warning(f"Could not send forwarding message to old channel {old_channel_id}: {e}")
 
-                # Optionally try to leave old channel silently
+                # Revoke the old permanent link while we still can, then try to leave old channel silently
+                if entry.invite_link:
+                    try:
+                        await context.bot.revoke_chat_invite_link(old_channel_id, entry.invite_link)
+                        await db.retire_invite_link(entry.invite_link, old_channel_id, code, tenant.key)
+                        await db.mark_invites_revoked([entry.invite_link])
+                    except Exception as e:
+                        logger.warning(f"Could not revoke old invite link in {old_channel_id}: {e}")
                 try:
                     await context.bot.leave_chat(old_channel_id)
                 except:
                     pass
 
         # Update Database
-        await db.redirects.update_one(
-            {"code": code},
-            {"$set": {"private_channel_id": channel_id, "invite_link": invite_link}}
-        )
+        await db.update_redirect(code, {"private_channel_id": channel_id, "invite_link": invite_link})
+        await db.record_invite_link(invite_link, channel_id, code, "primary", tenant=tenant.key)
 
-        series_name = entry.get('series_name', 'Unknown') if entry else 'Unknown'
+        series_name = entry.series_name if entry else 'Unknown'
 
         text = (
             f"✅ <b>Channel Successfully Changed!</b>\n\n"
@@ -188,11 +226,12 @@ async def change_channel_decision(update: Update, context: ContextTypes.DEFAULT_
         )
 
         # We can reuse the admin manage link back button
-        keyboard = [[InlineKeyboardButton("🔙 Back to Link Details", callback_data=f"admin_manage_link_{code}")]]
+        keyboard = [[InlineKeyboardButton("🔙 Back to Link Details", callback_data=callbacks.data(Action.MANAGE_LINK, code))]]
 
         await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode='HTML')
 
 
+@track_handler
 async def setup_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles the Accept/Decline decision from the Admin.
@@ -215,6 +254,10 @@ async def setup_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
     if action == "setup_accept":
+        if 'setup_invite_link' in context.user_data:
+            # Re-entry over an unfinished setup: its invite link will never be used
+            await discard_session(context.user_data, get_tenant(context).key)
+
         # Check permissions / get info
         try:
             chat = await context.bot.get_chat(channel_id)
@@ -243,6 +286,7 @@ async def setup_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['setup_channel_id'] = channel_id
         context.user_data['setup_channel_title'] = chat.title
         context.user_data['setup_invite_link'] = invite_link
+        touch_session(context.user_data)
 
         await query.edit_message_text(
             f"🚀 <b>Setup Started for {chat.title}</b>\n\n"
@@ -252,10 +296,15 @@ async def setup_decision(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return SERIES_NAME
 
+@track_handler
 async def receive_series_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     User (Admin) sends the series name. Search TMDb.
     """
+    if session_expired(context.user_data):
+        return await setup_timed_out(update, context)
+    touch_session(context.user_data)
+
     query = update.message.text
     if not query:
         await update.message.reply_text("Please enter a valid series name.")
@@ -263,7 +312,18 @@ async def receive_series_name(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     await update.message.reply_text(f"🔎 Searching for '{query}'...")
 
-    results = await tmdb.search(query)
+    # Local index of TMDb's daily exports first (sub-millisecond). Unless it knows the name
+    # exactly, the live API also runs: it matches translated titles the exports lack.
+    offline = title_index.search(query)
+    if any(item['exact'] for item in offline):
+        results = offline
+        metrics.inc("title_searches_total", source="offline")
+    else:
+        results = await tmdb.search(query)
+        metrics.inc("title_searches_total", source="tmdb")
+        # Partial offline matches fill up the list after the API's results
+        seen = {(item['media_type'], item['id']) for item in results}
+        results = (results + [item for item in offline if (item['media_type'], item['id']) not in seen])[:5]
 
     if not results:
         await update.message.reply_text("❌ No results found. Please try another name.")
@@ -285,6 +345,7 @@ async def receive_series_name(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
     return SERIES_SELECTION
 
+@track_handler
 async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     User (Admin) selects a series from the buttons.
@@ -292,14 +353,20 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
     query = update.callback_query
     await query.answer()
     data = query.data
+    tenant = get_tenant(context)
 
     if data == "cancel_setup":
         await query.edit_message_text("❌ Setup cancelled.")
-        context.user_data.clear()
+        await discard_session(context.user_data, tenant.key)
         return ConversationHandler.END
 
-    if data.startswith("swap_channel|"):
-        code = data.split("|")[1]
+    if session_expired(context.user_data):
+        return await setup_timed_out(update, context)
+    touch_session(context.user_data)
+
+    decoded = codec.decode(data)
+    if decoded and decoded[0] == Action.SWAP_CHANNEL:
+        code = decoded[1][0]
         channel_id = context.user_data.get('setup_channel_id')
         series_title = context.user_data.get('swap_series_title', 'Unknown')
 
@@ -320,9 +387,9 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
             return ConversationHandler.END
 
         # Fetch old redirect entry
-        entry = await db.get_redirect(code)
+        entry = await db.get_redirect(code, tenant.key)
         if entry:
-            old_channel_id = entry.get('private_channel_id')
+            old_channel_id = entry.private_channel_id
             if old_channel_id and old_channel_id != channel_id:
                 # Try to send a forwarding message to the old channel
                 try:
@@ -336,17 +403,22 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
                 except Exception as e:
                     logger.warning(f"Could not send forwarding message to old channel {old_channel_id}: {e}")
 
-                # Optionally try to leave old channel silently
+                # Revoke the old permanent link while we still can, then try to leave old channel silently
+                if entry.invite_link:
+                    try:
+                        await context.bot.revoke_chat_invite_link(old_channel_id, entry.invite_link)
+                        await db.retire_invite_link(entry.invite_link, old_channel_id, code, tenant.key)
+                        await db.mark_invites_revoked([entry.invite_link])
+                    except Exception as e:
+                        logger.warning(f"Could not revoke old invite link in {old_channel_id}: {e}")
                 try:
                     await context.bot.leave_chat(old_channel_id)
                 except:
                     pass
 
         # Update Database
-        await db.redirects.update_one(
-            {"code": code},
-            {"$set": {"private_channel_id": channel_id, "invite_link": invite_link}}
-        )
+        await db.update_redirect(code, {"private_channel_id": channel_id, "invite_link": invite_link})
+        await db.record_invite_link(invite_link, channel_id, code, "primary", tenant=tenant.key)
 
         text = (
             f"✅ <b>Channel Successfully Changed!</b>\n\n"
@@ -356,7 +428,8 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
         )
 
         await query.edit_message_text(text, parse_mode='HTML')
-        context.user_data.clear()
+        # The swap minted its own link: the one made for this setup is left unused
+        await discard_session(context.user_data, tenant.key)
         return ConversationHandler.END
 
     if not data.startswith("select_idx|"):
@@ -378,9 +451,9 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
         return ConversationHandler.END
 
     # Check if this TMDB ID already exists
-    existing_redirect = await db.redirects.find_one({"tmdb_id": selected['id']})
+    existing_redirect = await db.find_redirect(tenant.key, {"tmdb_id": selected['id']})
     if existing_redirect:
-        existing_code = existing_redirect.get('code')
+        existing_code = existing_redirect.code
         text = (
             f"⚠️ <b>Series Already Registered</b>\n\n"
             f"The series <b>{selected['title']}</b> already has an active redirect link (<code>{existing_code}</code>).\n\n"
@@ -388,7 +461,7 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
             f"Do you want to change the channel for this series to the current one?"
         )
         keyboard = [
-            [InlineKeyboardButton("🔄 Yes, Change Channel", callback_data=f"swap_channel|{existing_code}")],
+            [InlineKeyboardButton("🔄 Yes, Change Channel", callback_data=callbacks.data(Action.SWAP_CHANNEL, existing_code))],
             [InlineKeyboardButton("❌ Cancel Setup", callback_data="cancel_setup")]
         ]
 
@@ -403,19 +476,25 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
 
     # Fetch full TMDB details and cache them
     details = await tmdb.get_details(selected['media_type'], selected['id'])
+    # Offline results carry the original title, the API the English one
+    series_name = (details or {}).get('title') or selected['title']
 
     # Save to DB
     redirect_data = {
         "code": code,
-        "series_name": selected['title'],
+        "series_name": series_name,
         "tmdb_id": selected['id'],
         "media_type": selected['media_type'],
         "private_channel_id": channel_id,
         "invite_link": invite_link,
-        "tmdb_details": details  # Cache the details
+        "tmdb_details": details  # Stored in the shared tmdb_metadata collection by create_redirect
     }
+    if tenant.key is not None:
+        redirect_data["tenant"] = tenant.key
 
     success = await db.create_redirect(redirect_data)
+    if success:
+        await db.record_invite_link(invite_link, channel_id, code, "primary", tenant=tenant.key)
 
     if success:
         bot_username = context.bot.username
@@ -423,34 +502,53 @@ async def receive_series_selection(update: Update, context: ContextTypes.DEFAULT
 
         await query.edit_message_text(
             f"✅ <b>Setup Complete!</b>\n\n"
-            f"📺 <b>Series:</b> {selected['title']}\n"
+            f"📺 <b>Series:</b> {series_name}\n"
             f"🔗 <b>Redirect Link:</b>\n{deep_link}\n\n"
             f"This link will show the loading animation and redirect to the channel.",
             parse_mode='HTML'
         )
+        # Clear user data
+        context.user_data.clear()
     else:
         await query.edit_message_text("❌ Database Error. Please try again.")
+        await discard_session(context.user_data, tenant.key)
 
-    # Clear user data
-    context.user_data.clear()
     return ConversationHandler.END
 
+@track_handler
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancels the conversation."""
     await update.message.reply_text("Setup cancelled.")
-    context.user_data.clear()
+    await discard_session(context.user_data, get_tenant(context).key)
+    return ConversationHandler.END
+
+async def setup_timed_out(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Ends a setup left idle for SESSION_TIMEOUT (or whose state the session reaper already
+    freed): PTB's conversation_timeout needs a JobQueue, so the timeout is checked on the
+    admin's next step instead.
+    """
+    await discard_session(context.user_data, get_tenant(context).key)
+    await update.effective_message.reply_text(
+        "⌛ <b>Setup timed out.</b>\n\nTap ✅ Accept on the setup request to start again.",
+        parse_mode='HTML'
+    )
     return ConversationHandler.END
 
 # Handler for the event trigger (not the conversation itself)
 channel_event_handler = ChatMemberHandler(setup_channel, ChatMemberHandler.MY_CHAT_MEMBER)
 
-# Conversation Handler for the Admin interaction
-setup_conversation_handler = ConversationHandler(
-    entry_points=[CallbackQueryHandler(setup_decision, pattern="^setup_")],
-    states={
-        SERIES_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_series_name)],
-        SERIES_SELECTION: [CallbackQueryHandler(receive_series_selection)]
-    },
-    fallbacks=[CommandHandler('cancel', cancel)],
-    per_user=True
-)
+# Conversation Handler for the Admin interaction.
+# Built per Application: ConversationHandler keeps its state on the instance, so bots must not share one.
+def build_setup_conversation_handler():
+    return ConversationHandler(
+        entry_points=[CallbackQueryHandler(setup_decision, pattern="^setup_")],
+        states={
+            SERIES_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_series_name)],
+            SERIES_SELECTION: [CallbackQueryHandler(receive_series_selection)]
+        },
+        fallbacks=[CommandHandler('cancel', cancel)],
+        # Accept on a setup request always (re)starts it, even over an abandoned setup
+        allow_reentry=True,
+        per_user=True
+    )
@@ -0,0 +1,30 @@
+from telegram import Update
+from telegram.ext import ContextTypes, InlineQueryHandler
+from config import Config
+from services.search_index import search_index
+from utils.cache import TTLCache
+from utils.helpers import tokenize
+from utils.metrics import track_handler
+from utils.tenants import get_tenant
+
+# (tenant key, index version, normalized query) -> results. A new index version makes old keys unreachable.
+answer_cache = TTLCache(max_size=5000, ttl=Config.INLINE_CACHE_TIME)
+
+@track_handler
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Answers '@bot <series>' with matching redirects from the in-memory search index.
+    Results are the same for every user, so Telegram may cache them across users too.
+    """
+    tenant = get_tenant(context)
+    tokens = tokenize(update.inline_query.query)[:8]
+    key = (tenant.key, search_index.version(tenant.key), " ".join(tokens))
+
+    results = answer_cache.get(key)
+    if results is None:
+        results = search_index.search(tenant.key, tokens)
+        answer_cache.set(key, results)
+
+    await update.inline_query.answer(results, cache_time=Config.INLINE_CACHE_TIME, is_personal=False)
+
+inline_handler = InlineQueryHandler(inline_query_handler, block=False)
@@ -0,0 +1,30 @@
+from telegram import Update, ChatMember
+from telegram.ext import ContextTypes, ChatMemberHandler
+from database import db
+from utils.logger import setup_logger
+from utils.metrics import track_handler
+
+logger = setup_logger(__name__)
+
+@track_handler
+async def track_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Marks invite links as used when someone joins a managed channel through them.
+    Requires 'chat_member' in allowed_updates and the bot being admin in the channel.
+    """
+    result = update.chat_member
+    invite_link = result.invite_link
+    if not invite_link:
+        return
+
+    was_member = result.old_chat_member.status in [ChatMember.MEMBER, ChatMember.OWNER, ChatMember.ADMINISTRATOR]
+    is_member = result.new_chat_member.status in [ChatMember.MEMBER, ChatMember.OWNER, ChatMember.ADMINISTRATOR]
+    if was_member or not is_member:
+        return
+
+    user_id = result.new_chat_member.user.id
+    if await db.mark_invite_joined(invite_link.invite_link, user_id):
+        logger.debug("User %s joined %s via tracked invite link", user_id, result.chat.id)
+
+# Join tracking for conversion metrics
+chat_member_handler = ChatMemberHandler(track_join, ChatMemberHandler.CHAT_MEMBER)
@@ -1,16 +1,62 @@
 import asyncio
-import random
 import html
+import random
+import time
 from datetime import datetime, timedelta
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes
 from config import Config
 from database import db
+from models import Redirect, TmdbDetails
+from services.mirrors import mirror_balancer
+from services.shutdown import shutdown
 from tmdb import tmdb
 from utils.logger import setup_logger
+from utils.metrics import metrics, track_handler
+from utils.cache import TTLCache
+from utils.helpers import is_valid_redirect_code
+from utils.ratelimit import RateLimiter
+from utils.tenants import get_tenant
+from utils.update_queue import update_age
+from utils.render import render_cache, join_markup, LOADING_MARKUP, LOADING_MESSAGES_POOL
 
 logger = setup_logger(__name__)
 
+# Drop cached renders whenever a redirect (details, invite link, ...) changes
+db.add_listener(render_cache.invalidate)
+
+# Flood protection: one bucket per user and one per redirect code, keyed (tenant name, user id / code)
+user_limiter = RateLimiter(Config.START_USER_RATE, Config.START_USER_BURST, name="user")
+code_limiter = RateLimiter(Config.START_CODE_RATE, Config.START_CODE_BURST, name="code")
+# User keys told to slow down, for as long as their bucket takes to refill completely
+throttle_notices = TTLCache(
+    max_size=50000,
+    ttl=Config.START_USER_BURST / Config.START_USER_RATE if Config.START_USER_RATE > 0 else None
+)
+
+# Dedup of repeated taps on the same deep link.
+# (user_id, code) -> Future resolved when the running redirect for that pair has finished
+inflight_redirects = {}
+# (user_id, code) -> (invite_link, expires_at, chat_id) for single-use links that are still valid.
+# Entries expire a minute before the link itself so a reused link is never about to die; one is
+# only reused while its channel is still one of the redirect's healthy channels (it may have been
+# changed, removed or marked broken since, here or on another instance).
+INVITE_LINK_TTL = timedelta(minutes=10)
+issued_invites = TTLCache(max_size=50000, ttl=INVITE_LINK_TTL.total_seconds() - 60)
+
+UNAVAILABLE_NOTICE = (
+    "⚠️ <b>This channel is temporarily unavailable.</b>\n\n"
+    "The admins have been notified. Please try again later."
+)
+
+async def reply_throttled(update: Update, user_key: tuple):
+    """Tells the user to slow down, at most once per refill window so floods stay cheap."""
+    if user_key in throttle_notices:
+        return
+    throttle_notices.set(user_key, True)
+    await update.message.reply_text("⏳ <b>Too many requests.</b> Please try again in a few seconds.", parse_mode='HTML')
+
+@track_handler
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles /start command.
@@ -18,9 +64,23 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     If no args, just welcomes the user (or admin).
     """
     args = context.args
+    user_id = update.effective_user.id
+    code = args[0] if args else None
+    tenant = get_tenant(context)
+    is_admin = tenant.is_admin(user_id)
+
+    # Repeated taps while the redirect is still animating attach to the running one
+    running = inflight_redirects.get((user_id, code))
+    if running is not None:
+        await asyncio.shield(running)
+        return
+
+    if not is_admin and not user_limiter.allow((tenant.name, user_id)):
+        await reply_throttled(update, (tenant.name, user_id))
+        return
+
     if not args:
-        user_id = update.effective_user.id
-        if user_id == Config.CEO_ID:
+        if is_admin:
             await update.message.reply_text(
                 "👋 <b>Welcome, Admin!</b>\n\n"
                 "Use /admin to access the dashboard.\n"
@@ -36,175 +96,255 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
         return
 
-    code = args[0]
-    redirect_entry = await db.get_redirect(code)
+    # Reject malformed codes before touching the database
+    if not is_valid_redirect_code(code):
+        await update.message.reply_text("❌ <b>Invalid or expired link.</b>", parse_mode='HTML')
+        return
+
+    if update_age(update) > Config.STALE_UPDATE_AGE and await serve_stale_redirect(update, context, code):
+        return
+
+    if not code_limiter.allow((tenant.name, code)):
+        # Per-user buckets already bound how often a single user can land here
+        await update.message.reply_text("⏳ <b>This link is very busy right now.</b> Please try again in a few seconds.", parse_mode='HTML')
+        return
+
+    key = (user_id, code)
+    done = asyncio.get_running_loop().create_future()
+    inflight_redirects[key] = done
+    try:
+        async with shutdown.track():
+            await serve_redirect(update, context, code, user_id)
+    finally:
+        del inflight_redirects[key]
+        done.set_result(None)
+
+async def serve_stale_redirect(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str) -> bool:
+    """
+    Answers a deep link click replayed from the backlog after downtime (see
+    utils.update_queue) with one plain message and the channel's permanent link: no card,
+    animation or single-use invite, so the backlog drains fast. Returns False if the
+    redirect needs the full flow (its primary channel is broken).
+    """
+    entry = await db.get_redirect(code, get_tenant(context).key)
+    if not entry:
+        await update.message.reply_text("❌ <b>Invalid or expired link.</b>", parse_mode='HTML')
+        return True
+    if entry.broken or not entry.invite_link:
+        return False
+
+    await update.message.reply_text(
+        f"⌛ <b>Sorry for the wait!</b>\n\nHere is your link to <b>{html.escape(entry.series_name)}</b>:",
+        parse_mode='HTML',
+        reply_markup=join_markup(entry.invite_link)
+    )
+    metrics.inc("stale_redirects_total")
+    await db.update_stats(code)
+    return True
+
+async def resolve_details(redirect_entry: Redirect):
+    """
+    Returns (details, cacheable) for a redirect, fetching from TMDb if they were never stored.
+    Fallback details built after a TMDb failure are not cacheable, so the next visit retries TMDb.
+    """
+    media_type, tmdb_id = redirect_entry.details_key
+
+    # Shared metadata collection (cached in-process), then details still embedded in old documents
+    details = await db.get_tmdb_metadata(media_type, tmdb_id)
+    if not details:
+        details = await db.pop_legacy_details(redirect_entry.code)
+
+    if not details:
+        # Fetch from TMDB if not cached
+        fetched = await tmdb.get_details(media_type, tmdb_id)
+
+        if fetched:
+            # Cache the details for future use
+            details = await db.save_tmdb_metadata(media_type, tmdb_id, fetched)
+
+    if not details:
+        # Fallback if TMDb fails and not cached
+        return TmdbDetails(title=redirect_entry.series_name), False
+
+    return details, True
+
+async def serve_redirect(update: Update, context: ContextTypes.DEFAULT_TYPE, code: str, user_id: int):
+    """
+    Sends the redirect card with the loading animation and finally the join button.
+    """
+    started = time.monotonic()
+    tenant = get_tenant(context)
+    redirect_entry = await db.get_redirect(code, tenant.key)
 
     if not redirect_entry:
         await update.message.reply_text("❌ <b>Invalid or expired link.</b>", parse_mode='HTML')
         return
 
-    channel_id = redirect_entry.get('private_channel_id')
-    final_invite_link = redirect_entry.get('invite_link')
-    user_id = update.effective_user.id
+    channels = redirect_entry.healthy_channels()
+    if not channels:
+        # Every channel was flagged by the channel auditor: any invite link we could hand out would be dead
+        await update.message.reply_text(UNAVAILABLE_NOTICE, parse_mode='HTML')
+        return
 
-    # Check if user is already a member before fetching metadata
+    # Membership is checked in the first healthy channel (the primary one unless it is broken)
+    channel_id = channels[0][0]
+    # The permanent link only leads to the primary channel (mirrors have none): it is never
+    # handed out while the primary is broken
+    permanent_link = redirect_entry.invite_link if channel_id == redirect_entry.private_channel_id else None
+    final_invite_link = permanent_link
+
+    # Check if user is already a member before fetching metadata. Without a permanent link,
+    # members take the full flow: a single-use link opens the channel for them as well
     is_member = False
-    if channel_id:
+    if channel_id and permanent_link:
         try:
             chat_member = await context.bot.get_chat_member(chat_id=channel_id, user_id=user_id)
             if chat_member.status in ['member', 'creator', 'administrator']:
                 is_member = True
         except Exception as e:
-            logger.warning(f"Failed to check member status for {user_id} in {channel_id}: {e}")
+            logger.warning(
+                "Failed to check member status for %s in %s: %s", user_id, channel_id, e,
+                extra={"code": code, "user_id": user_id, "stage": "member_check", "sample": "member_check"}
+            )
 
     if is_member:
         # Fast-track for existing members
-        join_keyboard = [[InlineKeyboardButton("🚀 Join Channel", url=final_invite_link)]]
         await update.message.reply_text(
             "✅ <b>You are already a member!</b>\n\nClick below to go directly to the channel.",
             parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(join_keyboard)
+            reply_markup=join_markup(final_invite_link)
         )
         # Update stats in background
         await db.update_stats(code)
         return
 
-    # Fetch TMDb details - Try to get cached details first
-    details = redirect_entry.get('tmdb_details')
-
-    if not details:
-        # Fetch from TMDB if not cached
-        tmdb_id = redirect_entry.get('tmdb_id')
-        media_type = redirect_entry.get('media_type', 'tv') # Default to tv if missing
-
-        details = await tmdb.get_details(media_type, tmdb_id)
-
-        if details:
-            # Cache the details for future use
-            await db.update_redirect(code, {"tmdb_details": details})
-
-    if not details:
-        # Fallback if TMDb fails and not cached
-        details = {
-            "title": redirect_entry.get('series_name'),
-            "year": "N/A",
-            "rating": "N/A",
-            "genres": "Unknown",
-            "overview": "No description available.",
-            "poster_url": None
-        }
-
-    # Construct Caption (Escape HTML characters)
-    title = html.escape(str(details.get('title', 'Unknown')))
-    genres = html.escape(str(details.get('genres', 'Unknown')))
-    overview = html.escape(str(details.get('overview', 'No description available.'))[:300])
-
-    base_caption = (
-        f"<b>{title}</b> • {details.get('year', 'N/A')}\n"
-        f"⭐️ <b>{details.get('rating', 'N/A')}/10</b>  🎭 {genres}\n\n"
-        f"💬 <b>Description:</b>\n"
-        f"{overview}...\n\n"
-    )
+    details, cacheable = await resolve_details(redirect_entry)
+    # Captions and keyboards are pre-rendered once per redirect
+    rendered = render_cache.get(code, details, permanent_link, cache=cacheable)
 
-    initial_caption = base_caption + "Enjoy watching! 🍿"
-
-    # Initial Button: Loading...
-    loading_keyboard = [[InlineKeyboardButton("⏳ Loading...", callback_data="loading_wait")]]
+    # A single-use link issued to this user moments ago is still valid: hand it out again
+    issued = issued_invites.get((user_id, code))
+    if issued is not None and issued[2] not in {chat_id for chat_id, _ in channels}:
+        issued_invites.pop((user_id, code))
+        issued = None
+    if issued is not None:
+        invite_link, expires_at, _ = issued
+        minutes_left = max(1, int((expires_at - datetime.now()).total_seconds() // 60))
+        caption = rendered.initial_caption + f"\n⚠️ <b>Link expires in {minutes_left} minutes!</b>"
+        if rendered.poster_url:
+            await update.message.reply_photo(
+                photo=rendered.poster_url,
+                caption=caption,
+                parse_mode='HTML',
+                reply_markup=join_markup(invite_link)
+            )
+        else:
+            await update.message.reply_text(text=caption, parse_mode='HTML', reply_markup=join_markup(invite_link))
+        # Still a visit (used_count, and last_used which keeps it from being archived), just no new invite
+        await db.update_stats(code)
+        return
 
     # Send Message
-    if details['poster_url']:
+    if rendered.poster_url:
         message = await update.message.reply_photo(
-            photo=details['poster_url'],
-            caption=initial_caption,
+            photo=rendered.poster_url,
+            caption=rendered.initial_caption,
             parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(loading_keyboard)
+            reply_markup=LOADING_MARKUP
         )
     else:
         message = await update.message.reply_text(
-            text=initial_caption,
+            text=rendered.initial_caption,
             parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(loading_keyboard)
+            reply_markup=LOADING_MARKUP
         )
 
-    # Dynamic Loading Animation
-    loading_messages_pool = [
-        "Creating Individual Invite Link... ⚙️",
-        "Verifying User Access... 🔐",
-        "Preparing Secure Channel... 📡",
-        "Establishing Secure Connection... 📶",
-        "Encrypting Data Stream... 🔑",
-        "Allocating Bandwidth... ⚡️",
-        "Syncing with Server... 🔄",
-        "Authenticating Request... 🆔",
-        "Optimizing Video Quality... 📺",
-        "Checking Subscription Status... 📋",
-        "Generating Access Token... 🎟️",
-        "Finalizing Setup... ✅"
-    ]
-    # Select 3 random messages to show
-    loading_messages = random.sample(loading_messages_pool, 3)
+    # Dynamic Loading Animation: select 3 random messages to show
+    loading_messages = random.sample(LOADING_MESSAGES_POOL, 3)
 
     for msg in loading_messages:
+        if shutdown.draining:
+            break  # The process is stopping: skip straight to the join button
         try:
-            new_text = base_caption + f"{msg}"
-            if details['poster_url']:
+            if rendered.poster_url:
                 await message.edit_caption(
-                    caption=new_text,
+                    caption=rendered.frames[msg],
                     parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup(loading_keyboard)
+                    reply_markup=LOADING_MARKUP
                 )
             else:
                 await message.edit_text(
-                    text=new_text,
+                    text=rendered.frames[msg],
                     parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup(loading_keyboard)
+                    reply_markup=LOADING_MARKUP
                 )
         except Exception:
             pass  # Ignore errors (e.g., message not modified)
-        await asyncio.sleep(1.5)
+        await shutdown.sleep(Config.ANIMATION_FRAME_DELAY)
 
     # Determine Invite Link
-    # For non-members, create one-time invite link with 10 min expiration
-    expiration_notice = ""
-
-    if channel_id:
-        try:
-            expire_time = datetime.now() + timedelta(minutes=10)
-            invite = await context.bot.create_chat_invite_link(
-                chat_id=channel_id,
-                name=f"User {user_id}",
-                member_limit=1,
-                expire_date=expire_time
-            )
-            final_invite_link = invite.invite_link
-            expiration_notice = "\n⚠️ <b>Link expires in 10 minutes!</b>"
-        except Exception as e:
-            logger.warning(f"Failed to generate dynamic link for {channel_id}: {e}")
+    # For non-members, create one-time invite link with 10 min expiration, on the primary
+    # channel or one of its mirrors (see services.mirrors)
+    final_caption = rendered.final_caption
+    expire_time = datetime.now() + INVITE_LINK_TTL
+    invite_channel, invite = await mirror_balancer.create_invite(
+        context.bot, redirect_entry,
+        name=f"User {user_id}",
+        member_limit=1,
+        expire_date=expire_time
+    )
+    issued_invite = invite is not None
+    if issued_invite:
+        final_invite_link = invite.invite_link
+        final_caption = rendered.expiring_caption
+        issued_invites.set((user_id, code), (final_invite_link, expire_time, invite_channel))
 
     # Change Button to "Join Channel" and revert text
-    join_keyboard = [[InlineKeyboardButton("🚀 Join Channel", url=final_invite_link)]]
-
-    final_caption = initial_caption + expiration_notice
+    if final_invite_link is None:
+        # Primary broken and no mirror would mint a link: there is nothing that works to hand out
+        final_caption = rendered.base_caption + UNAVAILABLE_NOTICE
+        reply_markup = None
+    elif final_invite_link == permanent_link and rendered.member_markup:
+        reply_markup = rendered.member_markup
+    else:
+        reply_markup = join_markup(final_invite_link)
 
     try:
-        if details['poster_url']:
+        if rendered.poster_url:
             await message.edit_caption(
                 caption=final_caption,
                 parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup(join_keyboard)
+                reply_markup=reply_markup
             )
         else:
             await message.edit_text(
                 text=final_caption,
                 parse_mode='HTML',
-                reply_markup=InlineKeyboardMarkup(join_keyboard)
+                reply_markup=reply_markup
             )
     except Exception as e:
-        logger.warning(f"Failed to edit message for code {code}: {e}")
+        logger.warning(
+            "Failed to edit message for code %s: %s", code, e,
+            extra={"code": code, "user_id": user_id, "stage": "final_edit", "sample": "final_edit"}
+        )
+
+    if issued_invite:
+        # Tracked so the sweeper can revoke it once it has expired
+        await db.record_invite_link(
+            final_invite_link, invite_channel, code, "visitor",
+            user_id=user_id, expires_at=datetime.utcnow() + INVITE_LINK_TTL, tenant=tenant.key
+        )
 
     # Update stats in background
-    await db.update_stats(code)
+    await db.update_stats(code, invite_channel)
+
+    logger.debug(
+        "Served redirect %s to %s", code, user_id,
+        extra={"code": code, "user_id": user_id, "stage": "done", "tenant": tenant.name,
+               "latency_ms": round((time.monotonic() - started) * 1000)}
+    )
 
+@track_handler
 async def loading_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles clicks on the 'Loading...' button.
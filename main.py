@@ -1,11 +1,37 @@
 import logging
 import asyncio
-from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, ChatMemberHandler, ContextTypes
+import signal
+import time
+from telegram import Update
+from telegram.ext import Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler, ChatMemberHandler, ContextTypes
+from telegram.request import BaseRequest
 from config import Config
 from utils.logger import setup_logger
-from handlers.admin import admin_dashboard, admin_callback_handler
+from handlers.admin import admin_dashboard, broadcast_command
 from handlers.start import start_handler, loading_callback
-from handlers.channel_setup import setup_conversation_handler, channel_event_handler
+from handlers.channel_setup import build_setup_conversation_handler, channel_event_handler, change_channel_decision
+from handlers.invites import chat_member_handler
+from handlers.inline import inline_handler, answer_cache
+from database import db
+from services.archiver import archiver
+from services.broadcaster import broadcaster
+from services.cache_sync import cache_sync
+from services.channel_auditor import channel_auditor
+from services.invite_sweeper import invite_sweeper
+from services.health import loop_monitor, health_server
+from services.profiler import blocking_detector
+from services.shutdown import shutdown
+from services.search_index import search_index
+from services.session_reaper import session_reaper
+from services.warmup import load_snapshot, save_snapshot, warm_up
+from handlers.start import issued_invites
+from tmdb import tmdb
+from utils.bot_request import InstrumentedRequest
+from utils.callbacks import callback_dispatcher
+from utils.metrics import metrics, register_cache
+from utils.render import render_cache
+from utils.tenants import Tenant, load_tenants
+from utils.update_queue import PriorityUpdateQueue
 
 # Set up logging
 logger = setup_logger(__name__)
@@ -14,49 +40,192 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     """Log the error and send a telegram message to notify the developer."""
     logger.error(f"Exception while handling an update: {context.error}")
 
-def main():
-    """Start the bot."""
-    # Validate configuration
-    try:
-        Config.validate()
-    except ValueError as e:
-        logger.critical(f"Configuration Error: {e}")
-        return
+# Seconds a forced stop may still take once the drain deadline has passed
+SHUTDOWN_GRACE = 3
+
+# Update types the bot has handlers for; everything else is never fetched
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY, Update.MY_CHAT_MEMBER, Update.CHAT_MEMBER]
+
+async def post_init(application: Application):
+    """Runs once the bot is initialized: prepares the database and starts background services."""
+    await db.ensure_indexes()
+    await search_index.load(application.bot_data['tenant'], application.bot.username)
+    invite_sweeper.start(application.bot_data['tenant'], application.bot)
+    broadcaster.start(application.bot_data['tenant'], application.bot)
+    channel_auditor.start(application.bot_data['tenant'], application.bot)
+    session_reaper.start(application.bot_data['tenant'], application)
 
-    application = ApplicationBuilder().token(Config.BOT_TOKEN).build()
+async def post_shutdown(application: Application):
+    """Stops background services."""
+    await invite_sweeper.stop(application.bot_data['tenant'])
+    await broadcaster.stop(application.bot_data['tenant'])
+    await channel_auditor.stop(application.bot_data['tenant'])
+    await session_reaper.stop(application.bot_data['tenant'])
+    search_index.unload(application.bot_data['tenant'])
+
+def build_application(tenant: Tenant, request: BaseRequest = None) -> Application:
+    """
+    Builds the Application for one tenant's bot and registers all handlers.
+    `request` replaces the HTTP transport for every Bot API call (the benchmarks pass a fake one).
+    """
+    application = (
+        ApplicationBuilder()
+        .token(tenant.bot_token)
+        .request(request or InstrumentedRequest(connection_pool_size=256, tenant=tenant.name))
+        .get_updates_request(request or InstrumentedRequest(connection_pool_size=1, tenant=tenant.name))
+        # Admins and fresh updates first when a backlog arrives after downtime
+        .update_queue(PriorityUpdateQueue(tenant))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    application.bot_data['tenant'] = tenant
+    metrics.gauge("update_queue_depth", application.update_queue.qsize, tenant=tenant.name)
 
     # Handlers
 
     # 1. Conversation Handlers (Stateful)
     # Channel Setup (High Priority)
-    application.add_handler(setup_conversation_handler)
+    application.add_handler(build_setup_conversation_handler())
 
     # Channel Event Handler (Triggers the setup message to Admin)
     application.add_handler(channel_event_handler)
 
-    from handlers.channel_setup import change_channel_decision
+    # Join tracking for invite link conversion metrics
+    application.add_handler(chat_member_handler)
+
     application.add_handler(CallbackQueryHandler(change_channel_decision, pattern="^change_"))
 
     # 2. Command Handlers
-    application.add_handler(CommandHandler("start", start_handler))
+    # Non-blocking: a redirect animates for several seconds and must not hold up other updates
+    application.add_handler(CommandHandler("start", start_handler, block=False))
     application.add_handler(CommandHandler("admin", admin_dashboard))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
 
     # 3. Callback Query Handlers (Specific patterns)
-    # Note: regenerate_conversation_handler handles 'admin_regenerate', so admin_callback_handler won't see it if conversation starts.
-    # But admin_callback_handler matches '^admin_', so we need to be careful.
-    # Actually, Application checks handlers in order. If regenerate_conversation_handler matches, it handles it?
-    # Wait, ConversationHandler only handles if it's in a state OR if it matches an entry point.
-    # If it matches entry point, it returns the first state.
-    # So yes, adding it before admin_callback_handler is correct.
-
-    application.add_handler(CallbackQueryHandler(admin_callback_handler, pattern="^admin_"))
+    # Dashboard buttons are encoded by utils.callbacks and dispatched by action. Legacy 'admin_*'
+    # buttons still in old messages go to the same dispatcher, which treats them as expired.
+    application.add_handler(CallbackQueryHandler(callback_dispatcher, pattern="^(~|admin_)"))
     application.add_handler(CallbackQueryHandler(loading_callback, pattern="^loading_wait$"))
 
+    # 4. Inline mode
+    application.add_handler(inline_handler)
+
     # Error handler
     application.add_error_handler(error_handler)
 
-    logger.info("Bot is starting...")
-    application.run_polling()
+    return application
+
+async def run_applications(applications: list):
+    """
+    Runs all tenants' bots in one event loop until SIGINT/SIGTERM.
+    They share the global Motor client (database.db) and TMDb client (tmdb.tmdb).
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # Start even if the database is unreachable (readiness reports it), then keep monitoring it
+    if not await db.ping():
+        logger.warning("MongoDB is unreachable at startup; readiness will fail until it recovers.")
+    db.monitor.start()
+
+    # Serve the first clicks after a deploy from warm caches: a recent snapshot is restored
+    # instantly and refreshed in the background, otherwise startup waits (bounded) for the DB warm-up.
+    # The cache sync starts in between, so changes made meanwhile by other instances are applied.
+    restored = load_snapshot()
+    cache_sync.start()
+    warmup_task = asyncio.create_task(warm_up(), name="cache-warmup") if Config.WARMUP_REDIRECTS else None
+    if not restored and warmup_task is not None:
+        done, _ = await asyncio.wait([warmup_task], timeout=Config.WARMUP_TIMEOUT)
+        if not done:
+            logger.warning("Cache warm-up is taking long, starting without waiting for it.")
+
+    loop_monitor.start()
+    blocking_detector.start()
+    archiver.start()
+    await health_server.start([application.bot_data['tenant'] for application in applications])
+
+    started = []
+    try:
+        for application in applications:
+            await application.initialize()
+            if application.post_init:
+                await application.post_init(application)
+            await application.updater.start_polling(allowed_updates=ALLOWED_UPDATES)
+            await application.start()
+            started.append(application)
+            logger.info(f"Bot @{application.bot.username} ({application.bot_data['tenant'].name}) is running")
+
+        await stop_event.wait()
+    finally:
+        logger.info("Stopping bots...")
+        stop_started = time.monotonic()
+        await drain_applications(started, Config.SHUTDOWN_TIMEOUT)
+        for application in reversed(started):
+            if application.post_shutdown:
+                await application.post_shutdown(application)
+            await application.shutdown()
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        await archiver.stop()
+        await cache_sync.stop()
+        save_snapshot()
+        await health_server.stop()
+        await blocking_detector.stop()
+        await loop_monitor.stop()
+        await db.monitor.stop()
+        await tmdb.aclose()
+        db.client.close()
+        logger.info(
+            f"Shutdown complete in {time.monotonic() - stop_started:.1f}s: "
+            f"{shutdown.drained} redirect(s) drained, {shutdown.dropped} dropped"
+        )
+
+async def drain_applications(applications: list, timeout: float):
+    """
+    Stops fetching updates, then lets the updates already received finish (redirects skip
+    the rest of their animation, see services.shutdown) for up to `timeout` seconds.
+    Redirects still running after that are cancelled and reported as dropped.
+    """
+    shutdown.begin()
+    for application in applications:
+        if application.updater.running:
+            await application.updater.stop()
+
+    # Application.stop() handles the queued updates and waits for non-blocking handlers
+    stopping = asyncio.gather(*(application.stop() for application in applications if application.running))
+    done, _ = await asyncio.wait([stopping], timeout=timeout)
+    if done:
+        return
+    logger.warning(f"Drain deadline reached, cancelling {shutdown.cancel_in_flight()} redirect(s)")
+    done, _ = await asyncio.wait([stopping], timeout=SHUTDOWN_GRACE)
+    if not done:
+        # Some other background handler (e.g. an admin-triggered audit) is still running
+        stopping.cancel()
+        logger.error("Bots did not stop in time, forcing shutdown")
+
+def main():
+    """Start the bot(s)."""
+    # Validate configuration
+    try:
+        Config.validate()
+        tenants = load_tenants()
+    except ValueError as e:
+        logger.critical(f"Configuration Error: {e}")
+        return
+
+    applications = [build_application(tenant) for tenant in tenants]
+
+    register_cache("render", render_cache.cache)
+    register_cache("tmdb_metadata", db.metadata_cache)
+    register_cache("redirects", db.redirect_cache)
+    register_cache("issued_invites", issued_invites)
+    register_cache("inline_answers", answer_cache)
+
+    logger.info(f"Bot is starting ({len(applications)} tenant(s))...")
+    asyncio.run(run_applications(applications))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,125 @@
+"""
+Typed, immutable views of the documents the bot reads on hot paths.
+
+Instances are shared by the in-process caches (Database.redirect_cache, metadata_cache, the
+cache snapshot) and handed to every handler, so they are frozen: a change goes through
+the Database methods, which invalidate the cached objects. Slots keep each cached entry
+small, and from_bson() reads only the projected fields, ignoring anything else.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any
+
+
+@dataclass(frozen=True, slots=True)
+class TmdbDetails:
+    """The TMDb fields a redirect card shows (tmdb_metadata.details)."""
+    title: str = "Unknown"
+    year: str = "N/A"
+    rating: Any = "N/A"
+    genres: str = "Unknown"
+    overview: str = "No description available."
+    poster_url: str | None = None
+    media_type: str = "tv"
+    tmdb_id: int | None = None
+    runtime: Any = None
+
+    @classmethod
+    def from_bson(cls, doc: dict) -> "TmdbDetails":
+        get = doc.get
+        return cls(
+            get('title') or "Unknown", get('year', "N/A"), get('rating', "N/A"), get('genres', "Unknown"),
+            get('overview') or "No description available.", get('poster_url'), get('media_type', "tv"),
+            get('tmdb_id'), get('runtime'),
+        )
+
+    def to_bson(self) -> dict:
+        return {
+            "title": self.title, "year": self.year, "rating": self.rating, "genres": self.genres,
+            "overview": self.overview, "poster_url": self.poster_url, "media_type": self.media_type,
+            "tmdb_id": self.tmdb_id, "runtime": self.runtime,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Mirror:
+    """An extra channel visitor invites of a redirect are spread over (see services.mirrors)."""
+    chat_id: int
+    weight: int = 1
+    status: str = "ok"
+    error: str | None = None
+
+    @property
+    def broken(self) -> bool:
+        return self.status == "broken"
+
+    @classmethod
+    def from_bson(cls, doc: dict) -> "Mirror":
+        get = doc.get
+        return cls(doc['chat_id'], max(1, get('weight') or 1), get('status') or "ok", get('error'))
+
+
+@dataclass(frozen=True, slots=True)
+class Redirect:
+    """
+    A redirect_links document without its TMDb details: those are shared per title and
+    loaded on demand (details_key -> Database.get_tmdb_metadata), never carried per redirect.
+    """
+    code: str
+    id: Any = None
+    tenant: str | None = None
+    series_name: str = "Unknown"
+    tmdb_id: int | None = None
+    media_type: str = "tv"
+    private_channel_id: int | None = None
+    invite_link: str | None = None
+    used_count: int = 0
+    last_used: datetime | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+    channel_status: str = "ok"
+    channel_error: str | None = None
+    mirrors: tuple = ()
+    invites_by_channel: dict = field(default_factory=dict, hash=False)
+
+    @classmethod
+    def from_bson(cls, doc: dict) -> "Redirect":
+        get = doc.get
+        mirrors = get('mirrors')
+        return cls(
+            doc['code'], get('_id'), get('tenant'), get('series_name') or "Unknown", get('tmdb_id'),
+            get('media_type') or "tv", get('private_channel_id'), get('invite_link'), get('used_count') or 0,
+            get('last_used'), get('created_at'), get('updated_at'), get('channel_status') or "ok",
+            get('channel_error'), tuple(Mirror.from_bson(mirror) for mirror in mirrors) if mirrors else (),
+            get('invites_by_channel') or {},
+        )
+
+    @property
+    def broken(self) -> bool:
+        """True if the primary channel is marked broken (mirrors may still work)."""
+        return self.channel_status == "broken"
+
+    @property
+    def details_key(self) -> tuple:
+        """Key of this redirect's TMDb details in tmdb_metadata and Database.metadata_cache."""
+        return self.media_type, self.tmdb_id
+
+    def channels(self) -> list:
+        """(chat_id, mirror) for every channel; mirror is None for the primary channel."""
+        channels = [(self.private_channel_id, None)] if self.private_channel_id else []
+        channels.extend((mirror.chat_id, mirror) for mirror in self.mirrors)
+        return channels
+
+    def healthy_channels(self) -> list:
+        """(chat_id, weight) of the channels not marked broken, primary first."""
+        healthy = [(self.private_channel_id, 1)] if self.private_channel_id and not self.broken else []
+        healthy.extend((mirror.chat_id, mirror.weight) for mirror in self.mirrors if not mirror.broken)
+        return healthy
+
+
+# Fields to fetch for a Redirect (everything else, like tmdb_details, stays in MongoDB)
+REDIRECT_FIELDS = {
+    "code": 1, "tenant": 1, "series_name": 1, "tmdb_id": 1, "media_type": 1, "private_channel_id": 1,
+    "invite_link": 1, "used_count": 1, "last_used": 1, "created_at": 1, "updated_at": 1,
+    "channel_status": 1, "channel_error": 1, "mirrors": 1, "invites_by_channel": 1,
+}
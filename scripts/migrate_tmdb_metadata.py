@@ -0,0 +1,40 @@
+"""
+Moves TMDb details embedded in redirect_links documents into the shared tmdb_metadata
+collection. Runs in small batches and can be run while the bot is live: the bot reads
+both document shapes and migrates single documents on access as well.
+
+Usage: python scripts/migrate_tmdb_metadata.py [--batch-size 200] [--pause 0.5] [--limit N]
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import db  # noqa: E402
+from utils.logger import setup_logger, stop_logging  # noqa: E402
+
+logger = setup_logger("migrate_tmdb_metadata")
+
+
+async def run(args):
+    await db.ensure_indexes()
+    remaining = await db.redirects.count_documents({"tmdb_details": {"$exists": True}})
+    logger.info(f"{remaining} redirects still embed TMDb details")
+
+    migrated = await db.migrate_tmdb_details(batch_size=args.batch_size, pause=args.pause, limit=args.limit)
+    logger.info(f"Done: migrated {migrated} redirects")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds to wait between batches")
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many documents")
+    asyncio.run(run(parser.parse_args()))
+    stop_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+from config import Config
+from database import db
+from utils.background import PeriodicTask
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+
+class RedirectArchiver:
+    """
+    Moves redirects nobody used for ARCHIVE_AFTER_DAYS from redirect_links to redirect_archive,
+    so the collection every lookup, listing and cache sync touches (and its indexes) only
+    holds the live working set. Archived redirects keep working: Database.get_redirect
+    promotes them back on their next visit.
+
+    Runs in batches with a pause in between, like the TMDb details migration, so it never
+    competes with visitors for the database.
+    """
+
+    def __init__(self):
+        self.archived = 0
+        self.task = PeriodicTask("redirect-archiver", Config.ARCHIVE_INTERVAL, self.run, initial_delay=120)
+
+    def start(self):
+        if Config.ARCHIVE_AFTER_DAYS > 0:
+            self.task.start()
+
+    async def stop(self):
+        await self.task.stop()
+
+    async def run(self) -> int:
+        """Archives every redirect that is due. Returns how many were moved."""
+        cutoff = datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+        moved = 0
+        while True:
+            codes = await db.archive_batch(cutoff, Config.ARCHIVE_BATCH)
+            moved += len(codes)
+            if len(codes) < Config.ARCHIVE_BATCH:
+                break
+            await asyncio.sleep(Config.ARCHIVE_PAUSE)
+
+        if moved:
+            self.archived += moved
+            metrics.inc("redirects_archived_total", moved)
+            logger.info(f"Archived {moved} redirects unused for {Config.ARCHIVE_AFTER_DAYS} days")
+        return moved
+
+
+# Global instance
+archiver = RedirectArchiver()
@@ -0,0 +1,176 @@
+import asyncio
+import html
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from config import Config
+from database import db
+from utils.background import PeriodicTask
+from utils.cache import TTLCache
+from utils.helpers import retry_after_seconds
+from utils.logger import setup_logger
+from utils.metrics import metrics
+from utils.ratelimit import AsyncRateLimiter
+from utils.resilience import backoff_delay
+
+logger = setup_logger(__name__)
+
+# Per-channel outcomes are written to the job document in batches of this size
+FLUSH_EVERY = 25
+
+
+class Broadcaster:
+    """
+    Delivers scheduled announcements (broadcast_jobs) to every channel behind a tenant's redirects.
+
+    Jobs are claimed from MongoDB by a polling task, so they survive restarts: a job left
+    'running' is resumed and skips the channels already recorded in its results. A claim is
+    a lease held by this process (`owner`) and renewed on every poll, so with several
+    replicas only a job whose lease has expired is taken over; the previous holder notices
+    on its next flush and stops. Messages
+    fan out over a few workers under a global rate limit (shared by all jobs, kept below
+    Telegram's ~30 msg/s so visitors keep their share) and a minimum interval per chat.
+    A RetryAfter pauses every worker, since flood control applies to the whole bot.
+    """
+
+    def __init__(self):
+        self.bots = {}    # tenant key -> (tenant, bot)
+        self.active = {}  # job id -> (tenant key, asyncio.Task)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.limiter = AsyncRateLimiter(Config.BROADCAST_RATE, burst=max(1, int(Config.BROADCAST_RATE)))
+        self.last_sent = TTLCache(max_size=100000, ttl=Config.BROADCAST_CHAT_INTERVAL)  # chat id -> monotonic time
+        self.paused_until = 0.0
+        self.task = PeriodicTask("broadcaster", Config.BROADCAST_POLL_INTERVAL, self.poll, initial_delay=5)
+
+    def start(self, tenant, bot):
+        self.bots[tenant.key] = (tenant, bot)
+        self.task.start()
+
+    async def stop(self, tenant):
+        self.bots.pop(tenant.key, None)
+        # Interrupted jobs stay 'running' in the database and resume on the next start
+        jobs = {job_id: task for job_id, (key, task) in self.active.items() if key == tenant.key}
+        for task in jobs.values():
+            task.cancel()
+        await asyncio.gather(*jobs.values(), return_exceptions=True)
+        if jobs:
+            await db.release_broadcasts(list(jobs), self.owner)
+        if not self.bots:
+            await self.task.stop()
+
+    async def poll(self):
+        """Renews the leases of the jobs running here, then starts every due (or abandoned) job."""
+        if self.active:
+            await db.renew_broadcast_leases(list(self.active), self.owner)
+        for tenant_key, (tenant, bot) in list(self.bots.items()):
+            while True:
+                job = await db.claim_broadcast(tenant_key, self.owner)
+                if job is None or job['_id'] in self.active:
+                    # Nothing due, or a job of ours whose lease ran out (BROADCAST_LEASE below the poll interval)
+                    break
+                task = asyncio.create_task(self.run_job(tenant, bot, job), name=f"broadcast-{job['_id']}")
+                self.active[job['_id']] = (tenant_key, task)
+                task.add_done_callback(lambda _, job_id=job['_id']: self.active.pop(job_id, None))
+
+    async def run_job(self, tenant, bot, job: dict):
+        job_id = job['_id']
+        targets = job.get('targets')
+        if targets is None:
+            targets = await db.channel_ids(tenant.key)
+            await db.set_broadcast_targets(job_id, targets)
+
+        done = set(job.get('results') or {})
+        queue = asyncio.Queue()
+        for chat_id in targets:
+            if str(chat_id) not in done:
+                queue.put_nowait(chat_id)
+        logger.info(f"Broadcast {job_id} ({tenant.name}): {queue.qsize()} of {len(targets)} channels to go")
+
+        results = {}
+        state = {"status": "running"}
+
+        async def flush():
+            nonlocal results
+            if results:
+                batch, results = results, {}
+                state["status"] = await db.record_broadcast_results(job_id, batch, self.owner)
+
+        async def worker():
+            while state["status"] == "running" and not queue.empty():
+                chat_id = queue.get_nowait()
+                results[str(chat_id)] = await self.deliver(bot, chat_id, job['text'])
+                if len(results) >= FLUSH_EVERY:
+                    await flush()  # Also picks up a cancellation from the admin
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(Config.BROADCAST_CONCURRENCY, queue.qsize())))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await flush()
+
+        if state["status"] == "running":
+            await db.finish_broadcast(job_id, self.owner)
+        elif state["status"] is None:
+            logger.warning(f"Broadcast {job_id} ({tenant.name}) was taken over by another process, stopping here")
+            return
+        await self.report(tenant, bot, job_id)
+
+    async def deliver(self, bot, chat_id: int, text: str) -> str:
+        """Sends one message. Returns 'sent' or the error that made it fail."""
+        error = None
+        for attempt in range(Config.BROADCAST_MAX_ATTEMPTS):
+            last = self.last_sent.get(chat_id)
+            if last is not None:
+                await asyncio.sleep(max(0.0, last + Config.BROADCAST_CHAT_INTERVAL - time.monotonic()))
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.limiter.acquire()
+
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+                self.last_sent.set(chat_id, time.monotonic())
+                metrics.inc("broadcast_messages_total", outcome="sent")
+                return "sent"
+            except RetryAfter as e:
+                delay = retry_after_seconds(e)
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                error = "rate limited"
+                logger.warning(f"Broadcast rate limited, pausing all deliveries for {delay}s")
+            except (Forbidden, BadRequest) as e:
+                # Bot removed from the channel, channel deleted, ... - retrying won't help
+                metrics.inc("broadcast_messages_total", outcome="failed")
+                return e.message
+            except TelegramError as e:
+                error = e.message
+                await asyncio.sleep(backoff_delay(attempt))
+
+        metrics.inc("broadcast_messages_total", outcome="failed")
+        return error
+
+    async def report(self, tenant, bot, job_id):
+        """Sends the delivery report to the tenant's primary admin."""
+        job = await db.get_broadcast(tenant.key, job_id)
+        if job is None:
+            return
+        errors = Counter(outcome for outcome in job['results'].values() if outcome != "sent")
+        lines = [
+            f"📣 <b>Broadcast {job['status']}</b> (<code>{job_id}</code>)\n",
+            f"✅ Delivered: {job['sent']}/{job['total']}",
+            f"❌ Failed: {job['failed']}",
+        ]
+        for error, count in errors.most_common(5):
+            lines.append(f"  • {count}x {html.escape(str(error))}")
+        try:
+            await bot.send_message(chat_id=tenant.primary_admin, text="\n".join(lines), parse_mode='HTML')
+        except TelegramError as e:
+            logger.error(f"Could not send broadcast report to {tenant.primary_admin}: {e}")
+
+
+# Global instance
+broadcaster = Broadcaster()
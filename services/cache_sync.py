@@ -0,0 +1,152 @@
+import asyncio
+from datetime import datetime, timedelta
+from pymongo.errors import OperationFailure, PyMongoError
+from config import Config
+from database import db
+from models import Redirect
+from utils.background import PeriodicTask
+from utils.cache import TTLCache
+from utils.logger import setup_logger
+from utils.metrics import metrics
+from utils.render import render_cache
+from utils.resilience import backoff_delay
+
+logger = setup_logger(__name__)
+
+# Server error codes: change streams unsupported (standalone mongod), resume point no longer in the oplog
+CHANGE_STREAMS_UNSUPPORTED = (40573,)
+HISTORY_LOST = (136, 280, 286)
+
+# Polling: deleted redirects are looked for once every this many polls, and each poll
+# re-reads a few seconds before the newest change seen to tolerate clock skew between instances
+DELETE_CHECK_EVERY = 12
+POLL_OVERLAP = timedelta(seconds=5)
+
+
+class CacheSync:
+    """
+    Keeps this instance's caches coherent with writes made by other instances.
+
+    With a replica set, a change stream on redirect_links invalidates every changed code
+    through the Database listeners (redirect, render and search caches) and pushes the new
+    document into the redirect cache, usually within milliseconds. The resume token is kept
+    across reconnects and in the cache snapshot, so nothing is missed over a restart; if the
+    oplog no longer has it, the caches are dropped instead.
+
+    A standalone mongod has no change streams: it falls back to polling `updated_at`, and
+    periodically checks which cached codes were deleted.
+    """
+
+    def __init__(self):
+        self.resume_token = None
+        self.mode = None  # "stream" or "poll" once running
+        self.since = None  # polling: newest updated_at seen (or when the restored snapshot was taken)
+        self._ids = TTLCache(max_size=100000)  # _id -> code, for delete events (which carry only the _id)
+        self._polls = 0
+        self._task = None
+        self.poller = PeriodicTask("cache-sync-poll", Config.CACHE_SYNC_POLL_INTERVAL, self.poll)
+
+    def start(self):
+        if Config.CACHE_SYNC_MODE == "off":
+            return
+        self.since = self.since or datetime.utcnow()
+        if Config.CACHE_SYNC_MODE == "poll":
+            self._start_polling()
+        elif self._task is None:
+            self._task = asyncio.create_task(self._watch_forever(), name="cache-sync")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.poller.stop()
+
+    def _start_polling(self):
+        self.mode = "poll"
+        logger.info(f"Cache sync polling for changes every {Config.CACHE_SYNC_POLL_INTERVAL}s")
+        self.poller.start()
+
+    async def _watch_forever(self):
+        attempt = 0
+        while True:
+            try:
+                async with db.watch_redirects(self.resume_token) as stream:
+                    if self.mode != "stream":
+                        self.mode = "stream"
+                        logger.info("Cache sync following the redirect change stream")
+                    attempt = 0
+                    async for change in stream:
+                        self.apply(change)
+                        self.resume_token = stream.resume_token
+            except OperationFailure as e:
+                if e.code in CHANGE_STREAMS_UNSUPPORTED:
+                    self._start_polling()
+                    return
+                if e.code in HISTORY_LOST and self.resume_token is not None:
+                    logger.warning(f"Change stream could not resume ({e}), dropping caches")
+                    self.resume_token = None
+                    self.reset()
+                    continue
+                logger.error(f"Change stream failed: {e}")
+            except PyMongoError as e:
+                logger.error(f"Change stream interrupted: {e}")
+            await asyncio.sleep(backoff_delay(attempt, base=1, cap=30))
+            attempt += 1
+
+    def apply(self, change: dict):
+        """Applies one change stream event to the local caches."""
+        doc = change.get('fullDocument')
+        _id = change['documentKey']['_id']
+        if doc:
+            code = doc['code']
+            self._ids.set(_id, code)
+        else:
+            code = self._ids.pop(_id) or self._cached_code(_id)
+        metrics.inc("cache_sync_events_total", operation=change['operationType'])
+        if code is None:
+            return  # Deleted without ever being cached here
+        self.refresh(code, doc)
+
+    def refresh(self, code: str, doc: dict | None):
+        db.invalidate(code)
+        if doc:
+            db.redirect_cache.set(code, Redirect.from_bson(doc))
+
+    @staticmethod
+    def _cached_code(_id):
+        for code, entry in db.redirect_cache.items():
+            if entry.id == _id:
+                return code
+        return None
+
+    def reset(self):
+        """Drops the caches whose entries may have missed changes."""
+        db.redirect_cache.clear()
+        render_cache.clear()
+
+    async def poll(self):
+        async for doc in db.changed_redirects(self.since - POLL_OVERLAP):
+            self.since = max(self.since, doc['updated_at'])
+            # updated_at has millisecond precision: compare documents, not timestamps
+            if db.redirect_cache.get(doc['code']) != Redirect.from_bson(doc):
+                metrics.inc("cache_sync_events_total", operation="poll")
+                self.refresh(doc['code'], doc)
+
+        self._polls += 1
+        if self._polls % DELETE_CHECK_EVERY == 0:
+            await self._check_deleted()
+
+    async def _check_deleted(self):
+        codes = [code for code, _ in db.redirect_cache.items()]
+        for i in range(0, len(codes), 1000):
+            batch = codes[i:i + 1000]
+            existing = await db.existing_codes(batch)
+            for code in batch:
+                if code not in existing:
+                    metrics.inc("cache_sync_events_total", operation="delete")
+                    db.invalidate(code)
+
+
+# Global instance
+cache_sync = CacheSync()
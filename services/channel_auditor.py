@@ -0,0 +1,203 @@
+import asyncio
+import html
+from telegram import ChatMember
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from config import Config
+from database import db
+from utils.background import PeriodicTask
+from utils.helpers import retry_after_seconds
+from utils.logger import setup_logger
+from utils.metrics import metrics
+from utils.ratelimit import AsyncRateLimiter
+
+logger = setup_logger(__name__)
+
+# Digest lines per section, the rest is summarised as a count
+DIGEST_LIMIT = 20
+
+# Check outcome when Telegram could not be asked (network error, flood control)
+UNKNOWN = object()
+
+
+class ChannelAuditor:
+    """
+    Periodically verifies that the bot is still an admin allowed to invite users in every
+    channel behind a redirect, mirrors included. Broken channels are marked in the database
+    (so /start skips them, or answers properly instead of handing out a dead link) and the
+    tenant's admin receives one digest of what broke or recovered since the previous run.
+    """
+
+    def __init__(self):
+        self.bots = {}  # tenant key -> (tenant, bot)
+        self.limiter = AsyncRateLimiter(Config.CHANNEL_AUDIT_RATE, burst=1)
+        self.task = PeriodicTask("channel-auditor", Config.CHANNEL_AUDIT_INTERVAL, self.audit, initial_delay=60)
+        self._running = set()  # tenant keys being audited right now
+
+    def start(self, tenant, bot):
+        self.bots[tenant.key] = (tenant, bot)
+        self.task.start()
+
+    async def stop(self, tenant):
+        self.bots.pop(tenant.key, None)
+        if not self.bots:
+            await self.task.stop()
+
+    async def audit(self):
+        for tenant, bot in list(self.bots.values()):
+            await self.audit_tenant(tenant, bot)
+
+    async def audit_tenant(self, tenant, bot) -> dict:
+        """Checks all of the tenant's channels. Returns counters of the run (None if one is already running)."""
+        if tenant.key in self._running:
+            return None
+        self._running.add(tenant.key)
+        try:
+            return await self._audit_tenant(tenant, bot)
+        finally:
+            self._running.discard(tenant.key)
+
+    async def _audit_tenant(self, tenant, bot) -> dict:
+        semaphore = asyncio.Semaphore(Config.CHANNEL_AUDIT_CONCURRENCY)
+        channels = {}  # chat id -> (redirect, mirror or None for the primary channel) using it
+        tasks = []
+
+        # Acquiring before each spawn bounds the checks in flight and paces the cursor with them
+        async for entry in db.iter_redirect_channels(tenant.key):
+            for chat_id, mirror in entry.channels():
+                if chat_id in channels:
+                    channels[chat_id].append((entry, mirror))
+                    continue
+                channels[chat_id] = [(entry, mirror)]
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(self._check(bot, chat_id, semaphore)))
+
+        broken, recovered, unknown = [], [], 0
+        for chat_id, problem in await asyncio.gather(*tasks):
+            if problem is UNKNOWN:
+                unknown += 1  # Couldn't tell (network error): keep the previous state
+                continue
+            for mirror_of, users in self._group(channels[chat_id]):
+                was_broken, error = users[0][1]
+                codes = [entry.code for entry, _ in users]
+                if problem and (not was_broken or error != problem):
+                    await self._set_health(codes, chat_id, mirror_of, problem)
+                    if not was_broken:
+                        broken.extend((entry, chat_id, problem) for entry, _ in users)
+                elif not problem and was_broken:
+                    await self._set_health(codes, chat_id, mirror_of)
+                    recovered.extend((entry, chat_id) for entry, _ in users)
+
+        stats = {"checked": len(tasks), "broken": len(broken), "recovered": len(recovered), "unknown": unknown}
+        metrics.inc("channel_audit_runs_total", tenant=tenant.name)
+        logger.info(f"Channel audit ({tenant.name}): {stats}")
+        if broken or recovered:
+            await self.send_digest(tenant, bot, broken, recovered)
+        return stats
+
+    @staticmethod
+    def _group(users: list) -> list:
+        """
+        Splits a channel's users into those using it as primary channel and as a mirror,
+        each as (is_mirror, [(entry, (was_broken, last_error)), ...]).
+        """
+        groups = {}
+        for entry, mirror in users:
+            if mirror is None:
+                state = (entry.broken, entry.channel_error)
+            else:
+                state = (mirror.broken, mirror.error)
+            groups.setdefault((mirror is not None, state), []).append((entry, state))
+        return [(is_mirror, group) for (is_mirror, _), group in groups.items()]
+
+    @staticmethod
+    async def _set_health(codes: list, chat_id: int, is_mirror: bool, problem: str = None):
+        if is_mirror:
+            await db.set_mirror_health(codes, chat_id, problem)
+        else:
+            await db.set_channel_health(codes, problem)
+
+    async def recheck_channel(self, bot, tenant_key, chat_id: int):
+        """
+        Checks one channel right away (the bot was re-added or re-promoted there) and updates
+        the health of the tenant's redirects using it, instead of waiting for the next audit.
+        """
+        problem = await self.check_channel(bot, chat_id)
+        if problem is UNKNOWN:
+            return
+        primary, mirrors = [], []
+        for entry in await db.redirects_using_channel(tenant_key, chat_id):
+            if entry.private_channel_id == chat_id and (entry.broken, entry.channel_error) != (bool(problem), problem):
+                primary.append(entry.code)
+            for mirror in entry.mirrors:
+                if mirror.chat_id == chat_id and (mirror.broken, mirror.error) != (bool(problem), problem):
+                    mirrors.append(entry.code)
+        if primary:
+            await db.set_channel_health(primary, problem)
+        if mirrors:
+            await db.set_mirror_health(mirrors, chat_id, problem)
+        if primary or mirrors:
+            logger.info(f"Channel {chat_id} re-checked: {problem or 'healthy'} ({len(primary) + len(mirrors)} redirect(s) updated)")
+
+    async def _check(self, bot, chat_id: int, semaphore: asyncio.Semaphore):
+        try:
+            return chat_id, await self.check_channel(bot, chat_id)
+        finally:
+            semaphore.release()
+
+    async def check_channel(self, bot, chat_id: int):
+        """
+        Returns None if the bot can invite users to the channel, a short reason if it
+        can't, or UNKNOWN if the check itself failed.
+        """
+        for _ in range(2):
+            await self.limiter.acquire()
+            try:
+                member = await bot.get_chat_member(chat_id=chat_id, user_id=bot.id)
+            except RetryAfter as e:
+                await asyncio.sleep(retry_after_seconds(e))
+                continue
+            except (Forbidden, BadRequest) as e:
+                # Kicked, channel deleted or the bot can no longer see it
+                return f"unreachable: {e.message}"
+            except TelegramError as e:
+                logger.debug("Channel audit of %s failed: %s", chat_id, e)
+                return UNKNOWN
+
+            if member.status == ChatMember.OWNER:
+                return None
+            if member.status != ChatMember.ADMINISTRATOR:
+                return f"bot is no longer an admin ({member.status})"
+            if not member.can_invite_users:
+                return "missing 'Invite Users' permission"
+            return None
+        return UNKNOWN
+
+    async def send_digest(self, tenant, bot, broken: list, recovered: list):
+        lines = ["🩺 <b>Channel Health Report</b>"]
+        if broken:
+            lines.append(f"\n⚠️ <b>{len(broken)} redirect(s) broken:</b>")
+            for entry, chat_id, problem in broken[:DIGEST_LIMIT]:
+                label = "" if chat_id == entry.private_channel_id else "mirror "
+                lines.append(
+                    f"• {html.escape(entry.series_name)} "
+                    f"({label}<code>{chat_id}</code>): {html.escape(problem)}"
+                )
+            if len(broken) > DIGEST_LIMIT:
+                lines.append(f"<i>...and {len(broken) - DIGEST_LIMIT} more</i>")
+        if recovered:
+            lines.append(f"\n✅ <b>{len(recovered)} redirect(s) recovered:</b>")
+            for entry, chat_id in recovered[:DIGEST_LIMIT]:
+                lines.append(f"• {html.escape(entry.series_name)} (<code>{chat_id}</code>)")
+            if len(recovered) > DIGEST_LIMIT:
+                lines.append(f"<i>...and {len(recovered) - DIGEST_LIMIT} more</i>")
+        if broken:
+            lines.append("\nRe-add me as an admin with the 'Invite Users' permission, or change the channel from /admin.")
+
+        try:
+            await bot.send_message(chat_id=tenant.primary_admin, text="\n".join(lines), parse_mode='HTML')
+        except TelegramError as e:
+            logger.error(f"Could not send channel health report to {tenant.primary_admin}: {e}")
+
+
+# Global instance
+channel_auditor = ChannelAuditor()
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import time
+from config import Config
+from database import db
+from services.shutdown import shutdown
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how late a periodic sleep wakes up. Sustained lag means
+    something is blocking the loop; the handlers running at that moment are logged.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+            metrics.gauge("event_loop_lag_seconds", lambda: self.lag)
+            metrics.gauge("event_loop_lag_max_seconds", lambda: self.max_lag)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.monotonic() - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.lag * 1000 >= Config.LOOP_LAG_WARN_MS:
+                active = [name for name, count in metrics.active_handlers.items() if count]
+                metrics.inc("event_loop_stalls_total")
+                logger.warning(
+                    "Event loop blocked for %.0f ms; handlers in flight: %s",
+                    self.lag * 1000, ", ".join(active) or "none"
+                )
+
+
+class HealthServer:
+    """
+    Tiny HTTP/1.0 server (no extra dependency) exposing:
+      /healthz  - event loop lag below the threshold
+      /readyz   - MongoDB reachable, every bot's getUpdates succeeded recently and not shutting down
+      /metrics  - Prometheus text format
+    """
+
+    def __init__(self, loop_monitor: LoopLagMonitor):
+        self.loop_monitor = loop_monitor
+        self.tenants = []
+        self._server = None
+
+    async def start(self, tenants: list):
+        self.tenants = [tenant.name for tenant in tenants]
+        if not Config.HEALTH_PORT:
+            return
+        self._server = await asyncio.start_server(self._handle, Config.HEALTH_HOST, Config.HEALTH_PORT)
+        logger.info(f"Health endpoints listening on {Config.HEALTH_HOST}:{Config.HEALTH_PORT}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def healthz(self):
+        lag_ms = round(self.loop_monitor.lag * 1000, 1)
+        healthy = lag_ms < Config.LOOP_LAG_UNHEALTHY_MS
+        return (200 if healthy else 503), {"status": "ok" if healthy else "lagging", "loop_lag_ms": lag_ms}
+
+    def readyz(self):
+        now = time.monotonic()
+        polling = {}
+        for tenant in self.tenants:
+            last = metrics.last_get_updates.get(tenant)
+            polling[tenant] = None if last is None else round(now - last, 1)
+        polling_ok = all(age is not None and age < Config.READY_MAX_POLL_AGE for age in polling.values())
+        database = db.health_snapshot()
+        ready = database["ready"] and polling_ok and not shutdown.draining
+        body = {"status": "ready" if ready else "not_ready", "database": database, "last_get_updates_age_s": polling,
+                "draining": shutdown.draining}
+        return (200 if ready else 503), body
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else "/"
+
+            if path == "/healthz":
+                status, body = self.healthz()
+                payload, content_type = json.dumps(body, default=str).encode(), "application/json"
+            elif path == "/readyz":
+                status, body = self.readyz()
+                payload, content_type = json.dumps(body, default=str).encode(), "application/json"
+            elif path == "/metrics":
+                status, payload, content_type = 200, metrics.render().encode(), "text/plain; version=0.0.4"
+            else:
+                status, payload, content_type = 404, b"not found\n", "text/plain"
+
+            reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[status]
+            writer.write(
+                f"HTTP/1.0 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+# Global instances
+loop_monitor = LoopLagMonitor()
+health_server = HealthServer(loop_monitor)
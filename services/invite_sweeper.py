@@ -0,0 +1,92 @@
+import asyncio
+from telegram.error import RetryAfter, TelegramError
+from config import Config
+from database import db
+from utils.background import PeriodicTask
+from utils.helpers import retry_after_seconds
+from utils.logger import setup_logger
+from utils.ratelimit import AsyncRateLimiter
+
+logger = setup_logger(__name__)
+
+
+class InviteSweeper:
+    """
+    Periodically revokes invite links that expired or were replaced, in batches and
+    under a rate limiter so cleanup never competes with visitors for Bot API quota.
+    """
+
+    def __init__(self):
+        self.bots = {}  # tenant key -> Bot that owns the tenant's links
+        self.limiter = AsyncRateLimiter(Config.INVITE_REVOKE_RATE, burst=1)
+        self.task = PeriodicTask("invite-sweeper", Config.INVITE_SWEEP_INTERVAL, self.sweep, initial_delay=30)
+
+    def start(self, tenant, bot):
+        self.bots[tenant.key] = bot
+        self.task.start()
+
+    async def stop(self, tenant):
+        self.bots.pop(tenant.key, None)
+        if not self.bots:
+            await self.task.stop()
+
+    async def sweep(self):
+        """Revokes one batch of due links per tenant. Returns the number of links processed."""
+        processed = 0
+        for tenant_key, bot in list(self.bots.items()):
+            processed += await self.sweep_tenant(tenant_key, bot)
+        return processed
+
+    async def sweep_tenant(self, tenant_key, bot):
+        links = await db.get_invites_to_revoke(tenant_key, Config.INVITE_SWEEP_BATCH)
+        if not links:
+            return 0
+        revoked, failed = await self.revoke(bot, links)
+        logger.info(f"Invite sweeper revoked {len(revoked)} links ({len(failed)} failed)")
+        return len(revoked) + len(failed)
+
+    async def leave_channel(self, bot, tenant_key, chat_id: int) -> bool:
+        """
+        Leaves a channel none of the tenant's redirects uses any more, after revoking the
+        links still open there (the bot can't once it is gone). Returns False if it stays.
+        """
+        if await db.redirects_using_channel(tenant_key, chat_id):
+            return False
+        links = await db.get_open_invites(tenant_key, chat_id)
+        while links:
+            revoked, failed = await self.revoke(bot, links)
+            # A RetryAfter stops a batch early: go on with what is left
+            done = set(revoked) | set(failed)
+            links = [link for link in links if link['invite_link'] not in done]
+        try:
+            await bot.leave_chat(chat_id)
+        except TelegramError as e:
+            logger.warning(f"Could not leave channel {chat_id}: {e}")
+        return True
+
+    async def revoke(self, bot, links: list):
+        """Revokes links under the rate limit and records the outcome. Returns (revoked, failed) links."""
+        revoked, failed = [], []
+        for link in links:
+            await self.limiter.acquire()
+            try:
+                await bot.revoke_chat_invite_link(chat_id=link['chat_id'], invite_link=link['invite_link'])
+                revoked.append(link['invite_link'])
+            except RetryAfter as e:
+                # Stop this batch; the remaining links are picked up next round
+                delay = retry_after_seconds(e)
+                logger.warning(f"Invite sweeper rate limited, pausing for {delay}s")
+                await asyncio.sleep(delay)
+                break
+            except TelegramError as e:
+                # Bot left the channel, link already gone, ... - nothing left to retry
+                failed.append(link['invite_link'])
+                logger.debug("Could not revoke %s in %s: %s", link['invite_link'], link['chat_id'], e)
+
+        await db.mark_invites_revoked(revoked)
+        await db.mark_invites_revoked(failed, error="revoke_failed")
+        return revoked, failed
+
+
+# Global instance
+invite_sweeper = InviteSweeper()
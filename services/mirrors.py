@@ -0,0 +1,117 @@
+import random
+import time
+from collections import defaultdict
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from config import Config
+from database import db
+from models import Redirect
+from utils.helpers import retry_after_seconds
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+
+class MirrorBalancer:
+    """
+    Spreads visitor invite links over a redirect's primary channel and its mirrors.
+
+    Telegram rate-limits createChatInviteLink per chat, so during a premiere a single
+    channel caps how fast visitors get their link. Each invite goes to the healthy channel
+    with the fewest invites in flight relative to its weight (random among ties); a channel
+    that answers with flood control sits out until Telegram allows it again, and the
+    invite fails over to the next channel. After MIRROR_EJECT_FAILURES consecutive refusals
+    (Forbidden/BadRequest: the bot lost its rights there) a channel is marked broken in the
+    database, which takes it out of rotation on every instance until the channel auditor
+    sees it working again. Network errors and timeouts only fail over, and the last healthy
+    channel of a redirect is never ejected: /start then falls back to the permanent link.
+    """
+
+    def __init__(self):
+        self.in_flight = defaultdict(int)   # chat id -> invite calls running
+        self.failures = defaultdict(int)    # chat id -> consecutive failures
+        self.cooldown = {}                  # chat id -> monotonic time flood control ends
+        self.stats = defaultdict(lambda: {"issued": 0, "failed": 0, "rate_limited": 0})
+
+    def candidates(self, entry: Redirect) -> list:
+        """Healthy channels not under flood control, best first."""
+        now = time.monotonic()
+        channels = [
+            (chat_id, weight) for chat_id, weight in entry.healthy_channels()
+            if self.cooldown.get(chat_id, 0) <= now
+        ]
+        random.shuffle(channels)  # ties go to a random channel
+        channels.sort(key=lambda channel: (self.in_flight[channel[0]] + 1) / channel[1])
+        return [chat_id for chat_id, _ in channels]
+
+    async def create_invite(self, bot, entry: Redirect, **kwargs):
+        """
+        Creates an invite link on the best channel of the redirect, failing over to the others.
+        Returns (chat_id, ChatInviteLink), or (None, None) if no channel could issue one.
+        """
+        for chat_id in self.candidates(entry):
+            self.in_flight[chat_id] += 1
+            try:
+                invite = await bot.create_chat_invite_link(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                self.cooldown[chat_id] = time.monotonic() + retry_after_seconds(e)
+                self.stats[chat_id]["rate_limited"] += 1
+                metrics.inc("mirror_invites_total", outcome="rate_limited")
+                continue
+            except (Forbidden, BadRequest) as e:
+                self.stats[chat_id]["failed"] += 1
+                metrics.inc("mirror_invites_total", outcome="failed")
+                await self._failed(entry, chat_id, e)
+                continue
+            except TelegramError as e:
+                # Timeouts and network errors say nothing about the channel: just fail over
+                self.stats[chat_id]["failed"] += 1
+                metrics.inc("mirror_invites_total", outcome="failed")
+                logger.warning(
+                    "Invite creation in %s failed: %s", chat_id, e,
+                    extra={"code": entry.code, "stage": "invite", "sample": "invite"}
+                )
+                continue
+            finally:
+                self.in_flight[chat_id] -= 1
+
+            self.failures.pop(chat_id, None)
+            self.stats[chat_id]["issued"] += 1
+            metrics.inc("mirror_invites_total", outcome="issued")
+            return chat_id, invite
+        return None, None
+
+    async def _failed(self, entry: Redirect, chat_id: int, error: TelegramError):
+        self.failures[chat_id] += 1
+        logger.warning(
+            "Invite creation failed in %s (%s in a row): %s", chat_id, self.failures[chat_id], error,
+            extra={"code": entry.code, "stage": "invite", "sample": "invite"}
+        )
+        if self.failures[chat_id] < Config.MIRROR_EJECT_FAILURES:
+            return
+
+        # Health as stored now: the entry may predate an ejection by a concurrent request
+        current = await db.get_redirect(entry.code, cached=False) or entry
+        if not any(healthy != chat_id for healthy, _ in current.healthy_channels()):
+            # Never eject the last healthy channel: visitors still get the permanent link
+            logger.error(f"Invite creation keeps failing in {chat_id}, the last healthy channel of {entry.code}: {error}")
+            return
+
+        # Eject it: the auditor puts it back once the bot can invite users there again
+        self.failures.pop(chat_id, None)
+        problem = f"invite creation failing: {error}"
+        if chat_id == entry.private_channel_id:
+            await db.set_channel_health([entry.code], problem)
+        else:
+            await db.set_mirror_health([entry.code], chat_id, problem)
+        metrics.inc("mirror_ejections_total")
+        logger.error(f"Ejected channel {chat_id} of redirect {entry.code}: {problem}")
+
+    def channel_stats(self, chat_id: int) -> dict:
+        """Counters of this process for one channel (since start)."""
+        return dict(self.stats[chat_id], in_flight=self.in_flight[chat_id],
+                    cooling=self.cooldown.get(chat_id, 0) > time.monotonic())
+
+
+# Global instance
+mirror_balancer = MirrorBalancer()
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from config import Config
+from utils.background import PeriodicTask
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Frames the loop sits in while idle, waiting for I/O
+IDLE_FUNCTIONS = {"select", "poll", "epoll", "kqueue", "_run_once"}
+
+
+def _describe(frame) -> str:
+    path = os.path.relpath(frame.f_code.co_filename, PROJECT_ROOT)
+    return f"{path}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def _is_project_frame(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.startswith(PROJECT_ROOT) and "site-packages" not in filename
+
+
+def _update_type(update) -> str:
+    """Names the populated field of a telegram Update (message, callback_query, ...)."""
+    for field in ("message", "callback_query", "inline_query", "my_chat_member", "chat_member"):
+        if getattr(update, field, None) is not None:
+            return field
+    return type(update).__name__ if update is not None else "-"
+
+
+def _attribute(frame):
+    """
+    Walks a stalled stack from the innermost frame outwards. Returns (handler, update_type,
+    location, stack) where handler is the outermost running handler callback and location is
+    the innermost project frame, i.e. the line that was blocking.
+    """
+    handler, update_type, location, stack = "-", "-", None, []
+    handlers = set(metrics.active_handlers)
+    while frame is not None:
+        if _is_project_frame(frame):
+            stack.append(_describe(frame))
+            if location is None:
+                location = stack[-1]
+        if frame.f_code.co_name in handlers:
+            handler = frame.f_code.co_name
+            update_type = _update_type(frame.f_locals.get("update"))
+        frame = frame.f_back
+    return handler, update_type, location or "<library code>", stack
+
+
+class BlockingDetector:
+    """
+    Opt-in (LOOP_DEBUG=1) detector for callbacks that block the event loop.
+
+    * asyncio debug mode with `slow_callback_duration` reports every slow callback step.
+    * A watchdog thread notices when the loop heartbeat stops and samples the loop thread's
+      stack while it is stalled, attributing the stall to the running handler and update type.
+    * A periodic report logs the top-N stall sites.
+    """
+
+    def __init__(self):
+        self.threshold = Config.LOOP_DEBUG_THRESHOLD_MS / 1000
+        self.stalls = {}  # (handler, update_type, location) -> [count, total seconds, sample stack]
+        self.slow_callbacks = Counter()  # asyncio's description -> count
+        self._heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.report_task = PeriodicTask("loop-debug-report", Config.LOOP_DEBUG_REPORT_INTERVAL, self.report,
+                                        initial_delay=Config.LOOP_DEBUG_REPORT_INTERVAL)
+
+    def start(self):
+        if not Config.LOOP_DEBUG or self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._loop.set_debug(True)
+        self._loop.slow_callback_duration = self.threshold
+        logging.getLogger("asyncio").addHandler(_SlowCallbackHandler(self))
+
+        self._stop.clear()
+        self._loop.call_soon(self._beat)
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        self.report_task.start()
+        logger.info(f"Loop blocking detector enabled (threshold {Config.LOOP_DEBUG_THRESHOLD_MS} ms)")
+
+    async def stop(self):
+        await self.report_task.stop()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _beat(self):
+        self._heartbeat = time.monotonic()
+        if not self._stop.is_set():
+            self._loop.call_later(self.threshold / 4, self._beat)
+
+    def _watch(self):
+        # One sample per stall: the stack when the stall first crosses the threshold
+        sampled_beat = None
+        while not self._stop.wait(self.threshold / 4):
+            beat = self._heartbeat
+            stalled_for = time.monotonic() - beat
+            if stalled_for < self.threshold or beat == sampled_beat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            sampled_beat = beat
+            key_handler, update_type, location, stack = _attribute(frame)
+            with self._lock:
+                entry = self.stalls.setdefault((key_handler, update_type, location), [0, 0.0, stack])
+                entry[0] += 1
+                entry[1] += stalled_for
+            metrics.inc("event_loop_stall_samples_total", handler=key_handler)
+
+    def top(self, limit: int = None):
+        limit = limit or Config.LOOP_DEBUG_TOP_N
+        with self._lock:
+            items = sorted(self.stalls.items(), key=lambda item: item[1][1], reverse=True)
+        return items[:limit]
+
+    async def report(self):
+        top = self.top()
+        if not top and not self.slow_callbacks:
+            return
+        lines = [f"Top {len(top)} event loop stall sites:"]
+        for (handler, update_type, location), (count, total, stack) in top:
+            lines.append(f"  {count}x {total * 1000:.0f} ms  handler={handler} update={update_type}  at {location}")
+            lines.extend(f"      {frame}" for frame in stack[1:4])
+        for description, count in self.slow_callbacks.most_common(Config.LOOP_DEBUG_TOP_N):
+            lines.append(f"  slow callback {count}x: {description}")
+        logger.warning("\n".join(lines))
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects asyncio's 'Executing <...> took N seconds' debug-mode warnings."""
+
+    def __init__(self, detector: BlockingDetector):
+        super().__init__(logging.WARNING)
+        self.detector = detector
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith("Executing "):
+            description = message.rsplit(" took ", 1)[0][len("Executing "):]
+            # Task reprs carry addresses; keep the coroutine name so identical callbacks group together
+            coro = description.split("coro=<", 1)[-1].split("(", 1)[0] if "coro=<" in description else description[:120]
+            self.detector.slow_callbacks[coro] += 1
+
+
+def sample_profile(thread_id: int, duration: float, interval: float = 0.005, limit: int = 15) -> str:
+    """
+    Statistical profiler: samples the given thread's stack every `interval` seconds for
+    `duration` seconds (meant to run in a worker thread). Returns a plain-text report of
+    the hottest project functions, by samples in which they were on the stack.
+    """
+    inclusive, leaf = Counter(), Counter()
+    samples = idle = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            if frame.f_code.co_name in IDLE_FUNCTIONS:
+                idle += 1
+            else:
+                seen, first = set(), True
+                while frame is not None:
+                    if _is_project_frame(frame):
+                        name = f"{os.path.relpath(frame.f_code.co_filename, PROJECT_ROOT)}:{frame.f_code.co_name}"
+                        if first:
+                            leaf[name] += 1
+                            first = False
+                        if name not in seen:
+                            inclusive[name] += 1
+                            seen.add(name)
+                    frame = frame.f_back
+        time.sleep(interval)
+
+    busy = samples - idle
+    lines = [f"{samples} samples over {duration:.0f}s, loop busy {busy / samples * 100 if samples else 0:.1f}%"]
+    for name, count in inclusive.most_common(limit):
+        lines.append(f"{count / samples * 100 if samples else 0:5.1f}% (self {leaf[name]:>4})  {name}")
+    return "\n".join(lines)
+
+
+async def profile_event_loop(duration: float) -> str:
+    """Samples the event loop thread for `duration` seconds without blocking the loop."""
+    return await asyncio.to_thread(sample_profile, threading.get_ident(), duration)
+
+
+# Global instance
+blocking_detector = BlockingDetector()
@@ -0,0 +1,188 @@
+import asyncio
+import bisect
+import html
+from pymongo.errors import PyMongoError
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InputTextMessageContent
+from config import Config
+from database import db
+from models import Redirect, TmdbDetails
+from utils.helpers import tokenize
+from utils.logger import setup_logger
+from utils.metrics import metrics
+from utils.render import render_base_caption
+
+logger = setup_logger(__name__)
+
+
+def parse_search_entry(doc: dict) -> tuple:
+    """(Redirect, details still embedded in an unmigrated document or None) of a search projection."""
+    legacy = doc.get('tmdb_details')
+    return Redirect.from_bson(doc), TmdbDetails.from_bson(legacy) if legacy else None
+
+
+class IndexedRedirect:
+    """One searchable redirect with its inline result rendered once."""
+    __slots__ = ('code', 'used_count', 'sort_name', 'tokens', 'result')
+
+    def __init__(self, entry: Redirect, details: TmdbDetails | None, bot_username: str):
+        name = entry.series_name
+        self.code = entry.code
+        self.used_count = entry.used_count
+        self.sort_name = name.lower()
+        self.tokens = set(tokenize(name))
+
+        deep_link = f"https://t.me/{bot_username}?start={self.code}"
+        if details is not None:
+            self.tokens |= set(tokenize(details.title)) | set(tokenize(str(details.year)))
+            caption = render_base_caption(details)
+        else:
+            details = TmdbDetails(title=name)
+            caption = f"<b>{html.escape(name)}</b>\n\n"
+        self.result = InlineQueryResultArticle(
+            id=self.code,
+            title=f"{details.title} ({details.year})",
+            description=f"⭐️ {details.rating}/10 • {details.genres}",
+            thumbnail_url=details.poster_url,
+            input_message_content=InputTextMessageContent(caption + "👇 Tap below to watch.", parse_mode='HTML'),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🍿 Watch Now", url=deep_link)]]),
+        )
+
+
+class TenantIndex:
+    """Inverted word index over one tenant's redirects, with a sorted vocabulary for prefix matches."""
+
+    def __init__(self, bot_username: str):
+        self.bot_username = bot_username
+        self.entries = {}   # code -> IndexedRedirect
+        self.postings = {}  # word -> set of codes
+        self.vocabulary = []  # sorted words
+        self.version = 0    # bumped on every change, so cached answers can be keyed on it
+
+    def add(self, item: IndexedRedirect):
+        self.remove(item.code)
+        self.entries[item.code] = item
+        for token in item.tokens:
+            codes = self.postings.get(token)
+            if codes is None:
+                codes = self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+            codes.add(item.code)
+        self.version += 1
+
+    def remove(self, code: str) -> bool:
+        item = self.entries.pop(code, None)
+        if item is None:
+            return False
+        for token in item.tokens:
+            codes = self.postings[token]
+            codes.discard(code)
+            if not codes:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        self.version += 1
+        return True
+
+    def _prefix_matches(self, prefix: str) -> set:
+        codes = set()
+        for i in range(bisect.bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            word = self.vocabulary[i]
+            if not word.startswith(prefix):
+                break
+            codes |= self.postings[word]
+        return codes
+
+    def search(self, tokens: list, limit: int) -> list:
+        """Redirects matching every token (the last one as a prefix, as it may still be typed), most used first."""
+        if not tokens:
+            candidates = self.entries.keys()
+        else:
+            candidates = None
+            for i, token in enumerate(tokens):
+                codes = self._prefix_matches(token) if i == len(tokens) - 1 else self.postings.get(token, set())
+                candidates = codes if candidates is None else candidates & codes
+                if not candidates:
+                    return []
+        items = sorted((self.entries[code] for code in candidates), key=lambda item: (-item.used_count, item.sort_name))
+        return [item.result for item in items[:limit]]
+
+
+class SearchIndex:
+    """
+    In-memory search over every attached tenant's redirects for inline mode. Built once per
+    tenant at startup, then kept current through Database listeners: each created, changed or
+    deleted code is re-read from the primary in the background (batched), so inline queries
+    never touch MongoDB or TMDb. Redirects without a healthy channel are left out.
+    """
+
+    def __init__(self):
+        self.tenants = {}  # tenant key -> TenantIndex
+        self._pending = set()
+        self._refresh_task = None
+        db.add_listener(self.mark_changed)
+
+    async def load(self, tenant, bot_username: str):
+        """(Re)builds the tenant's index from the database."""
+        index = TenantIndex(bot_username)
+        try:
+            entries = [parse_search_entry(doc) async for doc in db.iter_search_entries(tenant.key)]
+            keys = {entry.details_key for entry, _ in entries if entry.tmdb_id}
+            metadata = await db.load_tmdb_metadata(list(keys))
+        except PyMongoError as e:
+            logger.error(f"Could not build the inline search index ({tenant.name}): {e}")
+            return
+        for entry, legacy_details in entries:
+            if entry.healthy_channels():
+                details = metadata.get(entry.details_key) or legacy_details
+                index.add(IndexedRedirect(entry, details, bot_username))
+        self.tenants[tenant.key] = index
+        metrics.gauge("inline_index_entries", lambda: len(index.entries), tenant=tenant.name)
+        logger.info(f"Inline search index ({tenant.name}): {len(index.entries)} redirects")
+
+    def unload(self, tenant):
+        self.tenants.pop(tenant.key, None)
+        if not self.tenants and self._refresh_task is not None:
+            self._refresh_task.cancel()
+
+    def search(self, tenant_key, tokens: list, limit: int = None) -> list:
+        """Ready-made inline query results for a tokenized query."""
+        index = self.tenants.get(tenant_key)
+        if index is None:
+            return []
+        return index.search(tokens, limit or Config.INLINE_MAX_RESULTS)
+
+    def version(self, tenant_key):
+        """Changes whenever the tenant's index does (None if it has none)."""
+        index = self.tenants.get(tenant_key)
+        return index.version if index is not None else None
+
+    def mark_changed(self, code: str):
+        """Database listener: queues the code for a background refresh."""
+        if not self.tenants or not code:
+            return
+        self._pending.add(code)
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh(), name="search-index-refresh")
+
+    async def _refresh(self):
+        while self._pending:
+            code = self._pending.pop()
+            try:
+                doc = await db.get_search_entry(code)
+                entry, legacy_details = parse_search_entry(doc) if doc else (None, None)
+                details = None
+                if entry and entry.tmdb_id:
+                    details = await db.get_tmdb_metadata(*entry.details_key)
+            except PyMongoError as e:
+                # The entry stays as it was until the code changes again or the index is rebuilt
+                logger.error(f"Could not refresh inline search entry {code}: {e}")
+                continue
+
+            for index in self.tenants.values():
+                index.remove(code)
+            index = self.tenants.get(entry.tenant) if entry else None
+            if index is not None and entry.healthy_channels():
+                index.add(IndexedRedirect(entry, details or legacy_details, index.bot_username))
+
+
+# Global instance
+search_index = SearchIndex()
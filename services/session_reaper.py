@@ -0,0 +1,116 @@
+import sys
+import time
+from config import Config
+from database import db
+from utils.background import PeriodicTask
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+# user_data key holding the monotonic time of the user's last step in a session
+ACTIVE_AT = 'session_active_at'
+SETUP_KEYS = ('setup_channel_id', 'search_results')
+WAITING_KEYS = ('waiting_change_channel_code', 'waiting_mirror_code')
+
+
+def touch_session(user_data: dict):
+    """Marks the user's session (setup conversation, change channel / add mirror flow) as active."""
+    user_data[ACTIVE_AT] = time.monotonic()
+
+
+def session_expired(user_data: dict) -> bool:
+    """True if the session has been idle for SESSION_TIMEOUT, or was never marked active."""
+    return time.monotonic() - user_data.get(ACTIVE_AT, float("-inf")) > Config.SESSION_TIMEOUT
+
+
+async def discard_session(user_data: dict, tenant_key):
+    """
+    Forgets the user's pending flows. The invite link minted for a setup that never became
+    a redirect is retired, so the invite sweeper revokes it.
+    """
+    invite_link, channel_id = user_data.get('setup_invite_link'), user_data.get('setup_channel_id')
+    user_data.clear()
+    if invite_link:
+        await db.retire_invite_link(invite_link, channel_id, None, tenant_key)
+        metrics.inc("setup_links_retired_total")
+
+
+def _deep_size(obj, seen: set = None) -> int:
+    """Approximate bytes held by obj and the containers/values it references."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    return size
+
+
+class SessionReaper:
+    """
+    Frees per-user state of abandoned admin sessions. Without a JobQueue PTB's
+    conversation_timeout does nothing, so a setup dropped halfway used to keep its search
+    results, channel and invite link in context.user_data for the life of the process,
+    and the link itself stayed valid. Every SESSION_REAP_INTERVAL the reaper drops the
+    user_data of users idle for SESSION_TIMEOUT (and empty ones), retiring unused setup
+    links; the setup conversation itself ends on the user's next message (see
+    handlers.channel_setup). Each run also logs the size of what is left.
+    """
+
+    def __init__(self):
+        self.applications = {}  # tenant key -> (tenant, Application)
+        self.task = PeriodicTask("session-reaper", Config.SESSION_REAP_INTERVAL, self.reap,
+                                 initial_delay=Config.SESSION_REAP_INTERVAL)
+
+    def start(self, tenant, application):
+        self.applications[tenant.key] = (tenant, application)
+        metrics.gauge("sessions_active", lambda: self.report(application)["sessions"], tenant=tenant.name)
+        metrics.gauge("session_memory_bytes", lambda: self.report(application)["bytes"], tenant=tenant.name)
+        self.task.start()
+
+    async def stop(self, tenant):
+        self.applications.pop(tenant.key, None)
+        if not self.applications:
+            await self.task.stop()
+
+    async def reap(self):
+        for tenant, application in list(self.applications.values()):
+            await self.reap_application(tenant, application)
+
+    async def reap_application(self, tenant, application) -> int:
+        """Drops the application's idle sessions. Returns how many were dropped."""
+        reaped = 0
+        for user_id, user_data in list(application.user_data.items()):
+            if user_data and not session_expired(user_data):
+                continue
+            # Detached before awaiting, so a session the user resumes meanwhile starts clean
+            application.drop_user_data(user_id)
+            await discard_session(user_data, tenant.key)
+            reaped += 1
+        for chat_id, chat_data in list(application.chat_data.items()):
+            if not chat_data:
+                application.drop_chat_data(chat_id)
+
+        metrics.inc("sessions_reaped_total", reaped, tenant=tenant.name)
+        logger.info(f"Session reaper ({tenant.name}): {reaped} reaped, {self.report(application)}")
+        return reaped
+
+    @staticmethod
+    def report(application) -> dict:
+        """Size of the per-user state the application still holds."""
+        sessions = [user_data for user_data in application.user_data.values() if user_data]
+        return {
+            "sessions": len(sessions),
+            "setups": sum(1 for user_data in sessions if any(key in user_data for key in SETUP_KEYS)),
+            "waiting": sum(1 for user_data in sessions if any(key in user_data for key in WAITING_KEYS)),
+            "chats": len(application.chat_data),
+            "bytes": sum(_deep_size(user_data) for user_data in sessions),
+        }
+
+
+# Global instance
+session_reaper = SessionReaper()
@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class GracefulShutdown:
+    """
+    Drain state shared by the handlers and main.run_applications.
+
+    Once draining starts, redirects skip the rest of their loading animation and go straight
+    to the join button (see sleep()), so a visitor caught by a redeploy still gets a link and
+    their stats are written. Redirects still running when the deadline hits are cancelled and
+    counted as dropped.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.drained = 0
+        self.dropped = 0
+        self._event = asyncio.Event()
+        self._tasks = set()
+
+    def begin(self):
+        if not self.draining:
+            self.draining = True
+            self._event.set()
+            logger.info(f"Draining: {len(self._tasks)} redirect(s) in flight")
+
+    async def sleep(self, delay: float) -> bool:
+        """Sleeps `delay` seconds, or less if draining starts meanwhile. Returns True when draining."""
+        if not self.draining:
+            try:
+                await asyncio.wait_for(self._event.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        return self.draining
+
+    @asynccontextmanager
+    async def track(self):
+        """Wraps one redirect so the drain can count it, and cancel it past the deadline."""
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            yield
+            if self.draining:
+                self.drained += 1
+        finally:
+            self._tasks.discard(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def cancel_in_flight(self) -> int:
+        """Cancels the redirects that did not finish in time. Returns how many."""
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        self.dropped += len(tasks)
+        return len(tasks)
+
+
+# Global instance
+shutdown = GracefulShutdown()
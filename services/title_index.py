@@ -0,0 +1,224 @@
+"""
+Offline TMDb title index built from TMDb's daily ID exports
+(https://developer.themoviedb.org/docs/daily-id-exports), so the setup search does not
+need a search/multi call for every name an admin types.
+
+Build (or refresh) it with:
+
+    python -m services.title_index movie_ids_MM_DD_YYYY.json.gz tv_series_ids_MM_DD_YYYY.json.gz -o titles.idx
+
+and point TITLE_INDEX_PATH at the output. The file is memory-mapped, never read whole.
+
+Layout (little-endian):
+    header   magic, record count, key count, build time
+    records  one per title: tmdb id, popularity, title offset/length, media type
+    keys     sorted by key then popularity (descending): key offset/length, record number
+    strings  UTF-8 titles and keys, referenced by offset from the start of this section
+
+A title gets one key per word it starts with (up to MAX_KEY_SUFFIXES), so 'rookie' finds
+'The Rookie'. Keys are normalized like the inline search (utils.helpers.tokenize).
+"""
+import argparse
+import gzip
+import json
+import mmap
+import os
+import struct
+import time
+from config import Config
+from utils.helpers import tokenize
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MAGIC = b"XTVTIX01"
+HEADER = struct.Struct("<8sIId")
+RECORD = struct.Struct("<IfIHB")  # tmdb_id, popularity, title offset, title length, media type
+KEY = struct.Struct("<IBI")       # key offset, key length, record number
+MEDIA_TYPES = ("movie", "tv")
+
+MAX_KEY_SUFFIXES = 3
+MAX_KEY_BYTES = 255
+# Keys examined per query at most: bounds very short prefixes ('a') without hurting real names
+MAX_SCAN = 500
+
+
+def normalize(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def read_dump(path: str):
+    """Yields (tmdb_id, media_type, title, popularity) from one gzipped JSONL export."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                continue
+            if item.get("adult") or item.get("video"):
+                continue
+            if "original_name" in item:
+                yield item["id"], "tv", item["original_name"], item.get("popularity", 0.0)
+            elif "original_title" in item:
+                yield item["id"], "movie", item["original_title"], item.get("popularity", 0.0)
+
+
+def build_index(dumps: list, output: str, min_popularity: float = 0.0) -> dict:
+    """Builds the index file from export dumps (written atomically). Returns counters."""
+    records = []
+    keys = []
+    strings = bytearray()
+    string_offsets = {}
+
+    def add_string(value: bytes) -> int:
+        offset = string_offsets.get(value)
+        if offset is None:
+            offset = string_offsets[value] = len(strings)
+            strings.extend(value)
+        return offset
+
+    for path in dumps:
+        for tmdb_id, media_type, title, popularity in read_dump(path):
+            if popularity < min_popularity or not title:
+                continue
+            words = tokenize(title)
+            if not words:
+                continue
+            encoded = title.encode("utf-8")[:0xFFFF]
+            record = len(records)
+            records.append((tmdb_id, popularity, add_string(encoded), len(encoded), MEDIA_TYPES.index(media_type)))
+            for start in range(min(len(words), MAX_KEY_SUFFIXES)):
+                key = " ".join(words[start:]).encode("utf-8")[:MAX_KEY_BYTES]
+                keys.append((key, -popularity, record))
+
+    keys.sort()
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records), len(keys), time.time()))
+        for record in records:
+            f.write(RECORD.pack(*record))
+        key_entries = bytearray()
+        for key, _, record in keys:
+            key_entries += KEY.pack(add_string(key), len(key), record)
+        f.write(key_entries)
+        f.write(strings)
+    os.replace(tmp_path, output)
+    return {"titles": len(records), "keys": len(keys), "bytes": os.path.getsize(output)}
+
+
+class TitleIndex:
+    """
+    Read-only, memory-mapped view of an index file. The file is reopened when it is
+    replaced on disk, so a rebuilt index is picked up without a restart.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap = None
+        self._mtime = None
+        self.records = self.keys = 0
+
+    @property
+    def available(self) -> bool:
+        return self._open()
+
+    def _open(self) -> bool:
+        if not self.path:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return self._mmap is not None
+
+        self._mtime = mtime
+        self.close()
+        try:
+            with open(self.path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.records, self.keys, built_at = HEADER.unpack_from(data, 0)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"Cannot open title index {self.path}: {e}")
+            return False
+        if magic != MAGIC:
+            logger.warning(f"Ignoring title index {self.path}: unknown format")
+            data.close()
+            return False
+        self._mmap = data
+        self._keys_at = HEADER.size + self.records * RECORD.size
+        self._strings_at = self._keys_at + self.keys * KEY.size
+        logger.info(f"Title index loaded: {self.records} titles, built {time.strftime('%Y-%m-%d', time.gmtime(built_at))}")
+        return True
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _key(self, i: int):
+        offset, length, record = KEY.unpack_from(self._mmap, self._keys_at + i * KEY.size)
+        start = self._strings_at + offset
+        return self._mmap[start:start + length], record
+
+    def _record(self, i: int) -> tuple:
+        return RECORD.unpack_from(self._mmap, HEADER.size + i * RECORD.size)
+
+    def _result(self, i: int, exact: bool) -> dict:
+        tmdb_id, _, offset, length, media_type = self._record(i)
+        start = self._strings_at + offset
+        title = self._mmap[start:start + length].decode("utf-8", "replace")
+        return {"id": tmdb_id, "media_type": MEDIA_TYPES[media_type], "title": title, "year": "N/A", "overview": "",
+                "exact": exact}
+
+    def search(self, query: str, limit: int = 5) -> list:
+        """
+        Titles whose words start with the query (exact titles first, then by popularity),
+        shaped like TMDBClient.search() results plus `exact` (a key equals the whole query).
+        Empty when nothing matches or no index is loaded.
+        """
+        prefix = normalize(query).encode("utf-8")[:MAX_KEY_BYTES]
+        if not prefix or not self._open():
+            return []
+
+        lo, hi = 0, self.keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid)[0] < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        matches = {}  # record -> exact match
+        for i in range(lo, min(lo + MAX_SCAN, self.keys)):
+            key, record = self._key(i)
+            if not key.startswith(prefix):
+                break
+            if key == prefix:
+                matches[record] = True
+            else:
+                matches.setdefault(record, False)
+
+        # Only the titles actually returned are decoded
+        ranked = sorted(matches, key=lambda record: (not matches[record], -self._record(record)[1]))
+        return [self._result(record, matches[record]) for record in ranked[:limit]]
+
+
+# Global instance
+title_index = TitleIndex(Config.TITLE_INDEX_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the offline TMDb title index from daily ID export dumps.")
+    parser.add_argument("dumps", nargs="+", help="movie_ids_*.json.gz / tv_series_ids_*.json.gz files")
+    parser.add_argument("-o", "--output", default=Config.TITLE_INDEX_PATH or "titles.idx")
+    parser.add_argument("--min-popularity", type=float, default=0.0, help="Skip titles below this popularity")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    stats = build_index(args.dumps, args.output, args.min_popularity)
+    print(f"Wrote {args.output}: {stats} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
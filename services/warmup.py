@@ -0,0 +1,129 @@
+import os
+import pickle
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from config import Config
+from database import db
+from services.cache_sync import cache_sync
+from utils.logger import setup_logger
+from utils.render import render_cache
+
+logger = setup_logger(__name__)
+
+# Bump whenever the layout of the snapshot or of the cached values changes
+SNAPSHOT_VERSION = 2
+
+
+def prerender(entries) -> int:
+    """Renders captions/keyboards for redirects whose metadata is already cached."""
+    rendered = 0
+    for entry in entries:
+        details = db.metadata_cache.get(entry.details_key)
+        if details:
+            render_cache.get(entry.code, details, entry.invite_link)
+            rendered += 1
+    return rendered
+
+
+async def warm_up(limit: int = None) -> dict:
+    """
+    Streams the hottest redirects (by used_count, then last_used) into the redirect cache,
+    bulk-loads their TMDb metadata and pre-renders them, so the first /start after a
+    deploy skips MongoDB and rendering. If MongoDB fails midway, the stats cover what was
+    loaded until then and carry the error.
+    """
+    limit = Config.WARMUP_REDIRECTS if limit is None else limit
+    started = time.monotonic()
+    entries = []
+    keys = set()
+    error = None
+    try:
+        async for entry in db.hottest_redirects(limit):
+            db.redirect_cache.set(entry.code, entry)
+            entries.append(entry)
+
+        keys = {entry.details_key for entry in entries if entry.tmdb_id}
+        await db.load_tmdb_metadata(list(keys))
+    except PyMongoError as e:
+        # Not fatal: whatever was loaded stays, the rest is fetched on demand
+        error = str(e)
+    stats = {
+        "redirects": len(entries),
+        "metadata": sum(1 for key in keys if key in db.metadata_cache),
+        "rendered": prerender(entries),
+        "seconds": round(time.monotonic() - started, 2),
+    }
+    if error:
+        stats["error"] = error
+        logger.error(f"Cache warm-up failed: {stats}")
+    else:
+        logger.info(f"Cache warm-up done: {stats}")
+    return stats
+
+
+def save_snapshot(path: str = None) -> bool:
+    """
+    Writes the redirect and metadata caches to `path` (atomically). Only ever load
+    snapshots this bot wrote itself: the format is pickle.
+    """
+    path = path or Config.CACHE_SNAPSHOT_PATH
+    if not path:
+        return False
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.time(),
+        "redirects": db.redirect_cache.items(),
+        "metadata": db.metadata_cache.items(),
+        # Where the cache sync must pick up again for the restored entries to be current
+        "resume_token": cache_sync.resume_token,
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"Could not write cache snapshot to {path}: {e}")
+        return False
+    logger.info(f"Cache snapshot saved: {len(snapshot['redirects'])} redirects, {len(snapshot['metadata'])} titles")
+    return True
+
+
+def load_snapshot(path: str = None) -> bool:
+    """
+    Restores the caches from a snapshot written by save_snapshot(). Snapshots with another
+    version or older than CACHE_SNAPSHOT_MAX_AGE are ignored. Returns True if restored.
+    """
+    path = path or Config.CACHE_SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return False
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+        logger.warning(f"Ignoring unreadable cache snapshot {path}: {e}")
+        return False
+
+    if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+        logger.warning(f"Ignoring cache snapshot {path}: incompatible version")
+        return False
+    age = time.time() - snapshot["created_at"]
+    if age > Config.CACHE_SNAPSHOT_MAX_AGE:
+        logger.info(f"Ignoring cache snapshot {path}: {age:.0f}s old")
+        return False
+
+    # Restored entries only live for what is left of the snapshot's allowed age
+    remaining = Config.CACHE_SNAPSHOT_MAX_AGE - age
+    for code, entry in snapshot["redirects"]:
+        db.redirect_cache.set(code, entry, ttl=min(Config.REDIRECT_CACHE_TTL, remaining))
+    for key, details in snapshot["metadata"]:
+        db.metadata_cache.set(key, details, ttl=min(Config.METADATA_CACHE_TTL, remaining))
+    cache_sync.resume_token = snapshot.get("resume_token")
+    cache_sync.since = datetime.utcfromtimestamp(snapshot["created_at"])
+    rendered = prerender(entry for _, entry in snapshot["redirects"])
+    logger.info(
+        f"Cache snapshot restored ({age:.0f}s old): {len(snapshot['redirects'])} redirects, "
+        f"{len(snapshot['metadata'])} titles, {rendered} pre-rendered"
+    )
+    return True
@@ -0,0 +1,94 @@
+"""
+Offline title index built from a small fixture dump (same shape as TMDb's daily ID
+exports): exact, prefix and accent-folded lookups, popularity ordering and the `exact`
+flag that decides whether the setup search also asks the live API.
+
+Usage: pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.title_index import TitleIndex, build_index  # noqa: E402
+
+TV = [
+    {"id": 1, "original_name": "The Rookie", "popularity": 310.5},
+    {"id": 2, "original_name": "The Rookie: Feds", "popularity": 45.2},
+    {"id": 3, "original_name": "Rookie Blue", "popularity": 30.1},
+    {"id": 4, "original_name": "The Office", "popularity": 250.0},
+    {"id": 5, "original_name": "The Office", "popularity": 40.0},
+    {"id": 6, "original_name": "Pokémon", "popularity": 120.0},
+    {"id": 9, "original_name": "Rookie Adult", "popularity": 999.0, "adult": True},
+]
+MOVIES = [
+    {"id": 7, "original_title": "The Rookie", "popularity": 20.0},
+    {"id": 8, "original_title": "Amélie", "popularity": 35.0},
+]
+
+
+class TitleIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        dumps = []
+        for name, items in (("tv_series_ids.json.gz", TV), ("movie_ids.json.gz", MOVIES)):
+            path = os.path.join(cls.tmp.name, name)
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write("not json\n")  # Skipped like a truncated line
+                for item in items:
+                    f.write(json.dumps(item) + "\n")
+            dumps.append(path)
+        cls.stats = build_index(dumps, os.path.join(cls.tmp.name, "titles.idx"))
+        cls.index = TitleIndex(os.path.join(cls.tmp.name, "titles.idx"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.index.close()
+        cls.tmp.cleanup()
+
+    def ids(self, query: str, **kwargs) -> list:
+        return [item["id"] for item in self.index.search(query, **kwargs)]
+
+    def test_build_skips_adult_titles(self):
+        self.assertEqual(self.stats["titles"], 8)
+        self.assertNotIn(9, self.ids("rookie", limit=50))
+
+    def test_exact_titles_first_then_by_popularity(self):
+        self.assertEqual(self.ids("the rookie"), [1, 7, 2])
+        self.assertEqual(self.ids("the office"), [4, 5])
+
+    def test_prefix_and_word_start_lookups(self):
+        self.assertEqual(self.ids("the rook"), [1, 2, 7])
+        self.assertEqual(set(self.ids("rookie")), {1, 2, 3, 7})
+        self.assertEqual(self.ids("feds"), [2])
+
+    def test_accent_and_case_folding(self):
+        self.assertEqual(self.index.search("POKEMON")[0]["title"], "Pokémon")
+        found = self.index.search("amelie")
+        self.assertEqual((found[0]["id"], found[0]["media_type"]), (8, "movie"))
+
+    def test_results_are_shaped_like_api_results(self):
+        item = self.index.search("the office")[0]
+        self.assertEqual(set(item), {"id", "media_type", "title", "year", "overview", "exact"})
+        self.assertEqual(item["media_type"], "tv")
+
+    def test_exact_flag(self):
+        # receive_series_name skips the live API only when some result is exact
+        exact = {item["id"]: item["exact"] for item in self.index.search("the rookie")}
+        self.assertEqual(exact, {1: True, 7: True, 2: False})
+        self.assertTrue(any(item["exact"] for item in self.index.search("rookie")))
+        self.assertFalse(any(item["exact"] for item in self.index.search("rook")))
+
+    def test_misses(self):
+        self.assertEqual(self.index.search("zzzz nothing"), [])
+        self.assertEqual(self.index.search("  "), [])
+        self.assertEqual(TitleIndex(os.path.join(self.tmp.name, "missing.idx")).search("the rookie"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""
+Fault injection for the TMDb client: retries, Retry-After, hedged requests and circuit
+breaker transitions, against the stub TMDb server from the benchmarks.
+
+Usage: pip install -r requirements-dev.txt && python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from harness import StubTMDbServer  # noqa: E402  (sets the environment Config reads)
+from config import Config  # noqa: E402
+from tmdb import TMDBClient  # noqa: E402
+from utils.metrics import metrics  # noqa: E402
+from utils.resilience import CircuitBreaker  # noqa: E402
+
+RESET = 0.2
+# Retry-After: 0 keeps retries of injected 5xx fast (otherwise backoff_delay applies)
+UNAVAILABLE = (503, {"Retry-After": "0"})
+
+
+class TMDbResilienceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StubTMDbServer(latency=0)
+        await self.server.start()
+        self.client = TMDBClient()
+        self.client.base_url = self.server.base_url
+        self.client.max_retries = 2
+        self.client.hedge_delay = 0
+        self.client.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=RESET)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await self.server.stop()
+
+    def requests(self) -> int:
+        return self.server.summary()["requests_total"]
+
+    async def fail_until_open(self):
+        for _ in range(self.client.breaker.failure_threshold):
+            self.server.faults.extend([UNAVAILABLE] * (self.client.max_retries + 1))
+            self.assertEqual(await self.client.search("Dark"), [])
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+    async def test_retries_after_429_honouring_retry_after(self):
+        self.server.faults.append((429, {"Retry-After": "0.3"}))
+        started = time.monotonic()
+        results = await self.client.search("Dark")
+        self.assertTrue(results)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(self.requests(), 2)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    async def test_retry_after_beyond_the_cap_is_not_retried_early(self):
+        self.server.faults.append((429, {"Retry-After": str(Config.TMDB_MAX_RETRY_AFTER + 5)}))
+        started = time.monotonic()
+        self.assertEqual(await self.client.search("Dark"), [])
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.requests(), 1)
+        self.assertEqual(self.client.breaker.failures, 1)
+
+    async def test_recovers_from_5xx_within_retries(self):
+        self.server.faults.extend([(500, {"Retry-After": "0"}), (502, {"Retry-After": "0"})])
+        self.assertTrue(await self.client.search("Dark"))
+        self.assertEqual(self.requests(), 3)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    async def test_exhausted_retries_count_one_failure(self):
+        self.server.faults.extend([UNAVAILABLE] * 3)
+        self.assertEqual(await self.client.search("Dark"), [])
+        self.assertEqual(self.requests(), 3)
+        self.assertEqual(self.client.breaker.failures, 1)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_client_error_is_not_retried_and_does_not_trip(self):
+        self.assertIsNone(await self.client._request("unknown/endpoint"))
+        self.assertEqual(self.requests(), 1)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    async def test_open_circuit_fails_fast(self):
+        await self.fail_until_open()
+        sent = self.requests()
+        self.assertEqual(await self.client.search("Dark"), [])
+        self.assertEqual(self.requests(), sent)
+
+    async def test_half_open_probe_success_closes(self):
+        await self.fail_until_open()
+        await asyncio.sleep(RESET)
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertTrue(await self.client.search("Dark"))
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_half_open_probe_failure_reopens(self):
+        await self.fail_until_open()
+        await asyncio.sleep(RESET)
+        self.server.faults.extend([UNAVAILABLE] * 3)
+        self.assertEqual(await self.client.search("Dark"), [])
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.OPEN)
+
+    async def test_single_probe_while_half_open(self):
+        await self.fail_until_open()
+        await asyncio.sleep(RESET)
+        self.server.latency = 0.2
+        sent = self.requests()
+        first, second = await asyncio.gather(self.client.search("Dark"), self.client.search("Dark"))
+        self.assertTrue(first)
+        self.assertEqual(second, [])
+        self.assertEqual(self.requests(), sent + 1)
+
+    async def test_cancelled_probe_frees_the_probe_slot(self):
+        await self.fail_until_open()
+        await asyncio.sleep(RESET)
+        self.server.latency = 1
+        probe = asyncio.create_task(self.client.search("Dark"))
+        await asyncio.sleep(0.1)
+        probe.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe
+        self.server.latency = 0
+        self.assertTrue(await self.client.search("Dark"))
+        self.assertEqual(self.client.breaker.state, CircuitBreaker.CLOSED)
+
+
+
+class TMDbHedgingTest(unittest.IsolatedAsyncioTestCase):
+    """get_details() sends a second request when the first is slow (TMDB_HEDGE_DELAY)."""
+    HEDGE_DELAY = 0.1
+
+    async def asyncSetUp(self):
+        self.server = StubTMDbServer(latency=0)
+        await self.server.start()
+        self.client = TMDBClient()
+        self.client.base_url = self.server.base_url
+        self.client.max_retries = 0
+        self.client.hedge_delay = self.HEDGE_DELAY
+        self.client.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=RESET)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        await self.server.stop()
+
+    def requests(self) -> int:
+        return self.server.summary()["requests_total"]
+
+    @staticmethod
+    def running_requests() -> list:
+        return [task for task in asyncio.all_tasks() if task.get_coro().__qualname__ == "TMDBClient._request"]
+
+    async def test_fast_hedge_wins_and_the_slow_request_is_cancelled(self):
+        self.server.latencies.extend([0.6, 0])
+        started = time.monotonic()
+        details = await self.client.get_details("tv", 42)
+        self.assertEqual(details["tmdb_id"], 42)
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(self.requests(), 2)
+        losers = self.running_requests()
+        self.assertTrue(all(task.cancelling() for task in losers))
+        await asyncio.gather(*losers, return_exceptions=True)
+        self.assertEqual(self.client.breaker.failures, 0)
+        await asyncio.sleep(0.6)  # Let the stub finish answering the abandoned request
+
+    async def test_fast_first_request_sends_no_hedge(self):
+        self.assertIsNotNone(await self.client.get_details("tv", 42))
+        self.assertEqual(self.requests(), 1)
+
+    async def test_both_failing(self):
+        self.server.latencies.extend([0.3, 0])
+        self.server.faults.extend([UNAVAILABLE, UNAVAILABLE])
+        self.assertIsNone(await self.client.get_details("tv", 42))
+        self.assertEqual(self.requests(), 2)
+        self.assertEqual(self.client.breaker.failures, 2)
+
+    async def test_no_hedge_while_backing_off(self):
+        self.client.max_retries = 1
+        self.server.faults.append((429, {"Retry-After": str(self.HEDGE_DELAY * 4)}))
+        hedged = metrics.counters[("tmdb_hedged_requests_total", ())]
+        self.assertIsNotNone(await self.client.get_details("tv", 42))
+        # The 429 and its retry only: no duplicate fired into the rate limit meanwhile
+        self.assertEqual(metrics.counters[("tmdb_hedged_requests_total", ())], hedged)
+        self.assertEqual(self.requests(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
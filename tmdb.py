@@ -1,6 +1,9 @@
+import asyncio
 import httpx
 from config import Config
 from utils.logger import setup_logger
+from utils.metrics import metrics
+from utils.resilience import CircuitBreaker, backoff_delay, parse_retry_after
 
 logger = setup_logger(__name__)
 
@@ -8,11 +11,53 @@ TMDB_BASE_URL = "https://api.themoviedb.org/3"
 # Using w780 for high quality but reasonable size.
 TMDB_IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w780"
 
+# Status codes worth retrying: rate limiting and transient server-side failures.
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class TMDBClient:
     def __init__(self):
         self.api_key = Config.TMDB_API_KEY
+        self.timeout = Config.TMDB_TIMEOUT
+        self.max_retries = Config.TMDB_MAX_RETRIES
+        self.hedge_delay = Config.TMDB_HEDGE_DELAY
+        self.base_url = TMDB_BASE_URL
+        self.breaker = CircuitBreaker(
+            failure_threshold=Config.TMDB_BREAKER_THRESHOLD,
+            reset_timeout=Config.TMDB_BREAKER_RESET
+        )
+        self._client = None
+
+    @property
+    def client(self):
+        """Shared AsyncClient so connections are pooled across requests."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, endpoint, params=None, backing_off: asyncio.Event = None):
+        probing = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if not self.breaker.allow():
+            metrics.inc("tmdb_requests_total", outcome="circuit_open")
+            logger.warning("TMDb circuit is open, skipping %s", endpoint, extra={"sample": "tmdb_circuit_open"})
+            return None
 
-    async def _request(self, endpoint, params=None):
+        try:
+            return await self._attempt(endpoint, params, backing_off)
+        finally:
+            if probing:
+                # A probe cancelled mid-flight records no outcome and would otherwise block every later probe
+                self.breaker.release()
+
+    async def _attempt(self, endpoint, params, backing_off: asyncio.Event = None):
+        """
+        Sends the request with retries and records the outcome on the circuit breaker.
+        `backing_off` is set before the first retry sleep (see _hedged_request).
+        """
         if params is None:
             params = {}
 
@@ -20,16 +65,74 @@ class TMDBClient:
         params['api_key'] = self.api_key
         params['language'] = 'en-US'
 
-        url = f"{TMDB_BASE_URL}/{endpoint}"
+        url = f"{self.base_url}/{endpoint}"
+        error = None
 
-        async with httpx.AsyncClient() as client:
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
             try:
-                response = await client.get(url, params=params, timeout=10.0)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPError as e:
-                logger.error(f"TMDb API Error on {endpoint}: {e}")
-                return None
+                response = await self.client.get(url, params=params)
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    response.raise_for_status()
+                elif response.is_client_error:
+                    # Not TMDb's fault (e.g. 404 for an unknown ID): don't retry, don't trip the breaker.
+                    self.breaker.record_success()
+                    metrics.inc("tmdb_requests_total", outcome="client_error")
+                    logger.error("TMDb API Error on %s: HTTP %s", endpoint, response.status_code)
+                    return None
+                data = response.json()
+                self.breaker.record_success()
+                metrics.inc("tmdb_requests_total", outcome="ok")
+                return data
+            except (httpx.HTTPError, ValueError) as e:
+                error = e
+                metrics.inc("tmdb_attempt_errors_total", error=type(e).__name__)
+
+            if attempt < self.max_retries:
+                if retry_after is not None and retry_after > Config.TMDB_MAX_RETRY_AFTER:
+                    # Retrying before TMDb's Retry-After would only earn another 429
+                    break
+                if backing_off is not None:
+                    backing_off.set()
+                delay = retry_after if retry_after is not None else backoff_delay(attempt)
+                await asyncio.sleep(min(delay, Config.TMDB_MAX_RETRY_AFTER))
+
+        self.breaker.record_failure()
+        metrics.inc("tmdb_requests_total", outcome="error")
+        logger.error("TMDb API Error on %s after %d attempts: %s", endpoint, attempt + 1, error)
+        return None
+
+    async def _hedged_request(self, endpoint, params=None):
+        """
+        Sends the request and, if no answer arrived within `hedge_delay` seconds,
+        a second identical one. The first successful response wins. No hedge is sent while
+        the first request is backing off: TMDb answered, a duplicate would only add load
+        (or walk straight into the rate limit after a 429).
+        """
+        if self.hedge_delay <= 0:
+            return await self._request(endpoint, params)
+
+        backing_off = asyncio.Event()
+        tasks = [asyncio.create_task(self._request(endpoint, dict(params or {}), backing_off))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if not done and not backing_off.is_set() and self.breaker.state == CircuitBreaker.CLOSED:
+                metrics.inc("tmdb_hedged_requests_total")
+                tasks.append(asyncio.create_task(self._request(endpoint, dict(params or {}))))
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        return result
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
 
     async def search(self, query):
         """
@@ -75,7 +178,7 @@ class TMDBClient:
         """
         Get detailed info for a movie or TV show.
         """
-        data = await self._request(f"{media_type}/{tmdb_id}")
+        data = await self._hedged_request(f"{media_type}/{tmdb_id}")
 
         if not data:
             return None
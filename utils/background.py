@@ -0,0 +1,47 @@
+import asyncio
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class PeriodicTask:
+    """
+    Runs `func()` every `interval` seconds in a background asyncio task.
+    Exceptions are logged and never stop the loop.
+    """
+
+    def __init__(self, name: str, interval: float, func, initial_delay: float = 0):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.initial_delay = initial_delay
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            try:
+                await self.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background task {self.name} failed: {e}")
+            await asyncio.sleep(self.interval)
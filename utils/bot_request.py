@@ -0,0 +1,30 @@
+import time
+from telegram.request import HTTPXRequest
+from utils.metrics import metrics
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """
+    HTTPXRequest that records Bot API latency and failures per method, and when
+    getUpdates last succeeded (used by the readiness probe).
+    """
+
+    def __init__(self, *args, tenant: str = "default", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tenant = tenant
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.monotonic()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            metrics.inc("bot_api_errors_total", method=api_method, code="network", tenant=self.tenant)
+            raise
+
+        metrics.observe("bot_api_duration_seconds", time.monotonic() - started, method=api_method, tenant=self.tenant)
+        if code >= 300:
+            metrics.inc("bot_api_errors_total", method=api_method, code=code, tenant=self.tenant)
+        elif api_method == "getUpdates":
+            metrics.last_get_updates[self.tenant] = time.monotonic()
+        return code, payload
@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded LRU map whose entries expire after `ttl` seconds (None = never).
+    When full, the least recently used entry is evicted.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def purge_expired(self) -> int:
+        """Drops expired entries. Returns how many were removed."""
+        now = time.monotonic()
+        expired = [k for k, (exp, _) in self._data.items() if exp is not None and exp <= now]
+        for key in expired:
+            del self._data[key]
+        return len(expired)
+
+    def items(self):
+        """Returns a list of (key, value) pairs that have not expired."""
+        now = time.monotonic()
+        return [(k, v) for k, (exp, v) in self._data.items() if exp is None or exp > now]
+
+    def __contains__(self, key):
+        item = self._data.get(key)
+        return item is not None and (item[0] is None or item[0] > time.monotonic())
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,178 @@
+import secrets
+from enum import IntEnum
+from bson import ObjectId
+from bson.errors import InvalidId
+from utils.metrics import metrics, track_handler
+from utils.tenants import get_tenant
+
+# Bump when the meaning of an action's arguments changes: older buttons then decode as stale
+CALLBACK_VERSION = 1
+PREFIX = "~"
+BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+MAX_CALLBACK_BYTES = 64  # Telegram's callback_data limit
+
+# Argument tags (untagged fields are integers)
+REDIRECT_TAG = "*"
+OBJECT_ID_TAG = "#"
+
+
+class Action(IntEnum):
+    """Callback actions. Values are part of the wire format: never reuse or renumber one."""
+    NOOP = 0
+    DASHBOARD = 1
+    MANAGE_PAGE = 2
+    MANAGE_LINK = 3
+    REGENERATE = 4
+    CHANGE_CHANNEL = 5
+    DELETE = 6
+    CANCEL_CHANGE = 7
+    THROTTLED = 8
+    PROFILE = 9
+    AUDIT = 10
+    BROADCASTS = 11
+    CANCEL_BROADCAST = 12
+    SWAP_CHANNEL = 13
+    ADD_MIRROR = 14
+    ACCEPT_MIRROR = 15
+    REJECT_MIRROR = 16
+    REMOVE_MIRROR = 17
+    ARCHIVED_PAGE = 18
+
+
+def to_base36(number: int) -> str:
+    if number < 0:
+        return "-" + to_base36(-number)
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36[digit] + digits
+        if not number:
+            return digits
+
+
+class CallbackCodec:
+    """
+    Packs an action and its arguments into short callback_data:
+
+        ~ <version> <epoch> . <action> . <arg> . <arg> ...
+
+    Every field is base 36. Redirect codes (32 characters) are replaced by short numeric
+    references handed out by this process, so a details button takes ~12 bytes instead of
+    50 and leaves room for paging/filter state. References die with the process: the epoch
+    (random per start) marks buttons holding them, and those decode as stale afterwards,
+    like buttons of another CALLBACK_VERSION. Integers and ObjectIds stay valid across restarts.
+    """
+
+    def __init__(self):
+        self.epoch = to_base36(secrets.randbelow(36 ** 3)).rjust(3, "0")
+        # One entry per redirect that was ever shown on a button, both directions
+        self._refs = {}   # code -> reference
+        self._codes = {}  # reference -> code
+
+    def ref(self, code: str) -> int:
+        ref = self._refs.get(code)
+        if ref is None:
+            ref = self._refs[code] = len(self._refs) + 1
+            self._codes[ref] = code
+        return ref
+
+    def encode(self, action: Action, *args) -> str:
+        fields = [PREFIX + BASE36[CALLBACK_VERSION] + self.epoch, to_base36(action)]
+        for arg in args:
+            if isinstance(arg, str):
+                fields.append(REDIRECT_TAG + to_base36(self.ref(arg)))
+            elif isinstance(arg, ObjectId):
+                fields.append(OBJECT_ID_TAG + to_base36(int(str(arg), 16)))
+            else:
+                fields.append(to_base36(arg))
+        data = ".".join(fields)
+        if len(data.encode()) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"Callback data for {action.name} exceeds {MAX_CALLBACK_BYTES} bytes: {data}")
+        return data
+
+    def decode(self, data: str):
+        """Returns (action, args), or None if the data is malformed, of another version or stale."""
+        fields = data.split(".")
+        header = fields[0]
+        if len(header) != 5 or header[0] != PREFIX or header[1] != BASE36[CALLBACK_VERSION] or len(fields) < 2:
+            return None
+        try:
+            action = Action(int(fields[1], 36))
+            args = []
+            for field in fields[2:]:
+                if field.startswith(REDIRECT_TAG):
+                    code = self._codes.get(int(field[1:], 36)) if header[2:] == self.epoch else None
+                    if code is None:
+                        return None
+                    args.append(code)
+                elif field.startswith(OBJECT_ID_TAG):
+                    args.append(ObjectId(format(int(field[1:], 36), "024x")))
+                else:
+                    args.append(int(field, 36))
+        except (ValueError, InvalidId):
+            # InvalidId: an ObjectId field too large for 24 hex digits
+            return None
+        return action, args
+
+
+class CallbackRouter:
+    """
+    Dispatches codec callbacks to the handler registered for their action with one dict
+    lookup. Handlers are called as handler(update, context, *args). Admin-only actions are
+    checked against the bot's tenant here, so handlers don't repeat it.
+    """
+
+    def __init__(self, codec: CallbackCodec):
+        self.codec = codec
+        self.routes = {}  # action -> (handler, admin_only)
+        self.stale_handler = None
+
+    def register(self, action: Action, handler, admin_only: bool = True):
+        if action in self.routes:
+            raise ValueError(f"Callback action {action.name} is already registered")
+        self.routes[action] = (handler, admin_only)
+
+    def route(self, action: Action, admin_only: bool = True):
+        """Decorator form of register()."""
+        def decorator(handler):
+            self.register(action, handler, admin_only)
+            return handler
+        return decorator
+
+    def on_stale(self, handler):
+        """Decorator: handler(update, context) answers buttons that can no longer be decoded."""
+        self.stale_handler = handler
+        return handler
+
+    def data(self, action: Action, *args) -> str:
+        return self.codec.encode(action, *args)
+
+    async def dispatch(self, update, context):
+        query = update.callback_query
+        decoded = self.codec.decode(query.data)
+        route = self.routes.get(decoded[0]) if decoded else None
+        if route is None:
+            metrics.inc("callback_actions_total", action="stale")
+            if self.stale_handler is not None:
+                await self.stale_handler(update, context)
+            else:
+                await query.answer("⌛ This button has expired.", show_alert=True)
+            return
+
+        action, args = decoded
+        handler, admin_only = route
+        if admin_only and not get_tenant(context).is_admin(update.effective_user.id):
+            await query.answer("Unauthorized", show_alert=True)
+            return
+        metrics.inc("callback_actions_total", action=action.name.lower())
+        await handler(update, context, *args)
+
+
+# Global instances
+codec = CallbackCodec()
+callbacks = CallbackRouter(codec)
+
+@track_handler
+async def callback_dispatcher(update, context):
+    """PTB entry point for every codec callback (pattern '^~')."""
+    await callbacks.dispatch(update, context)
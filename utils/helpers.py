@@ -1,7 +1,52 @@
+import re
 import secrets
 import string
+import unicodedata
+from datetime import datetime, timedelta, timezone
 
-def generate_redirect_code(length=32):
+REDIRECT_CODE_LENGTH = 32
+REDIRECT_CODE_ALPHABET = string.ascii_letters + string.digits
+
+RELATIVE_TIME = re.compile(r"^\+(\d+)([mhd])$")
+TIME_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+WORD = re.compile(r"\w+")
+
+def generate_redirect_code(length=REDIRECT_CODE_LENGTH):
     """Generates a secure random code for redirect links."""
-    alphabet = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
+    return ''.join(secrets.choice(REDIRECT_CODE_ALPHABET) for _ in range(length))
+
+def is_valid_redirect_code(code: str) -> bool:
+    """Cheap shape check so malformed codes are rejected before any I/O."""
+    return len(code) == REDIRECT_CODE_LENGTH and code.isascii() and code.isalnum()
+
+def retry_after_seconds(error) -> float:
+    """RetryAfter.retry_after is an int or a timedelta depending on the PTB version."""
+    value = error.retry_after
+    return value.total_seconds() if hasattr(value, 'total_seconds') else float(value)
+
+def tokenize(text: str) -> list:
+    """Lowercase, accent-free words: 'Pokémon: The Series' -> ['pokemon', 'the', 'series']."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return WORD.findall(text.lower())
+
+def parse_schedule(value: str, now: datetime = None):
+    """
+    Parses a schedule time: 'now', a relative offset ('+30m', '+2h', '+1d') or an
+    absolute UTC time ('2025-06-01T18:00'). Returns a naive UTC datetime, or None if invalid.
+    """
+    now = now or datetime.utcnow()
+    value = value.strip().lower()
+    if value == "now":
+        return now
+    match = RELATIVE_TIME.match(value)
+    if match:
+        return now + timedelta(**{TIME_UNITS[match.group(2)]: int(match.group(1))})
+    try:
+        parsed = datetime.fromisoformat(value.upper().replace(" ", "T"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
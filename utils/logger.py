@@ -1,22 +1,84 @@
+import atexit
+import json
 import logging
-import colorlog
+import logging.handlers
+import queue
 import sys
+import colorlog
+from config import Config
+
+# Structured fields picked up from `extra={...}` by the JSON formatter
+STRUCTURED_FIELDS = ("code", "user_id", "stage", "latency_ms", "tenant")
+
+# All loggers enqueue here; a single background thread formats and writes.
+_log_queue = queue.SimpleQueue()
+_listener = None
+
 
-def setup_logger(name="XTVredirect", level=logging.INFO):
+class JsonFormatter(logging.Formatter):
     """
-    Sets up a colored logger suitable for Railway logs.
+    One JSON object per line, including any structured fields passed via `extra`.
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
 
-    # If handlers already exist, don't add more
-    if logger.handlers:
-        return logger
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        sampled = getattr(record, "sampled", None)
+        if sampled:
+            payload["sampled"] = sampled
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
 
-    handler = logging.StreamHandler(sys.stdout)
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through only 1 of every `rate` records logged with `extra={"sample": "<key>"}`.
+    Records without a sample key always pass. Passed records get `sampled=rate` so readers
+    know each line stands for `rate` occurrences.
+    """
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = max(1, rate)
+        self.counts = {}
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None or self.rate == 1:
+            return True
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        if count % self.rate:
+            return False
+        record.sampled = self.rate
+        return True
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that defers all formatting to the listener thread.
+    The stock QueueHandler formats the message in the calling thread (the event loop).
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _build_formatter():
+    if Config.LOG_FORMAT == "json":
+        return JsonFormatter()
 
     # Custom color scheme for Railway logs
-    formatter = colorlog.ColoredFormatter(
+    return colorlog.ColoredFormatter(
         "%(log_color)s%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
         datefmt="%Y-%m-%d %H:%M:%S",
         reset=True,
@@ -31,7 +93,46 @@ def setup_logger(name="XTVredirect", level=logging.INFO):
         style='%'
     )
 
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+
+def _start_listener():
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(_build_formatter())
+    _listener = logging.handlers.QueueListener(_log_queue, handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+_queue_handler = LazyQueueHandler(_log_queue)
+_queue_handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATE))
+
+
+def setup_logger(name="XTVredirect", level=None):
+    """
+    Sets up a logger that writes through the shared non-blocking queue pipeline.
+    Level defaults to Config.LOG_LEVEL.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level or Config.LOG_LEVEL.upper())
+
+    # If handlers already exist, don't add more
+    if logger.handlers:
+        return logger
+
+    _start_listener()
+    logger.addHandler(_queue_handler)
+    # Records are written by our listener only, not again by ancestor loggers
+    logger.propagate = False
 
     return logger
@@ -0,0 +1,109 @@
+import functools
+import time
+from collections import defaultdict
+
+# Latency buckets in seconds, shared by all histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry rendered in the Prometheus text format.
+    Counters and histograms are keyed by name and a label set; gauges are callbacks
+    evaluated at scrape time.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(float)   # (name, labels) -> value
+        self.histograms = {}                 # (name, labels) -> [bucket counts..., count, sum]
+        self.gauges = {}                     # (name, labels) -> callable
+        self.active_handlers = defaultdict(int)  # handler name -> in-flight count
+        self.last_get_updates = {}  # tenant name -> monotonic time of last successful getUpdates
+
+    def inc(self, name: str, value: float = 1, **labels):
+        self.counters[(name, _label_key(labels))] += value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _label_key(labels))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += 1
+        hist[-1] += seconds
+
+    def gauge(self, name: str, func, **labels):
+        """Registers a callback whose return value is reported as a gauge."""
+        self.gauges[(name, _label_key(labels))] = func
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self.counters.get((name, _label_key(labels)), 0)
+
+    def render(self) -> str:
+        lines = []
+        for (name, key), value in sorted(self.counters.items()):
+            lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for (name, key), func in sorted(self.gauges.items(), key=lambda item: item[0]):
+            try:
+                value = func()
+            except Exception:
+                continue
+            if value is not None:
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for (name, key), hist in sorted(self.histograms.items()):
+            for bound, count in zip(BUCKETS, hist):
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {count}")
+            lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {hist[-2]}")
+            lines.append(f"{name}_count{_format_labels(key)} {hist[-2]}")
+            lines.append(f"{name}_sum{_format_labels(key)} {hist[-1]:.6f}")
+        return "\n".join(lines) + "\n"
+
+
+def register_cache(name: str, cache):
+    """Exports size and hit rate of a TTLCache."""
+    metrics.gauge("cache_entries", lambda: len(cache), cache=name)
+    metrics.gauge("cache_hit_ratio", lambda: cache.hit_rate, cache=name)
+
+
+def track_handler(func):
+    """
+    Decorator for PTB handler callbacks: counts calls, in-flight concurrency, errors and duration
+    per handler and tenant.
+    """
+    name = func.__name__
+    metrics.gauge("handler_in_flight", lambda: metrics.active_handlers[name], handler=name)
+
+    @functools.wraps(func)
+    async def wrapper(update, context, *args, **kwargs):
+        tenant = context.bot_data.get('tenant')
+        tenant_name = tenant.name if tenant else "default"
+        metrics.active_handlers[name] += 1
+        started = time.monotonic()
+        try:
+            return await func(update, context, *args, **kwargs)
+        except Exception:
+            metrics.inc("handler_errors_total", handler=name, tenant=tenant_name)
+            raise
+        finally:
+            metrics.active_handlers[name] -= 1
+            metrics.observe("handler_duration_seconds", time.monotonic() - started, handler=name, tenant=tenant_name)
+
+    return wrapper
+
+
+# Global instance
+metrics = Metrics()
+metrics.gauge("handlers_in_flight", lambda: sum(metrics.active_handlers.values()))
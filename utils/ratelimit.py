@@ -0,0 +1,84 @@
+import asyncio
+import time
+from datetime import datetime
+from utils.cache import TTLCache
+
+
+class RateLimiter:
+    """
+    Per-key token buckets kept in a bounded map.
+
+    Each bucket is stored as a compact (tokens, last_refill) tuple. A bucket that has been
+    idle long enough to refill completely is equivalent to a fresh one, so it is allowed to
+    expire from the map.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 50000, name: str = "limiter"):
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self._buckets = TTLCache(max_size=max_keys, ttl=burst / rate if rate > 0 else None)
+        # key -> (throttled count, last throttled at), kept for the admin view
+        self.throttled = TTLCache(max_size=1000, ttl=3600)
+
+    def allow(self, key) -> bool:
+        """Consumes one token for key. Returns False if the key is over its limit."""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key) or (self.burst, now)
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+        if tokens >= 1:
+            self._buckets.set(key, (tokens - 1, now))
+            return True
+
+        self._buckets.set(key, (tokens, now))
+        count, _ = self.throttled.get(key) or (0, None)
+        self.throttled.set(key, (count + 1, datetime.utcnow()))
+        return False
+
+    def throttle_count(self, key) -> int:
+        entry = self.throttled.get(key)
+        return entry[0] if entry else 0
+
+    def top_throttled(self, limit: int = 20, scope=None):
+        """
+        Returns [(key, count, last_throttled_at)] sorted by count, highest first. With scope,
+        only keys (scope, key) are listed, as key (e.g. one tenant's users).
+        """
+        items = [(key, count, last) for key, (count, last) in self.throttled.items()]
+        if scope is not None:
+            items = [(key[1], count, last) for key, count, last in items if key[0] == scope]
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items[:limit]
+
+
+class AsyncRateLimiter:
+    """
+    Paces async callers to at most `rate` acquisitions per second, with bursts up to `burst`.
+    Unlike RateLimiter it waits instead of rejecting.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
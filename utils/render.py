@@ -0,0 +1,87 @@
+import html
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from models import TmdbDetails
+from utils.cache import TTLCache
+
+LOADING_MESSAGES_POOL = [
+    "Creating Individual Invite Link... ⚙️",
+    "Verifying User Access... 🔐",
+    "Preparing Secure Channel... 📡",
+    "Establishing Secure Connection... 📶",
+    "Encrypting Data Stream... 🔑",
+    "Allocating Bandwidth... ⚡️",
+    "Syncing with Server... 🔄",
+    "Authenticating Request... 🆔",
+    "Optimizing Video Quality... 📺",
+    "Checking Subscription Status... 📋",
+    "Generating Access Token... 🎟️",
+    "Finalizing Setup... ✅"
+]
+
+EXPIRATION_NOTICE = "\n⚠️ <b>Link expires in 10 minutes!</b>"
+
+# The loading button never changes, so one markup object is shared by every message.
+LOADING_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("⏳ Loading...", callback_data="loading_wait")]])
+
+
+def join_markup(invite_link: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🚀 Join Channel", url=invite_link)]])
+
+
+def render_base_caption(details: TmdbDetails) -> str:
+    """Builds the HTML caption header (title, rating, genres, description)."""
+    title = html.escape(str(details.title))
+    genres = html.escape(str(details.genres))
+    overview = html.escape(str(details.overview)[:300])
+
+    return (
+        f"<b>{title}</b> • {details.year}\n"
+        f"⭐️ <b>{details.rating}/10</b>  🎭 {genres}\n\n"
+        f"💬 <b>Description:</b>\n"
+        f"{overview}...\n\n"
+    )
+
+
+class RenderedRedirect:
+    """Everything start_handler sends for a redirect, rendered once."""
+    __slots__ = ('details', 'poster_url', 'base_caption', 'initial_caption', 'final_caption',
+                 'expiring_caption', 'frames', 'member_markup')
+
+    def __init__(self, details: TmdbDetails, invite_link: str | None):
+        self.details = details
+        self.poster_url = details.poster_url
+        self.base_caption = render_base_caption(details)
+        self.initial_caption = self.base_caption + "Enjoy watching! 🍿"
+        self.final_caption = self.initial_caption
+        self.expiring_caption = self.initial_caption + EXPIRATION_NOTICE
+        self.frames = {msg: self.base_caption + msg for msg in LOADING_MESSAGES_POOL}
+        self.member_markup = join_markup(invite_link) if invite_link else None
+
+
+class RenderCache:
+    """
+    Per-code cache of RenderedRedirect objects.
+    Entries are dropped whenever the redirect document changes (see Database.add_listener),
+    and re-rendered when the metadata cache hands out a different details object.
+    """
+
+    def __init__(self, max_size: int = 2048):
+        self.cache = TTLCache(max_size=max_size)
+
+    def get(self, code: str, details: TmdbDetails, invite_link: str | None, cache: bool = True) -> RenderedRedirect:
+        rendered = self.cache.get(code)
+        if rendered is None or rendered.details is not details:
+            rendered = RenderedRedirect(details, invite_link)
+            if cache:
+                self.cache.set(code, rendered)
+        return rendered
+
+    def invalidate(self, code: str):
+        self.cache.pop(code)
+
+    def clear(self):
+        self.cache.clear()
+
+
+# Global instance
+render_cache = RenderCache()
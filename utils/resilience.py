@@ -0,0 +1,72 @@
+import random
+import time
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """
+    Returns a full-jitter exponential backoff delay (in seconds) for a 0-based retry attempt.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value) -> float | None:
+    """Parses a Retry-After header given in seconds. HTTP-date values are ignored."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Simple consecutive-failure circuit breaker.
+
+    CLOSED: calls pass through. After `failure_threshold` consecutive failures it OPENs.
+    OPEN: calls fail fast until `reset_timeout` seconds have passed.
+    HALF_OPEN: a single probe call is allowed; success closes the circuit, failure re-opens it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """Returns True if a call may be attempted right now."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def release(self):
+        """Frees the probe slot of a half-open call that ended without an outcome (e.g. cancelled)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_in_flight = False
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self._state != self.CLOSED or self.failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
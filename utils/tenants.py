@@ -0,0 +1,87 @@
+import json
+from config import Config
+
+DEFAULT_TENANT = "default"
+
+
+class Tenant:
+    """
+    One bot hosted by this process: its token, its admins and the key its data is stored under.
+    The default tenant (BOT_TOKEN / CEO_ID) stores no tenant key, so redirects created before
+    multi-bot mode keep belonging to it.
+    """
+    __slots__ = ("name", "bot_token", "admin_ids")
+
+    def __init__(self, name: str, bot_token: str, admin_ids: list):
+        self.name = name
+        self.bot_token = bot_token
+        self.admin_ids = [int(admin_id) for admin_id in admin_ids]
+
+    @property
+    def key(self):
+        """Value of the `tenant` field on this tenant's documents (None matches missing fields)."""
+        return None if self.name == DEFAULT_TENANT else self.name
+
+    @property
+    def primary_admin(self) -> int:
+        """Admin who receives setup requests and alerts."""
+        return self.admin_ids[0]
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.admin_ids
+
+    def __repr__(self):
+        return f"Tenant({self.name!r})"
+
+
+def load_tenants() -> list:
+    """
+    Builds the tenant list from BOT_TOKEN/CEO_ID (the default tenant) and the optional
+    TENANTS JSON list: [{"name": "...", "bot_token": "...", "admin_ids": [...]}, ...].
+    Raises ValueError for a malformed entry.
+    """
+    tenants = []
+    if Config.BOT_TOKEN:
+        tenants.append(Tenant(DEFAULT_TENANT, Config.BOT_TOKEN, [Config.CEO_ID]))
+
+    try:
+        items = json.loads(Config.TENANTS) if Config.TENANTS else []
+    except json.JSONDecodeError as e:
+        raise ValueError(f"TENANTS is not valid JSON: {e}") from None
+    if not isinstance(items, list):
+        raise ValueError("TENANTS must be a JSON list")
+    for index, item in enumerate(items):
+        tenant = _parse_tenant(index, item)
+        for other in tenants:
+            # Tenants sharing a name would share their data, sharing a token their updates
+            if other.name == tenant.name:
+                raise ValueError(f"Tenant name '{tenant.name}' is used twice")
+            if other.bot_token == tenant.bot_token:
+                raise ValueError(f"Tenants '{other.name}' and '{tenant.name}' use the same bot token")
+        tenants.append(tenant)
+
+    return tenants
+
+
+def _parse_tenant(index: int, item) -> Tenant:
+    """Validates one TENANTS entry."""
+    if not isinstance(item, dict):
+        raise ValueError(f"TENANTS[{index}] must be an object")
+    for field in ("name", "bot_token"):
+        if not isinstance(item.get(field), str) or not item[field].strip():
+            raise ValueError(f"TENANTS[{index}] needs a non-empty '{field}'")
+    if item["name"].strip() == DEFAULT_TENANT:
+        raise ValueError(f"Tenant name '{DEFAULT_TENANT}' is reserved for BOT_TOKEN")
+    admin_ids = item.get("admin_ids")
+    if not isinstance(admin_ids, list) or not admin_ids:
+        raise ValueError(f"Tenant '{item['name']}' needs a non-empty 'admin_ids' list")
+    try:
+        return Tenant(item["name"].strip(), item["bot_token"].strip(), admin_ids)
+    except (TypeError, ValueError):
+        raise ValueError(f"Tenant '{item['name']}' has a non-numeric admin id: {admin_ids}") from None
+
+
+def get_tenant(context) -> Tenant:
+    """Returns the tenant whose bot received the current update."""
+    return context.bot_data["tenant"]
+
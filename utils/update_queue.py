@@ -0,0 +1,90 @@
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timezone
+from telegram import Update
+from config import Config
+from utils.logger import setup_logger
+from utils.metrics import metrics
+
+logger = setup_logger(__name__)
+
+# Queue priorities, lowest first
+ADMIN, FRESH, STALE, LAST = range(4)
+PRIORITY_NAMES = {ADMIN: "admin", FRESH: "fresh", STALE: "stale"}
+
+
+def update_age(update: Update) -> float:
+    """Seconds since the user sent the update's message (0 for updates without a date, like button clicks)."""
+    message = update.effective_message if update.callback_query is None else None
+    date = message.date if message is not None else None
+    if update.chat_member is not None:
+        date = update.chat_member.date
+    if date is None:
+        return 0.0
+    return max(0.0, (datetime.now(timezone.utc) - date).total_seconds())
+
+
+def is_redirect_request(update: Update) -> bool:
+    """'/start <code>' deep link clicks: the expensive updates (photo, animation, invite link)."""
+    message = update.message
+    return message is not None and bool(message.text) and message.text.startswith("/start ")
+
+
+class PriorityUpdateQueue(asyncio.Queue):
+    """
+    Update queue shared by the Updater and the Application that hands out updates by
+    priority instead of arrival order. After downtime getUpdates returns the whole backlog
+    at once; replayed in order, hour-old deep link clicks (a photo, three edits and an invite
+    each) would hold up the people clicking right now.
+
+    - updates from the tenant's admins go first (dashboard buttons stay responsive),
+    - then fresh updates, in arrival order,
+    - then stale redirect requests (older than STALE_UPDATE_AGE), which /start answers with
+      a lightweight reply (see handlers.start), and chat member updates,
+    - redirect requests older than STALE_UPDATE_DROP_AGE are dropped: that visitor is gone.
+
+    Anything that is not an Update (the Application's stop signal) sorts last, so pending
+    updates are still handled on shutdown.
+    """
+
+    def __init__(self, tenant, maxsize: int = 0):
+        self.tenant = tenant
+        self._counter = itertools.count()
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+
+    def _put(self, item):
+        heapq.heappush(self._queue, (self.priority(item), next(self._counter), item))
+
+    def _get(self):
+        return heapq.heappop(self._queue)[2]
+
+    def put_nowait(self, item):
+        if isinstance(item, Update) and self.should_drop(item):
+            metrics.inc("updates_dropped_total", tenant=self.tenant.name)
+            logger.debug("Dropped stale update %s", item.update_id)
+            return
+        super().put_nowait(item)
+
+    def should_drop(self, update: Update) -> bool:
+        return (
+            Config.STALE_UPDATE_DROP_AGE > 0
+            and is_redirect_request(update)
+            and update_age(update) > Config.STALE_UPDATE_DROP_AGE
+        )
+
+    def priority(self, item) -> int:
+        if not isinstance(item, Update):
+            return LAST
+        user = item.effective_user
+        if user is not None and self.tenant.is_admin(user.id) and item.chat_member is None:
+            priority = ADMIN
+        elif item.chat_member is not None or (is_redirect_request(item) and update_age(item) > Config.STALE_UPDATE_AGE):
+            priority = STALE
+        else:
+            priority = FRESH
+        metrics.inc("updates_queued_total", priority=PRIORITY_NAMES[priority], tenant=self.tenant.name)
+        return priority